@@ -0,0 +1,58 @@
+"""
+Benchmarks of the database managers.
+
+    python -m kb_package.database.__bench__ postgres host=127.0.0.1 user=root password=*** db_name=test
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy
+import pandas
+
+from kb_package.database import DatabaseManager, SQLiteDB
+
+
+def _bench_dataset(nb_rows):
+    rand = numpy.random.default_rng(0)
+    dataset = pandas.DataFrame({
+        "id": numpy.arange(nb_rows),
+        "amount": rand.random(nb_rows) * 1000,
+        "label": ["label_" + str(i % 1000) for i in range(nb_rows)],
+        "qty": rand.integers(0, 100, nb_rows).astype(float),
+    })
+    # some null values
+    dataset.loc[dataset.index % 7 == 0, "qty"] = numpy.nan
+    dataset.loc[dataset.index % 11 == 0, "label"] = None
+    return dataset
+
+
+def bench_insert_many(db, nb_rows=1_000_000, table_name="kb_bench_insert"):
+    """
+    Compare rows per second of insert_many: executemany path vs native bulk load (bulk=True)
+    """
+    dataset = _bench_dataset(nb_rows)
+    result = {}
+    for bulk in (False, True):
+        db.create_table(dataset.copy(), table_name, only_structure=True, verbose=False)
+        start = time.perf_counter()
+        db.insert_many(dataset, table_name, bulk=bulk)
+        elapsed = time.perf_counter() - start
+        result["bulk" if bulk else "executemany"] = nb_rows / elapsed
+        print(db._get_name, "bulk" if bulk else "executemany", ":",
+              round(nb_rows / elapsed), "rows/s", "(" + str(round(elapsed, 2)) + "s)")
+    return result
+
+
+if __name__ == '__main__':
+    db_type = (sys.argv[1:] or ["sqlite"])[0]
+    db_kwargs = dict([arg.split("=", 1) for arg in sys.argv[2:]])
+    size = int(db_kwargs.pop("nb_rows", 1_000_000))
+    if db_type.lower() == "sqlite":
+        # create_table close the connexion: a :memory: database would be lost
+        db_kwargs.setdefault("file_name", os.path.join(tempfile.gettempdir(), "kb_bench.db"))
+        database = SQLiteDB(**db_kwargs)
+    else:
+        database = DatabaseManager(db_type, **db_kwargs)
+    bench_insert_many(database, nb_rows=size)
@@ -4,3 +4,4 @@ try:
 except ImportError:
     pass
 from .database_manager import DatabaseManager
+from .asyncdb import AsyncBaseDB, AsyncPostgresDB, AsyncMysqlDB, AsyncSQLiteDB
@@ -1,7 +1,259 @@
-from kb_package.database import SQLiteDB
+import asyncio
+import datetime
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+
+import pandas
+
+from kb_package.database import AsyncSQLiteDB, SQLiteDB
+from kb_package.database.basedb import BaseDB, convert_date_column, infer_column_type
+
+
+def test_infer_column_type():
+    kind = lambda values: infer_column_type(pandas.Series(values * 50)).kind
+    assert kind(["2020-01-05", "2021-12-31"]) == "DATE"
+    assert kind(["2020-01-05 10:00:00", "2021-12-31 00:00:00"]) == "DATETIME"
+    # iso strings with a timezone
+    assert kind(["2020-01-05T10:00:00Z", "2020-01-06T11:00:00+01:00"]) == "DATETIME"
+    # partial dates and ids like yyyymmdd are not dates
+    assert kind(["2020-01", "2020-02"]) == "NO"
+    assert kind(["20231201", "20231202"]) == "NO"
+    assert kind(["abc", "2020-01-05"]) == "NO"
+
+
+def test_convert_date_column():
+    values, nb_fallback = convert_date_column(pandas.Series(["2020-01-05T10:00:00Z", "2020-01-06T11:00:00+01:00"]))
+    assert values.tolist() == [datetime.datetime(2020, 1, 5, 10), datetime.datetime(2020, 1, 6, 10)]
+    assert nb_fallback == 0
+    values, _ = convert_date_column(pandas.Series(["2020-01-05T10:00:00Z"]), kind="DATE")
+    assert values.tolist() == [datetime.date(2020, 1, 5)]
+    # yyyymmdd: not parsed as an iso date by pandas, but by CustomDateTime
+    values, nb_fallback = convert_date_column(pandas.Series(["20231201", "20231202"]), kind="DATE")
+    assert values.tolist() == [datetime.date(2023, 12, 1), datetime.date(2023, 12, 2)]
+    assert nb_fallback == 2
+    values, _ = convert_date_column(pandas.Series(["2020-01", "2020-02"]))
+    assert values.isna().all()
+
+
+def _file_db(name, **kwargs):
+    return SQLiteDB(file_name=os.path.join(tempfile.mkdtemp(), name), **kwargs)
+
+
+class _FailingSQLiteDB(SQLiteDB):
+    MAX_BUFFER_INSERTING_SIZE = 10
+
+    def _buffer_to_rows(self, buffer):
+        if buffer.iloc[0, 0] >= 50:
+            raise ValueError("bad row")
+        return super()._buffer_to_rows(buffer)
+
+
+def test_insert_many_pipeline_error():
+    # the preparation of the buffers fails mid-stream: the writers stop and the error is raised
+    db = _FailingSQLiteDB(file_name=os.path.join(tempfile.mkdtemp(), "pipeline.db"))
+    db.run_script("create table t (a integer)")
+    result = {}
+
+    def insert():
+        try:
+            db.insert_many(pandas.DataFrame({"a": range(100)}), "t", workers=2)
+        except ValueError as ex:
+            result["error"] = ex
+
+    thread = threading.Thread(target=insert, daemon=True)
+    thread.start()
+    thread.join(20)
+    assert not thread.is_alive(), "insert_many is blocked"
+    assert str(result.get("error")) == "bad row"
+
+
+def test_pooled_with_block():
+    # the statements of the block run and are committed on the pooled connexion of the block
+    db = _file_db("pooled_block.db", pool_size=2)
+    db.run_script("create table t (a integer)")
+    with db:
+        db.run_script("insert into t values (1)")
+    assert db.run_script("select count(*) from t") == [(1,)]
+
+
+def test_run_script_timeout():
+    db = _file_db("timeout.db", pool_size=2)
+    db.run_script("create table t (a integer)")
+    db.insert_many([{"a": i} for i in range(10)], "t")
+    long_query = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 1000000000) " \
+                 "SELECT count(*) FROM c"
+    start = time.time()
+    for _ in range(10):
+        try:
+            db.run_script(long_query, timeout=0.2)
+        except TimeoutError:
+            pass
+        else:
+            raise AssertionError("the query must time out")
+    # each call has its own thread: the timeouts don't wait for the previous queries
+    assert time.time() - start < 10
+    assert len(db.run_script("select * from t", timeout=5)) == 10
+
+
+class _StreamSQLiteDB(SQLiteDB):
+    # records the queries run on the stream cursor
+    def _stream_cursor(self, batch_size=None):
+        self.stream_queries.append(self.LAST_SQL_CODE_RUN)
+        return super()._stream_cursor(batch_size)
+
+
+def test_export():
+    db = _StreamSQLiteDB(file_name=":memory:")
+    db.stream_queries = []
+    db.run_script("create table export_test (id integer, label text)")
+    db.run_script("insert into export_test values (1, 'a;b'), (2, 'c')")
+    folder = tempfile.mkdtemp()
+
+    export_name = os.path.join(folder, "export.csv")
+    assert db.run_script("select * from export_test order by id", export=True, export_name=export_name) == \
+        export_name
+    assert pandas.read_csv(export_name, sep=";").values.tolist() == [[1, "a;b"], [2, "c"]]
+    assert db.LAST_EXPORT_MANIFEST.rows == 2
+    assert db.LAST_EXPORT_MANIFEST.columns == ["id", "label"]
+    assert not os.path.exists(export_name + ".manifest.json")
+    assert len(db.stream_queries) == 1
+
+    # a query returning rows which is not a select: the stream cursor is not used
+    export_name = os.path.join(folder, "pragma.csv.gz")
+    db.run_script("pragma table_info(export_test)", retrieve=True, export=True, export_name=export_name)
+    assert pandas.read_csv(export_name, sep=";")["name"].tolist() == ["id", "label"]
+    assert len(db.stream_queries) == 1
+
+    rows = []
+    db.run_script("select id from export_test order by id", export=True,
+                  export_name=lambda row, columns: rows.append(row))
+    assert rows == [(1,), (2,)]
+
+
+def test_async_run_script():
+    async def failing(db):
+        result = await db.run_script("select * from missing_table", ignore_error=True)
+        return result, db.LAST_RUN_SCRIPT_ERROR
+
+    async def working(db):
+        result = await db.run_script("select count(*) from async_test")
+        return result, db.LAST_RUN_SCRIPT_ERROR
+
+    async def main():
+        async with AsyncSQLiteDB(file_name=":memory:") as db:
+            await db.run_script("create table async_test (id integer, name text)")
+            await db.insert_many([{"id": i, "name": "name_" + str(i)} for i in range(100)], "async_test")
+            assert await db.run_script("select count(*) from async_test") == [(100,)]
+            sizes = [len(batch) async for batch in await db.run_script("select * from async_test", stream=True,
+                                                                       batch_size=40)]
+            assert sizes == [40, 40, 20]
+
+            # the error is the one of the call of the task
+            (res_1, error_1), (res_2, error_2) = await asyncio.gather(failing(db), working(db))
+            assert res_1 is None and "missing_table" in error_1.msg
+            assert res_2 == [(100,)] and error_2 is None
+            assert db.LAST_RUN_SCRIPT_ERROR is None
+            try:
+                await db.run_script("select * from missing_table")
+                raise AssertionError("The error is not raised")
+            except AssertionError:
+                raise
+            except Exception:
+                assert "missing_table" in db.LAST_RUN_SCRIPT_ERROR.msg
+
+    asyncio.run(main())
+
+
+def _read_copy_text(text):
+    # the rows of the text format of COPY, read like postgres
+    escapes = {"\\": "\\", "t": "\t", "n": "\n", "r": "\r"}
+    return [[None if value == "\\N" else re.sub(r"\\(.)", lambda m: escapes[m.group(1)], value)
+             for value in line.split("\t")] for line in text.split("\n")[:-1]]
+
+
+def test_copy_buffer():
+    labels = ["\\N", "a\\b", "tab\there", "new\nline\r\n", "", None, "C:\\temp\\new"]
+    buffer = pandas.DataFrame({"id": [1.0, 2.0, None, 4.0, 5.0, 6.0, 7.0], "label": labels})
+    file = io.StringIO()
+    BaseDB._write_copy_buffer(buffer, file)
+    rows = _read_copy_text(file.getvalue())
+    assert [row[1] for row in rows] == labels
+    assert [row[0] for row in rows] == ["1", "2", None, "4", "5", "6", "7"]
+
+
+def test_stream():
+    db = SQLiteDB(file_name=":memory:")
+    db.run_script("create table stream_test (id integer, name text)")
+    db.insert_many([{"id": i, "name": "name_" + str(i)} for i in range(100)], "stream_test")
+    batches = db.run_script("select * from stream_test order by id", stream=True, batch_size=40)
+    assert not isinstance(batches, list)
+    batches = list(batches)
+    assert [len(batch) for batch in batches] == [40, 40, 20]
+    assert [row[0] for batch in batches for row in batch] == list(range(100))
+    assert db.LAST_REQUEST_COLUMNS == ["id", "name"]
+    batches = db.run_script("select * from stream_test order by id", stream=True, batch_size=40, limit=50,
+                            dict_res=True)
+    batches = list(batches)
+    assert [len(batch) for batch in batches] == [40, 10]
+    assert batches[1][-1].name == "name_49"
+    # a query which doesn't return rows is not streamed
+    assert db.run_script("delete from stream_test where id >= 10", stream=True) is None
+    assert db.run_script("select count(*) from stream_test") == [(10,)]
+
+
+def test_insert_many_nulls():
+    buffer = pandas.DataFrame({"a": [1, None], "b": [pandas.NaT, pandas.Timestamp("2020-01-01")],
+                               "c": ["x", float("nan")]})
+    assert BaseDB._buffer_to_rows(buffer) == [(1.0, None, "x"), (None, pandas.Timestamp("2020-01-01"), None)]
+
+    db = SQLiteDB(file_name=":memory:")
+    db.run_script("create table null_test (id integer, name text, score real)")
+    frame = pandas.DataFrame({"id": range(100), "name": [None if i % 3 == 0 else "n" + str(i) for i in range(100)],
+                              "score": [float("nan") if i % 4 == 0 else i / 2 for i in range(100)]})
+    db.insert_many(frame, "null_test")
+    rows = db.run_script("select * from null_test order by id")
+    assert rows[:5] == [(0, None, None), (1, "n1", 0.5), (2, "n2", 1.0), (3, None, 1.5), (4, "n4", None)]
+    assert db.run_script("select count(*) from null_test where name is null") == [(34,)]
+    assert db.run_script("select count(*) from null_test where score is null") == [(25,)]
+
+
+def test_query_cache():
+    db = SQLiteDB(file_name=":memory:")
+    db.run_script("create table cache_test (id integer, name text)")
+    db.insert_many([{"id": i, "name": "name_" + str(i)} for i in range(10)], "cache_test")
+    BaseDB.clear_query_cache()
+    script = "select name from cache_test where id = :id -- the id"
+    assert db.run_script(script, params={"id": 1}) == [("name_1",)]
+    info = BaseDB.query_cache_info()
+    assert info.prepare["misses"] == 1 and info.prepare["hits"] == 0
+    # the same sql code with other params: a cache hit, the values are bound again
+    assert db.run_script(script, params={"id": 2}) == [("name_2",)]
+    assert db.run_script(script, params={"id": 3}) == [("name_3",)]
+    info = BaseDB.query_cache_info()
+    assert info.prepare["misses"] == 1 and info.prepare["hits"] == 2
+    assert info.tokenizer["hits"] == 2
+    assert db.run_script("select name from cache_test where id = ?", params=[4]) == [("name_4",)]
+    assert BaseDB.query_cache_info().prepare["misses"] == 2
+    BaseDB.clear_query_cache()
+    assert BaseDB.query_cache_info().prepare["currsize"] == 0
 
 
 def main_test():
+    test_infer_column_type()
+    test_convert_date_column()
+    test_insert_many_pipeline_error()
+    test_pooled_with_block()
+    test_run_script_timeout()
+    test_export()
+    test_async_run_script()
+    test_copy_buffer()
+    test_stream()
+    test_insert_many_nulls()
+    test_query_cache()
     db = SQLiteDB()
     db.run_script("""create table test (a integer)""")
     db.insert_many([{"a": i} for i in range(100)], "test")
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio front-end of the database managers.
+The calls run on a thread executor over a pool of connexions of the sync class (see BaseDB.init_pool),
+so the sql code is prepared (_prepare_query) and the errors are reported exactly like with the sync classes,
+and the concurrent calls don't wait for a single connexion. LAST_RUN_SCRIPT_ERROR is the error of the last
+run_script of the current task (the concurrent calls don't overwrite it).
+
+    async with AsyncSQLiteDB(file_name="database.db") as db:
+        res = await db.run_script("select * from table_name where id=:id", params={"id": 1})
+        async for batch in await db.run_script("select * from table_name", stream=True):
+            ...
+"""
+import asyncio
+import contextvars
+import functools
+import importlib
+
+from kb_package import tools
+from kb_package.tools import INFINITE
+
+
+class AsyncBaseDB:
+    # (module, class name) of the sync database manager
+    SYNC_DB = None
+    DEFAULT_POOL_SIZE = 5
+
+    def __init__(self, uri=None, *, pool_size=None, max_overflow=10, executor=None, **kwargs):
+        """
+        Args:
+            uri: the uri of the sync class
+            pool_size: int, nb of connexions kept open, default DEFAULT_POOL_SIZE
+            max_overflow: int, nb of extra connexions permitted when all the pool is used
+            executor: concurrent.futures.Executor used for the calls, default a ThreadPoolExecutor
+                with a worker for each connexion of the pool
+            kwargs: the connexion arguments (host, user, password, db_name, port, file_name, logger, ...)
+        """
+        self._last_error = contextvars.ContextVar("LAST_RUN_SCRIPT_ERROR", default=None)
+        module, name = self.SYNC_DB
+        db_class = getattr(importlib.import_module(module, package=__package__), name)
+        pool_size = self.DEFAULT_POOL_SIZE if pool_size is None else pool_size
+        self.db = db_class(uri, pool_size=pool_size, max_overflow=max_overflow, **kwargs)
+        self._own_executor = executor is None
+        self._executor = executor or tools.thread.ThreadPoolExecutor(
+            max_workers=max(pool_size + max_overflow, 1), thread_name_prefix=self._get_name)
+
+    @property
+    def _get_name(self):
+        return self.__class__.__name__
+
+    def __getattr__(self, item):
+        # LAST_REQUEST_COLUMNS, pool, ... of the sync database manager
+        if item in ("db", "_last_error"):
+            raise AttributeError(item)
+        return getattr(self.db, item)
+
+    @property
+    def LAST_RUN_SCRIPT_ERROR(self):
+        """
+        The error of the last run_script of the current task (None when it succeeded)
+        """
+        return self._last_error.get()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def run_script(self, script, params=None, *, retrieve=None, limit=INFINITE, ignore_error=False,
+                         dict_res=False, export=False, export_name=None, sep=";", stream=False, batch_size=None):
+        """
+        Awaitable BaseDB.run_script, same arguments.
+        With stream=True, returns an async iterator of the batches of rows:
+
+            async for batch in await db.run_script(script, stream=True):
+                ...
+        """
+        self._last_error.set(None)
+        result, error, exception = await self._run(
+            self._run_script_call, script, params, retrieve=retrieve, limit=limit, ignore_error=ignore_error,
+            dict_res=dict_res, export=export, export_name=export_name, sep=sep, stream=stream, batch_size=batch_size)
+        self._last_error.set(error)
+        if exception is not None:
+            raise exception
+        if stream and hasattr(result, "__next__"):
+            return self._iter_batches(result)
+        return result
+
+    def _run_script_call(self, script, params, **kwargs):
+        # in the thread of the executor: the error of this call, not the last one of all the threads
+        try:
+            result, exception = self.db.run_script(script, params, **kwargs), None
+        except Exception as ex:
+            result, exception = None, ex
+        return result, getattr(self.db._local, "run_script_error", None), exception
+
+    async def _iter_batches(self, batches):
+        try:
+            while True:
+                batch = await self._run(next, batches, None)
+                if batch is None:
+                    break
+                yield batch
+        finally:
+            # give back the connexion of the stream
+            await self._run(batches.close)
+
+    async def insert_many(self, data, table_name, **kwargs):
+        """
+        Awaitable BaseDB.insert_many, same arguments
+        """
+        return await self._run(self.db.insert_many, data, table_name, **kwargs)
+
+    async def insert(self, value: dict, table_name, **kwargs):
+        return await self._run(self.db.insert, value, table_name, **kwargs)
+
+    async def create_table(self, arg, table_name=None, **kwargs):
+        """
+        Awaitable BaseDB.create_table, same arguments
+        """
+        return await self._run(self.db.create_table, arg, table_name, **kwargs)
+
+    async def close(self):
+        """
+        Close the connexions and the executor
+        """
+        await self._run(self.db.close_pool)
+        self.db.close_connection()
+        if self._own_executor:
+            self._executor.shutdown(wait=False)
+
+
+class AsyncPostgresDB(AsyncBaseDB):
+    SYNC_DB = (".postgresdb", "PostgresDB")
+
+
+class AsyncMysqlDB(AsyncBaseDB):
+    SYNC_DB = (".mysqldb", "MysqlDB")
+
+
+class AsyncSQLiteDB(AsyncBaseDB):
+    SYNC_DB = (".sqlitedb", "SQLiteDB")
+
+    def __init__(self, uri=None, *, pool_size=None, max_overflow=10, executor=None, **kwargs):
+        file_name = (uri.get("file_name") if isinstance(uri, dict) else uri) or kwargs.get("file_name")
+        if not file_name or file_name == ":memory:":
+            # a database in memory lives in a single connexion: the calls are run one by one
+            module, name = self.SYNC_DB
+            db_class = getattr(importlib.import_module(module, package=__package__), name)
+            self._last_error = contextvars.ContextVar("LAST_RUN_SCRIPT_ERROR", default=None)
+            self.db = db_class(uri, check_same_thread=False, **kwargs)
+            self._own_executor = executor is None
+            self._executor = executor or tools.thread.ThreadPoolExecutor(max_workers=1,
+                                                                         thread_name_prefix=self._get_name)
+            return
+        super().__init__(uri, pool_size=pool_size, max_overflow=max_overflow, executor=executor, **kwargs)
+
+
+if __name__ == '__main__':
+    async def _main():
+        async with AsyncSQLiteDB() as db:
+            await db.run_script("create table test(id int, name text)")
+            await db.insert_many([{"id": i, "name": "name_" + str(i)} for i in range(100)], "test")
+            print(await db.run_script("select count(*) from test"))
+            async for batch in await db.run_script("select * from test", stream=True, batch_size=40):
+                print(len(batch))
+
+    asyncio.run(_main())
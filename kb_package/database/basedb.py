@@ -1,46 +1,235 @@
 from __future__ import annotations
 
 import abc
+import contextlib
 import csv
+import functools
+import inspect
+import itertools
+import queue
 import re
+import threading
+import time
 import traceback
+import types
 import typing
 
 import pandas
-from pandas.api.types import is_float_dtype, is_integer_dtype
+from pandas.api.types import is_float_dtype, is_integer_dtype, is_numeric_dtype
 from kb_package.tools import INFINITE
 import os
 from kb_package import tools
 from kb_package.utils.fdataset import DatasetFactory
+from kb_package.database.connection_pool import ConnectionPool
+from kb_package.database.exporter import CursorExporter
+
+
+DEFAULT_DATE_FORMAT = ("%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%d-%m-%Y", "%d_%m_%Y", "%Y_%m_%d",
+                       "%d %B %Y", "%d-%B-%Y")
+# time parts tried after the date formats by the vectorized parsing
+_TIME_FORMAT = ("", " %H:%M:%S", " %H:%M", "T%H:%M:%S", " %H:%M:%S.%f", "T%H:%M:%S.%f",
+                "T%H:%M:%S%z", "T%H:%M:%S.%f%z", " %H:%M:%S%z")
+# regex of the strptime directives: a value is parsed with a format only if it matches it exactly
+_DIRECTIVE_REGEX = {"Y": r"\d{4}", "y": r"\d{2}", "m": r"\d{1,2}", "d": r"\d{1,2}", "H": r"\d{1,2}",
+                    "I": r"\d{1,2}", "M": r"\d{1,2}", "S": r"\d{1,2}", "f": r"\d{1,9}", "j": r"\d{1,3}",
+                    "B": r"[^\W\d_]+", "b": r"[^\W\d_]+", "p": r"[AaPp][Mm]", "z": r"(?:Z|[+-]\d{2}(?::?\d{2})?)",
+                    "%": "%"}
+# strptime format -> nb of values parsed with it, the most used formats are tried first
+_DATE_FORMAT_HITS = {}
 
 
 def _parse_date_value(value, format_=()):
-    default_date_format = ("%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%d-%m-%Y", "%d_%m_%Y", "%Y_%m_%d",
-                           "%d %B %Y", "%d-%B-%Y")
     if not format_:
-        format_ = default_date_format
+        format_ = DEFAULT_DATE_FORMAT
     elif isinstance(format_, str):
-        format_ = list(default_date_format) + [format_]
+        format_ = list(DEFAULT_DATE_FORMAT) + [format_]
     if pandas.isnull(value):
         return None, False
     value = tools.CustomDateTime(str(value), d_format=format_)
     return value.to_string("yyyy-mm-dd hh:mm:ss"), value.is_datetime
 
 
+@functools.lru_cache(maxsize=64)
+def _get_date_formats(format_=()):
+    # the strptime formats (date + time) tried by the vectorized parsing
+    if isinstance(format_, str):
+        format_ = (format_,)
+    formats = []
+    for ff in tuple(DEFAULT_DATE_FORMAT) + tuple(format_ or ()):
+        if "%" not in ff:
+            ff, _ = tools.CustomDateTime._parse_format(ff)
+        formats.extend(ff + t for t in _TIME_FORMAT if ff + t not in formats)
+    return tuple(formats)
+
+
+@functools.lru_cache(maxsize=256)
+def _format_regex(format_):
+    # regex of the values of a strptime format, unknown directives match anything
+    regex = re.sub(r"%(.)|([^%]+)", lambda m: _DIRECTIVE_REGEX.get(m.group(1), ".+?") if m.group(1)
+                   else re.escape(m.group(2)), format_)
+    return re.compile(regex)
+
+
+def _to_datetime(values, format_):
+    """
+    pandas.to_datetime of the values matching exactly the format (pandas parses "2020-01" or "20231201"
+    with the iso formats). The dates with an offset are converted to UTC, without timezone
+    Args:
+        values: pandas.Series of str
+        format_: str, strptime format
+
+    Returns: pandas.Series of datetime64 with the index of values, NaT when not parsed
+    """
+    matching = values[values.str.fullmatch(_format_regex(format_)).fillna(False).astype(bool)]
+    if matching.empty:
+        return pandas.Series(pandas.NaT, index=values.index, dtype="datetime64[ns]")
+    parsed = pandas.to_datetime(matching, format=format_, errors="coerce", utc=True)
+    return parsed.dt.tz_localize(None).reindex(values.index)
+
+
+def _parse_dates(values, format_=()):
+    """
+    Vectorized parsing of a Series of str with the date formats
+    Args:
+        values: pandas.Series of str
+        format_: str|list, the formats tried after the default ones
+
+    Returns: (pandas.Series of datetime64 (NaT when not parsed), dict format -> nb of values parsed)
+
+    """
+    formats = sorted(_get_date_formats(tuple(format_) if isinstance(format_, list) else format_),
+                     key=lambda ff: -_DATE_FORMAT_HITS.get(ff, 0))
+    parsed = pandas.Series(pandas.NaT, index=values.index, dtype="datetime64[ns]")
+    residual = pandas.Series(True, index=values.index)
+    hits = {}
+    for ff in formats:
+        if not residual.any():
+            break
+        res = _to_datetime(values[residual], ff)
+        ok = res.notna()
+        if ok.any():
+            parsed[res.index[ok]] = res[ok]
+            residual[res.index[ok]] = False
+            hits[ff] = int(ok.sum())
+            _DATE_FORMAT_HITS[ff] = _DATE_FORMAT_HITS.get(ff, 0) + hits[ff]
+    return parsed, hits
+
+
+def infer_column_type(series, date_format=(), sample_size=None, random_state=0):
+    """
+    Vectorized inference of the type of an object column: NO (string), DATETIME or DATE.
+    The values are parsed with pandas.to_datetime and the formats most used first;
+    only the values none of the formats parse go to CustomDateTime. Stop at the first value which is not a date.
+    Args:
+        series: pandas.Series
+        date_format: str|list, the formats of the dates, tried after the default ones
+        sample_size: int, infer from a sample of sample_size rows (deterministic for a random_state).
+            None for all the rows
+        random_state: int, the seed of the sample
+
+    Returns: Cdict(kind=NO|DATETIME|DATE, date_format=the dominant strptime format or None)
+
+    """
+    result = tools.Cdict(kind="DATE", date_format=None)
+    values = series.dropna()
+    if sample_size and len(values) > sample_size:
+        values = values.sample(n=int(sample_size), random_state=random_state)
+    values = values.astype(str)
+    hits = {}
+    start, step = 0, 100
+    while start < len(values):
+        # a little buffer first: most of the string columns are rejected at the first values
+        buffer = values.iloc[start: start + step]
+        start, step = start + step, 10000
+        # values CustomDateTime refuses, and the numbers (ids like 20231201)
+        if ((buffer.str.len() < 6) | buffer.str.contains(r"\d{9,}") | ~buffer.str.contains(r"\d{2}") |
+                buffer.str.fullmatch(r"[+-]?\d+(?:\.\d*)?")).any():
+            result.kind = "NO"
+            return result
+        parsed, buffer_hits = _parse_dates(buffer, date_format)
+        for ff, nb in buffer_hits.items():
+            hits[ff] = hits.get(ff, 0) + nb
+        if result.kind != "DATETIME" and (parsed.dropna() != parsed.dropna().dt.normalize()).any():
+            result.kind = "DATETIME"
+        for value in buffer[parsed.isna()]:
+            try:
+                if _parse_date_value(value, format_=date_format)[1]:
+                    result.kind = "DATETIME"
+            except (ValueError, AssertionError, Exception):
+                result.kind = "NO"
+                return result
+    if hits:
+        result.date_format = max(hits, key=hits.get)
+    return result
+
+
+def convert_date_column(series, kind="DATETIME", date_format=(), sample_size=1000):
+    """
+    Vectorized conversion of a column of dates: the dominant format is detected from a sample of the values
+    and the whole column is parsed with it in one pass. The values it doesn't parse are parsed with the
+    other formats, then by CustomDateTime for the residual rows. The dates with an offset are converted to UTC.
+    Args:
+        series: pandas.Series
+        kind: str, DATETIME (datetime.datetime values) or DATE (datetime.date values)
+        date_format: str|list, the formats of the dates, tried before the default ones
+        sample_size: int, nb of values used to detect the dominant format
+
+    Returns: (pandas.Series of object, None for null values or not parsed, nb of rows parsed by CustomDateTime)
+
+    """
+    values = series.dropna().astype(str)
+    result = pandas.Series(None, index=series.index, dtype=object)
+    if values.empty:
+        return result, 0
+    if isinstance(date_format, str):
+        date_format = [date_format]
+    formats = _get_date_formats(tuple(date_format or ()))
+    # the formats given first: they decide for the ambiguous values (01/02/2020)
+    formats = [ff for ff in formats[len(DEFAULT_DATE_FORMAT) * len(_TIME_FORMAT):]] + list(formats)
+    sample = values.iloc[:sample_size]
+    dominant, best = None, 0
+    for ff in dict.fromkeys(formats):
+        nb = _to_datetime(sample, ff).notna().sum()
+        if nb > best:
+            dominant, best = ff, nb
+        if best == len(sample):
+            break
+    parsed = pandas.Series(pandas.NaT, index=values.index, dtype="datetime64[ns]")
+    if dominant is not None:
+        parsed = _to_datetime(values, dominant)
+    residual = parsed.isna()
+    if residual.any():
+        # the others formats
+        parsed[residual] = _parse_dates(values[residual], date_format)[0]
+        residual = parsed.isna()
+    ok = parsed.notna()
+    if kind == "DATE":
+        result[values.index[ok]] = parsed[ok].dt.date
+    else:
+        result[values.index[ok]] = pandas.Series(parsed[ok].dt.to_pydatetime(), index=values.index[ok],
+                                                 dtype=object)
+    nb_fallback = int(residual.sum())
+    for index, value in values[residual].items():
+        try:
+            value = tools.CustomDateTime(value)()
+        except (ValueError, AssertionError, Exception):
+            continue
+        result[index] = value.date() if kind == "DATE" else value
+    return result, nb_fallback
+
+
 def _can_be_datetime_field(series, date_format=()):
     # returns NO, DATETIME, DATE
     try:
-        for ss in tools.get_buffer(series, 10000, vv=False):
-            res = ss.apply(lambda val: _parse_date_value(val, format_=date_format))
-            if any([d[1] for d in res]):
-                return "DATETIME"
-            if len([... for d in res if d[0] is not None]) >= len(ss)/3:
-                return "DATE"
-        return "DATE"
+        return infer_column_type(series, date_format=date_format).kind
     except (ValueError, AssertionError, Exception):
         return "NO"
 
 
+# escapes of the text format of COPY (see BaseDB._write_copy_buffer)
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
 class BaseDB(abc.ABC):
     MYSQL_DEFAULT_PORT = 3306
     DEFAULT_PORT = None
@@ -50,8 +239,20 @@ class BaseDB(abc.ABC):
     MAX_BUFFER_INSERTING_SIZE = 100000
     LAST_REQUEST_COLUMNS = None
     LAST_RUN_SCRIPT_ERROR = None
+    # manifest of the last export (see CursorExporter)
+    LAST_EXPORT_MANIFEST = None
 
     MAX_PARAMETERS = 1200
+    STREAM_BATCH_SIZE = 10000
+    # DB-API paramstyle of the driver for positional params: format (%s), qmark (?), numeric (:1)
+    PARAM_STYLE = "format"
+    # nb of sql codes kept compiled (see _compile_query and _tokenize_script). Read at the first query: a new
+    # value of BaseDB.QUERY_CACHE_SIZE (shared by all the databases) rebuilds the caches, empty
+    QUERY_CACHE_SIZE = 1024
+    _QUERY_CACHES = None
+    # sql types used by create_table for the inferred columns
+    DATETIME_TYPE = "datetime"
+    TEXT_TYPE = "text"
 
     def __init__(self, uri=None, **kwargs):
         """
@@ -99,15 +300,98 @@ class BaseDB(abc.ABC):
         self._print_error = print
         self.set_logger(self._kwargs.get("logger"))
 
-        self.db_object = None
+        self._local = threading.local()
+        self._db_object = None
         self._cursor_ = None
+        self.pool = None
+        pool_kwargs = {k: self._kwargs.pop(k) for k in ("pool_size", "max_overflow", "pool_timeout",
+                                                        "idle_timeout", "pool_recycle") if k in self._kwargs}
+        if pool_kwargs.get("pool_size"):
+            self.init_pool(**pool_kwargs)
+
+    @property
+    def db_object(self):
+        # with a pool, the connexion checkout by the current thread
+        connexion = getattr(self._local, "db_object", None)
+        if connexion is not None:
+            return connexion
+        return self._db_object
+
+    @db_object.setter
+    def db_object(self, value):
+        if getattr(self._local, "db_object", None) is not None:
+            self._local.db_object = value
+        else:
+            self._db_object = value
+
+    def init_pool(self, pool_size=5, max_overflow=10, pool_timeout=30, idle_timeout=300, pool_recycle=None):
+        """
+        Use a pool of connexions: run_script and insert_many checkout their own connexion,
+        so they can be called concurrently from many threads.
+        Args:
+            pool_size: int, nb of connexions kept open
+            max_overflow: int, nb of extra connexions permitted when all the pool is used
+            pool_timeout: float, nb of seconds to wait for a free connexion
+            idle_timeout: float, nb of seconds after which an unused connexion is closed
+            pool_recycle: float, nb of seconds after which a connexion is re-opened
+
+        Returns: ConnectionPool
+
+        """
+        if str(self._get_name).lower() == "sqlitedb":
+            if self.file_name == ":memory:":
+                raise ValueError("Bad argument pool_size set. for SQLiteDB in memory, "
+                                 "impossible to use many connexions")
+            # the connexions go from a thread to another
+            self._kwargs["check_same_thread"] = False
+        self.close_pool()
+        self.pool = ConnectionPool(lambda: self.connect(**self._kwargs), pool_size=pool_size,
+                                   max_overflow=max_overflow, timeout=pool_timeout, idle_timeout=idle_timeout,
+                                   recycle=pool_recycle, is_alive=self._is_connected)
+        return self.pool
+
+    def close_pool(self):
+        if self.pool is not None:
+            self.pool.dispose()
+            self.pool = None
+
+    @contextlib.contextmanager
+    def pooled_connexion(self):
+        """
+        Checkout a connexion of the pool for the current thread: db_object refers to it inside the block.
+        Without pool (or when the thread already got one) it's the current connexion.
+        """
+        if self.pool is None or getattr(self._local, "db_object", None) is not None:
+            yield self.db_object
+            return
+        self._local.db_object = self.pool.checkout()
+        try:
+            yield self._local.db_object
+        finally:
+            connexion = self._local.db_object
+            self._local.db_object = None
+            self.pool.checkin(connexion)
 
     @property
     def _get_name(self):
         return self.__class__.__name__
 
+    @property
+    def _cursor_(self):
+        # the cursor of the `with` block of the current thread
+        return getattr(self._local, "cursor", None)
+
+    @_cursor_.setter
+    def _cursor_(self, value):
+        self._local.cursor = value
+
     def __enter__(self):
-        self.reload_connexion()
+        if self.pool is not None and getattr(self._local, "db_object", None) is None:
+            # the block works on a connexion of the pool, given back at the exit
+            self._local.db_object = self.pool.checkout()
+            self._local.block_connexion = True
+        else:
+            self.reload_connexion()
         self._cursor_ = self._cursor()
         return self._cursor_
 
@@ -118,7 +402,16 @@ class BaseDB(abc.ABC):
             pass
         finally:
             self._cursor_ = None
-            self.close_connection()
+            if getattr(self._local, "block_connexion", False):
+                connexion = self._local.db_object
+                self._local.db_object, self._local.block_connexion = None, False
+                try:
+                    connexion.commit()
+                except (AttributeError, Exception):
+                    pass
+                self.pool.checkin(connexion)
+            else:
+                self.close_connection()
 
     def set_logger(self, logger):
         if hasattr(logger, "info"):
@@ -173,6 +466,15 @@ class BaseDB(abc.ABC):
     def prepare_insert_data(data: dict):
         return ["%s" for _ in data], data
 
+    @classmethod
+    def _placeholders(cls, size):
+        # positional placeholders following PARAM_STYLE
+        if cls.PARAM_STYLE == "qmark":
+            return ["?"] * size
+        if cls.PARAM_STYLE == "numeric":
+            return [":" + str(i + 1) for i in range(size)]
+        return ["%s"] * size
+
     def insert(self, value: dict, table_name, cur=None, retrieve_id=False):
         part_vars = [str(k) for k in value.keys()]
 
@@ -209,24 +511,103 @@ class BaseDB(abc.ABC):
     def db_types(self):
         return "SQL"
 
+    @staticmethod
+    def _buffer_to_rows(buffer: pandas.DataFrame):
+        # list of tuples with None for null values
+        values = buffer.to_numpy(dtype=object, copy=True)
+        values[pandas.isnull(values)] = None
+        return list(map(tuple, values))
+
+    @staticmethod
+    def _write_csv_buffer(buffer: pandas.DataFrame, file, null="", sep=",", header=False, escape=None):
+        """
+        Write the buffer as csv (used by the native bulk loads)
+        Args:
+            buffer: pandas.DataFrame
+            file: text file like object
+            null: str, the value written for null cells
+            sep: str, csv separator
+            header: bool, write the columns names
+            escape: str, escape character to double in the string cells
+        """
+        values = BaseDB._buffer_values(buffer, escape)
+        values[pandas.isnull(values)] = null
+        writer = csv.writer(file, delimiter=sep, lineterminator="\n")
+        if header:
+            writer.writerow(buffer.columns)
+        writer.writerows(values)
+
+    @staticmethod
+    def _write_copy_buffer(buffer: pandas.DataFrame, file):
+        """
+        Write the buffer in the text format of COPY (postgres): tab separated, \\N for null cells,
+        the backslashes, tabs and new lines of the values escaped
+        Args:
+            buffer: pandas.DataFrame
+            file: text file like object
+        """
+        values = BaseDB._buffer_values(buffer)
+        nulls = pandas.isnull(values)
+        file.writelines("\t".join("\\N" if null else str(value).translate(_COPY_ESCAPES)
+                                  for value, null in zip(row, row_nulls)) + "\n"
+                        for row, row_nulls in zip(values, nulls))
+
+    @staticmethod
+    def _buffer_values(buffer: pandas.DataFrame, escape=None):
+        # cells of the buffer to write in a file (see _write_csv_buffer)
+        values = buffer.to_numpy(dtype=object, copy=True)
+        for index in range(buffer.shape[1]):
+            col = buffer.iloc[:, index]
+            if is_float_dtype(col) and (col.dropna() % 1 == 0).all():
+                # int columns with null values: avoid to write 1.0 in an int field
+                values[:, index] = col.astype("Int64").to_numpy(dtype=object)
+            elif escape and not is_numeric_dtype(col):
+                values[:, index] = [val.replace(escape, escape * 2) if isinstance(val, str) else val
+                                    for val in values[:, index]]
+        return values
+
+    def _bulk_load(self, cursor, table_name, columns, buffer: pandas.DataFrame):
+        """
+        Native fast path of the database to load a buffer of data.
+        Args:
+            cursor: cursor object
+            table_name: str
+            columns: list of the columns names
+            buffer: pandas.DataFrame
+
+        Returns: bool, False if the database don't have a native path (insert_many use executemany)
+
+        """
+        return False
+
     def insert_many(self, data: typing.Union[list, pandas.DataFrame, str], table_name, verbose=False,
                     **kwargs):
+        """
+        Insert the data by buffer of MAX_BUFFER_INSERTING_SIZE rows
+        Args:
+            data: list|pandas.DataFrame|str, data or path to the file
+            table_name: str
+            verbose: bool
+            **kwargs:
+                loader: callable, called with the progression after each buffer: loader(progress) or
+                    loader(progress, rows_per_second)
+                bulk: bool, use the native bulk load of the database when it exists (see _bulk_load)
+                workers: int, nb of writer connexions. More than 1 for the pipelined mode
+                    (see _insert_many_pipeline)
+                and the DatasetFactory args
+
+        """
         print = self._print_info
-        loader = kwargs.pop("loader", None)
-        if self._cursor_:
-            cursor = self._cursor_
-        else:
-            cursor = self.get_cursor()
+        loader = self._loader_callback(kwargs.pop("loader", None))
+        bulk = kwargs.pop("bulk", False)
+        workers = int(kwargs.pop("workers", None) or 1)
 
         dataset = DatasetFactory(data, **kwargs).dataset
         size = dataset.shape[0]
         if not size:
             return
-        # dataset = dataset.to_dict("records")
-        first_value = dataset.loc[0].to_dict()
-        part_vars = [str(k) for k in first_value.keys()]
-
-        xx, _ = self.prepare_insert_data(first_value)
+        part_vars = [str(k) for k in dataset.columns]
+        xx = self._placeholders(len(part_vars))
 
         script = "INSERT INTO " + str(table_name) + \
                  " ( " + ",".join(part_vars) + \
@@ -234,18 +615,30 @@ class BaseDB(abc.ABC):
         if verbose:
             print("Inserting ...")
             tools.ConsoleFormat.progress(0)
+        if workers > 1:
+            self._insert_many_pipeline(dataset, script, table_name, part_vars, workers=workers, bulk=bulk,
+                                       loader=loader, verbose=verbose)
+            if verbose:
+                print("... Finish ...")
+            return
+        with self.pooled_connexion():
+            self._insert_many(dataset, script, table_name, part_vars, bulk=bulk, loader=loader, verbose=verbose)
+
+    def _insert_many(self, dataset, script, table_name, part_vars, bulk=False, loader=None, verbose=False):
+        print = self._print_info
+        if self._cursor_:
+            cursor = self._cursor_
+        else:
+            cursor = self.get_cursor()
+        start_time = time.time()
+        nb_rows = 0
         for t, buffer in tools.get_buffer(dataset, max_buffer=self.MAX_BUFFER_INSERTING_SIZE):
-            buffer = buffer.astype(object).replace(DatasetFactory.NAN, None).to_dict("records")
             try:
-                self._execute(cursor, script,
-                              params=[
-                                  {
-                                      k: v
-                                      if not pandas.isnull(v) else None
-                                      for k, v in row.items()
-                                  } for row in buffer], method="many")
-                if callable(loader):
-                    loader(t)
+                if not (bulk and self._bulk_load(cursor, table_name, part_vars, buffer)):
+                    self._execute(cursor, script, params=self._buffer_to_rows(buffer), method="many",
+                                  connexion=self.db_object)
+                nb_rows += buffer.shape[0]
+                loader(t, nb_rows / max(time.time() - start_time, 1e-6))
                 if verbose:
                     tools.ConsoleFormat.progress(100 * t)
                 self.commit()
@@ -258,6 +651,96 @@ class BaseDB(abc.ABC):
             print("... Finish ...")
         self.commit()
 
+    @staticmethod
+    def _loader_callback(loader):
+        # loader(progress) or loader(progress, rows_per_second)
+        if not callable(loader):
+            return lambda progress, speed: None
+        try:
+            parameters = inspect.signature(loader).parameters.values()
+            with_speed = any([p.kind == p.VAR_POSITIONAL for p in parameters]) or len(
+                [p for p in parameters if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)]) > 1
+        except (TypeError, ValueError):
+            with_speed = False
+        if with_speed:
+            return loader
+        return lambda progress, speed: loader(progress)
+
+    def _insert_many_pipeline(self, dataset, script, table_name, columns, workers=2, bulk=False, loader=None,
+                              verbose=False):
+        """
+        Pipelined insert_many: the current thread prepares the buffers while `workers` threads,
+        each with its own connexion, execute and commit them.
+        The queue of buffers is bounded (2 buffers by worker), so the preparation waits for the writers.
+        """
+        if str(self._get_name).lower() == "sqlitedb" and self.file_name == ":memory:":
+            raise ValueError("Bad argument workers set. for SQLiteDB in memory, impossible to use many connexions")
+        loader = loader or self._loader_callback(None)
+        size = dataset.shape[0]
+        buffers = queue.Queue(maxsize=2 * workers)
+        stop = threading.Event()
+        lock = threading.Lock()
+        state = {"rows": 0, "error": None}
+        start_time = time.time()
+
+        def fail(ex):
+            with lock:
+                if state["error"] is None:
+                    state["error"] = ex
+            stop.set()
+
+        def writer():
+            connexion = None
+            try:
+                connexion = self.connect(**self._kwargs)
+                cursor = connexion.cursor()
+            except Exception as ex:
+                fail(ex)
+            while True:
+                buffer = buffers.get()
+                if buffer is None:
+                    break
+                if stop.is_set():
+                    # keep consuming: the producer must never be blocked
+                    continue
+                try:
+                    if isinstance(buffer, pandas.DataFrame):
+                        if not self._bulk_load(cursor, table_name, columns, buffer):
+                            self._execute(cursor, script, params=self._buffer_to_rows(buffer), method="many",
+                                          connexion=connexion)
+                    else:
+                        self._execute(cursor, script, params=buffer, method="many", connexion=connexion)
+                    connexion.commit()
+                    with lock:
+                        state["rows"] += len(buffer)
+                        loader(state["rows"] / size, state["rows"] / max(time.time() - start_time, 1e-6))
+                        if verbose:
+                            tools.ConsoleFormat.progress(100 * state["rows"] / size)
+                except Exception as ex:
+                    fail(ex)
+            try:
+                connexion.close()
+            except (AttributeError, Exception):
+                pass
+
+        with tools.thread.ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in range(workers):
+                executor.submit(writer)
+            try:
+                for buffer in tools.get_buffer(dataset, max_buffer=self.MAX_BUFFER_INSERTING_SIZE, vv=False):
+                    if stop.is_set():
+                        break
+                    buffers.put(buffer if bulk else self._buffer_to_rows(buffer))
+            except BaseException as ex:
+                # the writers skip the buffers left, the error is raised once they are stopped
+                stop.set()
+                raise ex
+            finally:
+                for _ in range(workers):
+                    buffers.put(None)
+        if state["error"] is not None:
+            self._print_error(state["error"])
+
     def get_cursor(self):
         """
         Get mysql cursor for making requests
@@ -282,15 +765,17 @@ class BaseDB(abc.ABC):
             pass
 
     def _set_last_exception_after_execute(self, last_script_part, exception, min_line=0, params=None):
-        self.LAST_RUN_SCRIPT_ERROR = tools.Cdict(msg=str(exception).split("\n")[0],
-                                                 min_line=min_line,
-                                                 max_line=min_line + last_script_part.count("\n"),
-                                                 params=params)
+        error = tools.Cdict(msg=str(exception).split("\n")[0],
+                            min_line=min_line,
+                            max_line=min_line + last_script_part.count("\n"),
+                            params=params)
         if hasattr(exception, "offset"):
             line = last_script_part[:int(exception.offset)].count("\n") + min_line
-            self.LAST_RUN_SCRIPT_ERROR.script = last_script_part
-            self.LAST_RUN_SCRIPT_ERROR.offset = exception.offset
-            self.LAST_RUN_SCRIPT_ERROR.error_line = line
+            error.script = last_script_part
+            error.offset = exception.offset
+            error.error_line = line
+        # also kept by thread: the error of the call of this thread (see AsyncBaseDB.run_script)
+        self.LAST_RUN_SCRIPT_ERROR = self._local.run_script_error = error
 
     @staticmethod
     @abc.abstractmethod
@@ -310,7 +795,7 @@ class BaseDB(abc.ABC):
 
         """
 
-    def _is_connected(self):
+    def _is_connected(self, connexion=None):
         return True
 
     def commit(self):
@@ -329,6 +814,82 @@ class BaseDB(abc.ABC):
             index_data += 1
             yield row
 
+    @staticmethod
+    def _fetchmany(cursor, batch_size=None, limit=INFINITE):
+        index_data = 0
+        batch_size = int(batch_size or BaseDB.STREAM_BATCH_SIZE)
+        while index_data < limit:
+            rows = cursor.fetchmany(min(batch_size, limit - index_data))
+            if not rows:
+                break
+            index_data += len(rows)
+            yield rows
+
+    def _stream_cursor(self, batch_size=None):
+        """
+        Get the cursor used to stream the result of a query.
+        By default, it's a simple cursor with the arraysize set to batch_size.
+        Subclasses override it to use a server-side cursor when the driver supports it.
+        Args:
+            batch_size: int, nb of rows fetch by round trip
+
+        Returns: cursor object
+
+        """
+        if not self._is_connected():
+            self.reload_connexion()
+        cursor = self.get_cursor()
+        try:
+            cursor.arraysize = int(batch_size or self.STREAM_BATCH_SIZE)
+        except (AttributeError, Exception):
+            pass
+        return cursor
+
+    def iter_cursor(self, cursor, batch_size=None, limit=INFINITE, dict_res=False, close=False, connexion=None):
+        """
+        Iterate over the cursor results batch by batch (fetchmany). Only one batch is kept in memory
+        Args:
+            cursor: cursor object after execute
+            batch_size: int, nb of rows by batch
+            limit: int, nb max of rows to retrieve
+            dict_res: bool, yield rows as tools.Cdict
+            close: bool, close the cursor and commit when the iteration is finish
+            connexion: the connexion of the cursor, committed when close. Default the connexion of the thread
+                at the call (the iteration can be done after the pooled connexion is released)
+
+        Returns: generator of list of rows
+
+        """
+        if connexion is None:
+            connexion = self.db_object
+        return self._iter_cursor(cursor, batch_size, limit, dict_res, close, connexion)
+
+    def _iter_cursor(self, cursor, batch_size, limit, dict_res, close, connexion):
+        try:
+            self.LAST_REQUEST_COLUMNS = None
+            if not self._check_if_cursor_has_rows(cursor):
+                return
+            columns = self._get_cursor_description(cursor).columns or None
+            self.LAST_REQUEST_COLUMNS = columns
+            for rows in self._fetchmany(cursor, batch_size=batch_size, limit=limit):
+                if columns is None:
+                    # server-side cursors got the description only after the first fetch
+                    self.LAST_REQUEST_COLUMNS = self._get_cursor_description(cursor).columns
+                    columns = self.LAST_REQUEST_COLUMNS
+                if dict_res:
+                    rows = [tools.Cdict(dict(zip(columns, row))) for row in rows]
+                yield rows
+        finally:
+            if close:
+                try:
+                    cursor.close()
+                except (AttributeError, Exception):
+                    pass
+                try:
+                    connexion.commit()
+                except (AttributeError, Exception):
+                    pass
+
     @staticmethod
     @abc.abstractmethod
     def _get_cursor_description(cursor):
@@ -338,8 +899,48 @@ class BaseDB(abc.ABC):
     def _check_if_cursor_has_rows(cursor):
         return True
 
+    def export_cursor(self, cursor, export_name, sep=";", limit=INFINITE, batch_size=None, **kwargs):
+        """
+        Export the results of the cursor batch by batch (see CursorExporter). The errors are raised
+        Args:
+            cursor: cursor object after execute
+            export_name: str, the file name: .csv, .csv.gz, .csv.zst or .parquet
+            sep: str, csv separator
+            limit: int, nb max of rows to export
+            batch_size: int, nb of rows fetch by round trip; default STREAM_BATCH_SIZE
+            kwargs: CursorExporter arguments (file_format, compression, manifest, encoding)
+
+        Returns: Cdict, the manifest of the export (also in LAST_EXPORT_MANIFEST),
+            None when the cursor has no result set (no file written)
+
+        """
+        self.LAST_EXPORT_MANIFEST = None
+        batches = self.iter_cursor(cursor, batch_size=batch_size, limit=limit)
+        # server-side cursors got the columns after the first fetch
+        first = next(batches, None)
+        if self.LAST_REQUEST_COLUMNS is None:
+            # no rows: the description of a server-side cursor after the fetch (only the header is written)
+            try:
+                self.LAST_REQUEST_COLUMNS = self._get_cursor_description(cursor).columns or None
+            except (AttributeError, Exception):
+                pass
+        if self.LAST_REQUEST_COLUMNS is None:
+            return None
+        self.LAST_EXPORT_MANIFEST = CursorExporter(export_name, sep=sep, **kwargs).export(
+            itertools.chain([first] if first else [], batches), self.LAST_REQUEST_COLUMNS)
+        return self.LAST_EXPORT_MANIFEST
+
     # @abc.abstractmethod
     def get_all_data_from_cursor(self, cursor, limit=INFINITE, dict_res=False, export_name=None, sep=";"):
+        if export_name is not None and not callable(export_name):
+            self.export_cursor(cursor, export_name, sep=sep, limit=limit)
+            return
+        if callable(export_name):
+            # the errors of the callable are raised
+            for rows in self.iter_cursor(cursor, batch_size=self.STREAM_BATCH_SIZE, limit=limit):
+                for row in rows:
+                    export_name(row, self.LAST_REQUEST_COLUMNS)
+            return
         try:
             self.LAST_REQUEST_COLUMNS = None
             if not self._check_if_cursor_has_rows(cursor):
@@ -352,34 +953,12 @@ class BaseDB(abc.ABC):
 
         data = []
         try:
-            export_file = type("MyTempFile", (), {"__enter__": lambda *args: 1, "__exit__": lambda *args: 1})()
-            if callable(export_name):
-                pass
-            elif export_name is not None:
-                # export_file = open(export_name, "w")
-                export_file = open(export_name, "w", newline="")
-
-            with export_file:
-                writer = None
-                if export_name is not None and not callable(export_name):
-                    writer = csv.writer(export_file, delimiter=sep)
-                    writer.writerow(columns)
-                    # export_file.write(for_csv(columns, sep=sep) + "\n")
-
-                for row in self._fetchone(cursor, limit=limit):
-                    if not row:
-                        break
-                    if dict_res and export_name is None:
-                        row = dict(zip(columns, row))
-                    if callable(export_name):
-                        export_name(row, columns)
-                    elif export_name is not None:
-                        writer.writerow(row)
-                        # export_file.write(for_csv(row, sep=sep) + "\n")
-                    else:
-                        data.append(row)
-            if export_name is not None:
-                return
+            for row in self._fetchone(cursor, limit=limit):
+                if not row:
+                    break
+                if dict_res:
+                    row = dict(zip(columns, row))
+                data.append(row)
         except Exception:
             # traceback.print_exc()
             pass
@@ -391,6 +970,28 @@ class BaseDB(abc.ABC):
 
     @staticmethod
     def _script_tokenizer(sql):
+        return list(BaseDB._tokenize_script(sql))
+
+    @staticmethod
+    def _query_caches():
+        # the lru caches of the compiled sql codes, built with the current QUERY_CACHE_SIZE
+        caches = BaseDB._QUERY_CACHES
+        if caches is None or caches["size"] != BaseDB.QUERY_CACHE_SIZE:
+            size = BaseDB.QUERY_CACHE_SIZE
+            caches = BaseDB._QUERY_CACHES = {"size": size,
+                                             "prepare": functools.lru_cache(maxsize=size)(BaseDB._parse_query),
+                                             "tokenizer": functools.lru_cache(maxsize=size)(BaseDB._parse_script)}
+        return caches
+
+    @staticmethod
+    def _tokenize_script(sql):
+        """
+        The statements of the sql code, cached (see QUERY_CACHE_SIZE)
+        """
+        return BaseDB._query_caches()["tokenizer"](sql)
+
+    @staticmethod
+    def _parse_script(sql):
         # prepare sql code
         sql = BaseDB._uncomment_sql(sql, sigle_line_symbole="--")
 
@@ -429,7 +1030,7 @@ class BaseDB(abc.ABC):
             # query = query.strip()
             if len(query.strip()):
                 queries.append(query)
-        return queries
+        return tuple(queries)
 
     @staticmethod
     def _uncomment_sql(script, sigle_line_symbole="--", show_comments_func=None):
@@ -470,34 +1071,26 @@ class BaseDB(abc.ABC):
             show_comments_func("Got comments: " + repr(comments_list))
         return final_script
 
-    @staticmethod
-    def _prepare_query(sql, params=None, ignore_error=False):
-        query, r = tools.replace_quoted_text(sql)
-        origin_transform_query = query
-        final_params = {}
-        # 1 for args like ":var"; 0 for ?
-        query_prepare_type = 1
-        nb_var = 0
-        got = False
-        code = ""
-        if "?" in query or "%s" in query:
-            got = True
+    @classmethod
+    def _prepare_query(cls, sql, params=None, ignore_error=False):
+        """
+        Prepare the sql code with the params: the IN args are expanded with one placeholder by value.
+        The parsing of the sql is compiled once and kept in cache (see _compile_query); here the params are
+        only bound with the plan.
+        Returns: the sql code, the params, the type of params (0 for ? or %s; 1 for :var or %(var)s),
+            the nb of placeholders in the sql code
+        """
+        query_prepare_type, parts, plan, in_root = cls._compile_query(sql)
+        if query_prepare_type is None:
+            return sql, {}, 1, 0
+        code = [parts[0]]
+        if query_prepare_type == 0:
             final_params = []
-            query_prepare_type = 0
             if isinstance(params, dict):
                 params = list(params.values())
-            elif isinstance(params, (list, tuple)):
-                params = list(params)
-            else:
+            elif not isinstance(params, (list, tuple)):
                 params = []
-            res = re.search(r"(\sin\s*)?(\?|%s)", query)
-            i = 0
-            code = ""
-
-            while res:
-                nb_var += 1
-                code += query[:res.span()[0]]
-                query = query[res.span()[1]:]
+            for i, (is_in, symbol) in enumerate(plan):
                 try:
                     pp = params[i]
                 except IndexError:
@@ -505,99 +1098,119 @@ class BaseDB(abc.ABC):
                         raise ValueError(
                             "Prepared args " + (str(i + 1)) + " in the script is not specify:" + repr(sql))
                     pp = None
-                i += 1
-                _groups = res.groups()
-                if _groups[0]:
-                    code += " in "
+                if is_in:
+                    code.append(" in ")
                     if tools.BasicTypes.is_iterable(pp) or pp is None:
                         pp = list(pp) or [None] if pp is not None else [None]
                         final_params.extend(pp)
-                        code += "(" + (','.join([_groups[1] for _ in pp])) + ")"
+                        code.append("(" + (",".join([symbol for _ in pp])) + ")")
                     else:
                         final_params.append(pp)
-                        code += _groups[1]
+                        code.append(symbol)
                 else:
-                    code += _groups[1]
+                    code.append(symbol)
                     final_params.append(pp)
-                # relance
-                res = re.search(r"(\sin\s*)?(\?|%s)", query)
-            code += query
-        elif re.search(r"(:\w+\W|%\(\w+\)s\W)", query + " "):
-            if params is None:
-                params = {}
-            got = True
-            code = ""
-            res = re.search(r"(\sin\s*)?(:(\w+)|%\((\w+)\)s)(\W)", query + " ")
-            global_params = os.environ.copy()
-            global_params.update(params)
-            global_params = tools.Cdict(global_params)
-            while res:
-                nb_var += 1
-                code += query[:res.span()[0]]
-                query = query[res.span()[1]:]
-                struc, i, ii, sep = res.groups()[1:]
-                i = i or ii
-                try:
-                    assert i in global_params
-                    pp = global_params[i]
-                except (KeyError, Exception, AttributeError):
-                    if not ignore_error:
-                        raise ValueError("Prepared args (" + i + ") in the script is not specify:" + repr(sql))
-                    pp = None
+                code.append(parts[i + 1])
+            return "".join(code), final_params, query_prepare_type, len(plan)
 
-                if res.groups()[0]:
-                    code += " in "
-                    if tools.BasicTypes.is_iterable(pp) or pp is None:
-                        pp = list(pp) or [None] if pp is not None else [None]
-                        code += "("
-                        if i in final_params:
-                            in_params = final_params[i]
-                            for index in in_params.keys():
-                                if struc.startswith(":"):
-                                    code += ":" + index + ","
-                                else:
-                                    code += "%(" + index + ")s,"
-                        else:
-                            in_params = {}
-                            for e in pp:
-                                index = tools._get_new_kb_text(origin_transform_query + code, "in_elem")
-                                in_params[index] = e
-                                if struc.startswith(":"):
-                                    code += ":" + index + ","
-                                else:
-                                    code += "%(" + index + ")s,"
-                            code = code[:-1]
-                            code += ")" + sep
-                            final_params[i] = in_params
-                    else:
-                        final_params[i] = pp
-                        if struc.startswith(":"):
-                            code += ":" + i + sep
-                        else:
-                            code += "%(" + i + ")s" + sep
-                else:
-                    final_params[i] = pp
-                    if struc.startswith(":"):
-                        code += ":" + i + sep
-                    else:
-                        code += "%(" + i + ")s" + sep
-                # relance
-                res = re.search(r"(\sin\s*)?(:(\w+)|%\((\w+)\)s)(\W)", query + " ")
-            code += query
-
-            format_params = {}
-            for k, v in final_params.items():
-                if isinstance(v, dict):
-                    format_params.update(v)
-                else:
-                    format_params[k] = v
-            final_params = format_params
-        if got:
+        params = dict(params or {})
+        final_params = {}
+        in_params = {}
+        for i, (is_in, name, colon, sep) in enumerate(plan):
+            try:
+                pp = cls._get_named_param(name, params)
+            except KeyError:
+                if not ignore_error:
+                    raise ValueError("Prepared args (" + name + ") in the script is not specify:" + repr(sql))
+                pp = None
+            if is_in:
+                code.append(" in ")
+            if is_in and (tools.BasicTypes.is_iterable(pp) or pp is None):
+                pp = list(pp) or [None] if pp is not None else [None]
+                if name not in in_params:
+                    in_params[name] = []
+                    for e in pp:
+                        index = in_root + "_" + str(len(final_params))
+                        final_params[index] = e
+                        in_params[name].append(index)
+                code.append("(" + ",".join([(":" + index) if colon else ("%(" + index + ")s")
+                                            for index in in_params[name]]) + ")" + sep)
+            else:
+                final_params[name] = pp
+                code.append(((":" + name) if colon else ("%(" + name + ")s")) + sep)
+            code.append(parts[i + 1])
+        return "".join(code), final_params, query_prepare_type, len(plan)
+
+    @staticmethod
+    def _get_named_param(name, params):
+        # the params given, then the environment variables
+        for source in (params, os.environ):
+            if name in source:
+                return source[name]
+        for source in (params, os.environ):
+            for key in source:
+                if tools.Var(key) == name:
+                    return source[key]
+        raise KeyError(name)
+
+    @staticmethod
+    def _compile_query(sql):
+        """
+        _parse_query cached (see QUERY_CACHE_SIZE): the sql code is parsed once
+        """
+        return BaseDB._query_caches()["prepare"](sql)
+
+    @staticmethod
+    def _parse_query(sql):
+        """
+        Parse the sql code.
+        Returns: the type of params (None when no placeholder, 0 for ? or %s, 1 for :var or %(var)s),
+            the sql parts between the placeholders, the binding plan (one element by placeholder)
+            and the root name of the IN expanded args
+        """
+        query, r = tools.replace_quoted_text(sql)
+        in_root = tools._get_new_kb_text(query, "in_elem")
+
+        def restore(part):
             for k in r:
-                code = code.replace(k, r[k], 1)
-        else:
-            code = sql
-        return code, final_params, query_prepare_type, nb_var
+                if k in part:
+                    part = part.replace(k, r[k], 1)
+            return part
+
+        parts = []
+        plan = []
+        last = 0
+        if "?" in query or "%s" in query:
+            for res in re.finditer(r"(\sin\s*)?(\?|%s)", query):
+                parts.append(restore(query[last:res.span()[0]]))
+                plan.append((bool(res.groups()[0]), res.groups()[1]))
+                last = res.span()[1]
+            parts.append(restore(query[last:]))
+            return 0, tuple(parts), tuple(plan), in_root
+        if re.search(r"(:\w+\W|%\(\w+\)s\W)", query + " "):
+            for res in re.finditer(r"(\sin\s*)?(:(\w+)|%\((\w+)\)s)(\W)", query + " "):
+                struc, i, ii, sep = res.groups()[1:]
+                parts.append(restore(query[last:res.span()[0]]))
+                plan.append((bool(res.groups()[0]), i or ii, struc.startswith(":"), sep))
+                last = res.span()[1]
+            parts.append(restore(query[last:]))
+            return 1, tuple(parts), tuple(plan), in_root
+        return None, (), (), in_root
+
+    @staticmethod
+    def query_cache_info():
+        """
+        Statistics (hits, misses, maxsize, currsize) of the compiled queries caches
+        """
+        caches = BaseDB._query_caches()
+        return tools.Cdict(prepare=caches["prepare"].cache_info()._asdict(),
+                           tokenizer=caches["tokenizer"].cache_info()._asdict())
+
+    @staticmethod
+    def clear_query_cache():
+        caches = BaseDB._query_caches()
+        caches["prepare"].cache_clear()
+        caches["tokenizer"].cache_clear()
 
     @staticmethod
     def _get_sql_type(script):
@@ -623,7 +1236,8 @@ class BaseDB(abc.ABC):
             print(s, consider_params, _type, nb_var)
 
     def run_script(self, script: typing.Union[list, str], params=None, *, retrieve=None, limit=INFINITE,
-                   ignore_error=False, dict_res=False, export=False, export_name=None, sep=";", timeout=None):
+                   ignore_error=False, dict_res=False, export=False, export_name=None, sep=";", timeout=None,
+                   stream=False, batch_size=None):
         """
         Run a specific sql file
         Args:
@@ -634,31 +1248,104 @@ class BaseDB(abc.ABC):
             ignore_error: to ignore or raise error if an error happened
             dict_res: bool, return result as dict args
             export: bool, if it's necessary to export te data
-            export_name: (str) the file name
+            export_name: (str) the file name. .csv.gz, .csv.zst for a compressed csv, .parquet for Parquet.
+                The manifest of the export is in LAST_EXPORT_MANIFEST
             sep: csv separator for export
             timeout: float, nb of seconds for maximum time of execution
+            stream: bool, return a generator of batches of rows (see iter_cursor) instead of the full data.
+                The last query is run on a server-side cursor when the driver supports it
+            batch_size: int, nb of rows by batch when stream; default STREAM_BATCH_SIZE
 
         Returns: data results if retrieve
 
         """
-        self.LAST_RUN_SCRIPT_ERROR = None
+        self.LAST_RUN_SCRIPT_ERROR = self._local.run_script_error = None
         if timeout is not None and str(self._get_name).lower() == "sqlitedb" and self.file_name == ":memory:":
             raise ValueError("Bad argument timeout set. for SQLiteDB impossible to set timeout. Do it yourself")
+        kwargs = {"params": params, "retrieve": retrieve, "limit": limit, "ignore_error": ignore_error,
+                  "dict_res": dict_res, "export": export, "export_name": export_name, "sep": sep,
+                  "stream": stream, "batch_size": batch_size}
         if timeout is not None:
-            with tools.thread.ThreadPoolExecutor() as executor:
-                proc = executor.submit(self.run_script, script,
-                                       **{"params": params, "retrieve": retrieve,
-                                          "limit": limit, "ignore_error": ignore_error, "dict_res": dict_res,
-                                          "export": export, "export_name": export_name, "sep": sep,
-                                          "timeout": None})
-                try:
-                    return proc.result(timeout=timeout)
-                except tools.thread.TimeoutError as timeout_ex:
-                    proc.cancel()
-                    executor.shutdown(wait=False, cancel_futures=True)
-                    self.rollback()
-                    raise timeout_ex
+            return self._run_script_timeout(script, kwargs, timeout)
+        return self._run_pooled_script(script, kwargs)
 
+    def _run_script_timeout(self, script, kwargs, timeout):
+        """
+        Run the script in a thread of its own: on timeout its statement is cancelled (when the driver can) and
+        its connexion rolled back, the thread is left (daemon)
+        """
+        # the connexion used by the thread
+        state, result = {}, {}
+
+        def run():
+            try:
+                result["value"] = self._run_pooled_script(script, kwargs, state)
+            except BaseException as ex:
+                result["error"] = ex
+
+        thread = threading.Thread(target=run, name="run_script_timeout", daemon=True)
+        thread.start()
+        thread.join(timeout)
+        if thread.is_alive():
+            connexion = state.get("connexion")
+            # psycopg2, cx_Oracle: cancel; sqlite3: interrupt
+            for name in ("cancel", "interrupt"):
+                if callable(getattr(connexion, name, None)):
+                    try:
+                        getattr(connexion, name)()
+                    except (AttributeError, Exception):
+                        pass
+                    break
+            try:
+                connexion.rollback()
+            except (AttributeError, Exception):
+                pass
+            raise tools.thread.TimeoutError("run_script timeout after %s seconds" % timeout)
+        if "error" in result:
+            raise result["error"]
+        return result.get("value")
+
+    def _run_pooled_script(self, script, kwargs, state=None):
+        """
+        _run_script on the connexion of the thread, a connexion of the pool for the whole script when there is
+        a pool. state (dict) gets the connexion used
+        """
+        if state is None:
+            state = {}
+        if self.pool is None or getattr(self._local, "db_object", None) is not None:
+            if not self._is_connected():
+                self.reload_connexion()
+            state["connexion"] = self.db_object
+            return self._run_script(script, **kwargs)
+        # one connexion of the pool for the whole script
+        self._local.db_object = state["connexion"] = self.pool.checkout()
+        try:
+            result = self._run_script(script, **kwargs)
+        except BaseException as ex:
+            self.pool.checkin(self._local.db_object)
+            raise ex
+        finally:
+            connexion = self._local.db_object
+            self._local.db_object = None
+        if isinstance(result, types.GeneratorType):
+            # stream: the connexion is given back at the end of the iteration
+            return self._pooled_stream(result, connexion, self.pool)
+        self.pool.checkin(connexion)
+        return result
+
+    @staticmethod
+    def _pooled_stream(batches, connexion, pool):
+        try:
+            yield from batches
+        finally:
+            try:
+                connexion.commit()
+            except (AttributeError, Exception):
+                pass
+            pool.checkin(connexion)
+
+    def _run_script(self, script, params=None, *, retrieve=None, limit=INFINITE, ignore_error=False, dict_res=False,
+                    export=False, export_name=None, sep=";", stream=False, batch_size=None):
         if isinstance(script, str):
             try:
                 assert os.path.exists(script)
@@ -671,6 +1358,12 @@ class BaseDB(abc.ABC):
         self.LAST_SQL_CODE_RUN = ";".join(script)
         if limit is None:
             limit = INFINITE
+        if retrieve is None:
+            retrieve = self._get_sql_type(script[-1]).lower() in ("with", "select")
+        stream = stream and retrieve and not export
+        export = export and retrieve
+        # server-side cursors (postgres named cursors) only run queries returning rows
+        stream_cursor = (stream or export) and self._get_sql_type(script[-1]).lower() in ("with", "select")
         if not self._is_connected():
             self.reload_connexion()
         if self._cursor_ is not None:
@@ -682,8 +1375,10 @@ class BaseDB(abc.ABC):
         concat_s = ""
         min_line = 0
         try:
-            for s in script:
+            for index, s in enumerate(script):
                 s, consider_params, _type, nb_var = self._prepare_query(s, params, ignore_error)
+                if stream_cursor and index == len(script) - 1:
+                    cursor = self._stream_cursor(batch_size)
 
                 assert len(consider_params or []) <= self.MAX_PARAMETERS, "Max parameters reach. " \
                                                                           "Please consider this error."
@@ -716,17 +1411,27 @@ class BaseDB(abc.ABC):
                 self._print_error(ex)
             return
 
-        self.commit()
+        if stream:
+            # the commit is done at the end of the iteration: it would close server-side cursors
+            return self.iter_cursor(cursor, batch_size=batch_size, limit=limit, dict_res=dict_res, close=True)
         if export:
             if export_name is None:
-                export_name = os.path.join(os.path.join(os.environ['USERPROFILE']), 'Downloads')
+                export_name = os.path.join(os.environ.get('USERPROFILE', os.path.expanduser("~")), 'Downloads')
                 if not os.path.exists(export_name):
                     export_name = os.getcwd()
                 export_name = os.path.join(export_name, "export_data.csv")
                 export_name = tools.get_no_filepath(export_name)
-
-        if retrieve is None:
-            retrieve = self._get_sql_type(script[-1]).lower() in ("with", "select")
+            try:
+                # before the commit: it would close server-side cursors
+                if callable(export_name):
+                    self.get_all_data_from_cursor(cursor, limit=limit, export_name=export_name)
+                elif self.export_cursor(cursor, export_name, sep=sep, limit=limit, batch_size=batch_size) is None:
+                    # no result set: no file
+                    return None
+            finally:
+                self.commit()
+            return export_name
+        self.commit()
         if retrieve:
             data = self.get_all_data_from_cursor(cursor, limit=limit, dict_res=dict_res,
                                                  export_name=export_name, sep=sep)
@@ -748,6 +1453,35 @@ class BaseDB(abc.ABC):
     def get_add_increment_field_code(field_name="id"):
         return str(field_name or "id") + " INTEGER PRIMARY KEY AUTOINCREMENT"
 
+    def _get_field_type(self, series, ftype=None, date_format=None, sample_size=None):
+        """
+        Infer the sql type of an object column (see infer_column_type) and prepare its values for the insertion
+        Args:
+            series: pandas.Series
+            ftype: the type given by the user for this column
+            date_format: str|list, the formats of the dates
+            sample_size: int, infer the type from a sample of sample_size rows
+
+        Returns: (sql type, the values converted, nb of dates parsed by CustomDateTime)
+
+        """
+        try:
+            kind = infer_column_type(series, date_format=date_format, sample_size=sample_size).kind
+        except (ValueError, AssertionError, Exception):
+            kind = "NO"
+        if kind == "NO" and ("date" not in str(ftype).lower() or ftype is None):
+            series = series.astype(str).where(series.notna(), None)
+            size = series.str.len().max()
+            size = 0 if pandas.isnull(size) else int(size)
+            if size > 255:
+                return self.TEXT_TYPE, series, 0
+            if size > 3:
+                size = max(255, size)
+            return f"varchar({size or 255})", series, 0
+        series, nb_fallback = convert_date_column(series, kind="DATETIME" if kind == "DATETIME" else "DATE",
+                                                  date_format=date_format)
+        return self.DATETIME_TYPE if kind == "DATETIME" else "date", series, nb_fallback
+
     def create_table(self, arg: str | pandas.DataFrame | DatasetFactory, table_name=None, if_not_exists=True,
                      auto_increment_field=False,
                      auto_increment_field_name=None,
@@ -811,34 +1545,12 @@ class BaseDB(abc.ABC):
                     table_script += f"\n\t{field} {ftype.get(col)}"
 
                 if not got:
-                    is_datetime_resp = _can_be_datetime_field(dataset.iloc[:,index], date_format=date_str_format)
-                    if is_datetime_resp == "NO" and (
-                            "date" not in str(ftype.get(col)).lower() or ftype.get(col) is None
-                    ):
-                        dataset.iloc[:,index] = dataset.iloc[:,index].apply(lambda x: str(x) if not pandas.isnull(x) else None)
-                        max_ = max(dataset.iloc[:,index][:10000].apply(lambda x: len(str(x)) if x else 0))
-                        min_ = min(dataset.iloc[:,index][:10000].apply(lambda x: len(str(x)) if x else 0))
-                        if max_ == min_:
-                            size = max_
-                            if size == 0:
-                                size = 255
-                        else:
-                            size = max_
-                        if size > 255:
-                            type_ = 'clob' if "oracle" in self._get_name.lower() else "text"
-                        else:
-                            if size > 3:
-                                size = max(255, size)
-                            type_ = f"varchar({size or 255})"
-                    elif is_datetime_resp == "DATETIME":
-                        type_ = "TIMESTAMP" if "oracle" in self._get_name.lower() else "datetime"
-                        dataset.iloc[:,index] = dataset.iloc[:,index].apply(
-                            lambda val: tools.CustomDateTime(str(val), default=None, ignore_errors=True)())
-                    else:
-                        dataset.iloc[:,index] = dataset.iloc[:,index].apply(
-                            lambda val: tools.CustomDateTime(str(val), default=None, ignore_errors=True).date)
-                        type_ = "date"
-
+                    type_, values, nb_fallback = self._get_field_type(dataset.iloc[:, index], ftype=ftype.get(col),
+                                                                      date_format=date_str_format,
+                                                                      sample_size=kwargs.get("sample_size"))
+                    dataset.iloc[:, index] = values
+                    if nb_fallback:
+                        print("%s: %s dates parsed with CustomDateTime" % (col, nb_fallback))
                     table_script += f"\n\t{field} {type_}"
             dataset.rename(columns={col: field}, inplace=True)
 
@@ -859,7 +1571,8 @@ class BaseDB(abc.ABC):
         # INSERTING DATASET
         if only_structure:
             return
-        self.insert_many(dataset, table_name=table_name, loader=kwargs.get("loader"))
+        self.insert_many(dataset, table_name=table_name, loader=kwargs.get("loader"), bulk=kwargs.get("bulk", False),
+                         workers=kwargs.get("workers"))
 
     def dump(self, dump_file='dump.sql'):
         pass
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Thread-safe pool of database connexions.
+Use by BaseDB when it's created with pool_size (see DatabaseManager)
+"""
+import collections
+import contextlib
+import threading
+import time
+
+from kb_package.tools import Cdict
+
+
+class ConnectionPool:
+    def __init__(self, connect, pool_size=5, max_overflow=10, timeout=30, idle_timeout=300, recycle=None,
+                 is_alive=None):
+        """
+        Args:
+            connect: callable, returns a new connexion
+            pool_size: int, nb of connexions kept open in the pool
+            max_overflow: int, nb of extra connexions permitted when all the pool is used.
+                They are closed at the checkin
+            timeout: float, nb of seconds to wait for a connexion when the pool and the overflow are used
+            idle_timeout: float, nb of seconds after which an unused connexion is closed
+            recycle: float, nb of seconds after which a connexion is re-opened
+            is_alive: callable, health check of a connexion at the checkout
+        """
+        self._connect = connect
+        self.pool_size = max(int(pool_size), 1)
+        self.max_overflow = max(int(max_overflow or 0), 0)
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.recycle = recycle
+        self._is_alive = is_alive if callable(is_alive) else (lambda connexion: True)
+
+        self._condition = threading.Condition()
+        # (connexion, created_at, last_used), the last one is the most recently used
+        self._idle = collections.deque()
+        self._created_at = {}
+        self._nb_open = 0
+        self._closed = False
+        self.stats = {"checkouts": 0, "connects": 0, "waits": 0, "evictions": 0, "failed_health_checks": 0}
+
+    def checkout(self):
+        """
+        Get a connexion of the pool (a new one if no idle connexion is available)
+        Returns: connexion object
+        """
+        deadline = time.time() + (self.timeout if self.timeout is not None else float("inf"))
+        while True:
+            with self._condition:
+                if self._closed:
+                    raise RuntimeError("The connexion pool is closed")
+                self._evict_idle()
+                if self._idle:
+                    connexion, created_at, _ = self._idle.pop()
+                elif self._nb_open < self.pool_size + self.max_overflow:
+                    self._nb_open += 1
+                    connexion, created_at = None, None
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise TimeoutError("No connexion available in the pool (size: %s, overflow: %s)" % (
+                            self.pool_size, self.max_overflow))
+                    self.stats["waits"] += 1
+                    self._condition.wait(remaining)
+                    continue
+            if connexion is None:
+                try:
+                    connexion = self._connect()
+                except Exception as ex:
+                    self._discard(None)
+                    raise ex
+                created_at = time.time()
+                self.stats["connects"] += 1
+            elif (self.recycle and time.time() - created_at > self.recycle) or not self._check(connexion):
+                self._discard(connexion)
+                continue
+            with self._condition:
+                self._created_at[id(connexion)] = created_at
+                self.stats["checkouts"] += 1
+            return connexion
+
+    def checkin(self, connexion):
+        """
+        Give back the connexion to the pool. Not committed work is rollback
+        """
+        if connexion is None:
+            return
+        try:
+            connexion.rollback()
+        except (AttributeError, Exception):
+            pass
+        with self._condition:
+            created_at = self._created_at.pop(id(connexion), time.time())
+            if self._closed or len(self._idle) >= self.pool_size:
+                self._nb_open -= 1
+                self._close(connexion)
+            else:
+                self._idle.append((connexion, created_at, time.time()))
+            self._condition.notify()
+
+    @contextlib.contextmanager
+    def connexion(self):
+        connexion = self.checkout()
+        try:
+            yield connexion
+        finally:
+            self.checkin(connexion)
+
+    def dispose(self):
+        """
+        Close all the idle connexions; the used ones are closed at their checkin
+        """
+        with self._condition:
+            self._closed = True
+            while self._idle:
+                connexion, _, _ = self._idle.pop()
+                self._nb_open -= 1
+                self._close(connexion)
+            self._condition.notify_all()
+
+    def status(self):
+        with self._condition:
+            return Cdict(pool_size=self.pool_size, max_overflow=self.max_overflow,
+                         open=self._nb_open, idle=len(self._idle), in_use=self._nb_open - len(self._idle),
+                         **self.stats)
+
+    def _check(self, connexion):
+        try:
+            if self._is_alive(connexion):
+                return True
+        except (AttributeError, Exception):
+            pass
+        self.stats["failed_health_checks"] += 1
+        return False
+
+    def _discard(self, connexion):
+        with self._condition:
+            self._nb_open -= 1
+            self._condition.notify()
+        self._close(connexion)
+
+    def _evict_idle(self):
+        # the oldest used connexions are at the left
+        if not self.idle_timeout:
+            return
+        limit = time.time() - self.idle_timeout
+        while self._idle and self._idle[0][2] < limit:
+            connexion, _, _ = self._idle.popleft()
+            self._nb_open -= 1
+            self.stats["evictions"] += 1
+            self._close(connexion)
+
+    @staticmethod
+    def _close(connexion):
+        try:
+            connexion.close()
+        except (AttributeError, Exception):
+            pass
@@ -17,6 +17,8 @@ class DatabaseManager:
                 port: default 3306 (the MySQL default port)
                 host: default localhost
                 db_name
+                pool_size: int, use a pool of connexions (see BaseDB.init_pool)
+                max_overflow, pool_timeout, idle_timeout, pool_recycle: the pool settings
 
 
         """
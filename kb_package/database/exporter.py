@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Export engine of the query results (run_script(export=True)).
+The rows are fetched by batches and written with writerows in a buffered file,
+compressed with gzip or zstd, or as Parquet, with a manifest of the export.
+
+    exporter = CursorExporter("export.csv.gz", sep=";")
+    manifest = exporter.export(batches, columns)
+"""
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import time
+
+from kb_package.tools import Cdict
+
+
+class CursorExporter:
+    FORMATS = ("csv", "parquet")
+    COMPRESSIONS = ("gzip", "zstd")
+    # size of the write buffer of the file
+    BUFFER_SIZE = 1 << 20
+
+    def __init__(self, file_name, sep=";", file_format=None, compression=None, manifest=False, encoding="utf-8"):
+        """
+        Args:
+            file_name: str, path of the export. The format and the compression are deduced from the extension
+                when not given: .csv, .csv.gz, .csv.zst, .parquet
+            sep: str, csv separator
+            file_format: str, csv or parquet
+            compression: str, gzip or zstd (csv). For parquet, the codec of the columns (snappy by default)
+            manifest: bool, also write the manifest in file_name + ".manifest.json" (it's always returned)
+            encoding: str, encoding of the csv file
+        """
+        name = str(file_name).lower()
+        if file_format is None:
+            file_format = "parquet" if name.endswith((".parquet", ".pq")) else "csv"
+        if compression is None and file_format == "csv":
+            if name.endswith((".gz", ".gzip")):
+                compression = "gzip"
+            elif name.endswith((".zst", ".zstd")):
+                compression = "zstd"
+        assert file_format in self.FORMATS, "Bad file_format given: %s, must be one of %s" % (
+            file_format, self.FORMATS)
+        assert file_format != "csv" or compression in (None,) + self.COMPRESSIONS, \
+            "Bad compression given: %s, must be one of %s" % (compression, self.COMPRESSIONS)
+        self.file_name = file_name
+        self.sep = sep or ";"
+        self.file_format = file_format
+        self.compression = compression
+        self.manifest = manifest
+        self.encoding = encoding
+
+    def export(self, batches, columns):
+        """
+        Write the batches of rows. The data are written in a temporary file renamed at the end:
+        an error doesn't leave a truncated export, and is raised
+        Args:
+            batches: iterable of list of rows
+            columns: list of the columns names
+
+        Returns: Cdict, the manifest of the export
+
+        """
+        manifest = Cdict(file=os.path.abspath(self.file_name), format=self.file_format,
+                         compression=self.compression, columns=list(columns), rows=0, batches=0,
+                         started_at=datetime.datetime.now().isoformat(timespec="seconds"))
+        start = time.perf_counter()
+        part_file = str(self.file_name) + ".part"
+        try:
+            if self.file_format == "parquet":
+                self._write_parquet(part_file, batches, columns, manifest)
+            else:
+                self._write_csv(part_file, batches, columns, manifest)
+            os.replace(part_file, self.file_name)
+        except BaseException as ex:
+            try:
+                os.remove(part_file)
+            except OSError:
+                pass
+            raise ex
+        manifest.duration = round(time.perf_counter() - start, 3)
+        manifest.rows_per_second = round(manifest.rows / max(manifest.duration, 1e-6))
+        manifest.bytes = os.path.getsize(self.file_name)
+        if self.manifest:
+            with open(str(self.file_name) + ".manifest.json", "w") as file:
+                json.dump(manifest, file, indent=4)
+        return manifest
+
+    def _open(self, file_name):
+        if self.compression == "gzip":
+            raw = gzip.open(file_name, "wb")
+        elif self.compression == "zstd":
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError("zstd compression required the package zstandard (pip install zstandard)")
+            raw = zstandard.ZstdCompressor().stream_writer(open(file_name, "wb"), closefd=True)
+        else:
+            raw = open(file_name, "wb")
+        return io.TextIOWrapper(io.BufferedWriter(raw, buffer_size=self.BUFFER_SIZE), encoding=self.encoding,
+                                newline="")
+
+    def _write_csv(self, file_name, batches, columns, manifest):
+        with self._open(file_name) as file:
+            writer = csv.writer(file, delimiter=self.sep)
+            writer.writerow(columns)
+            for rows in batches:
+                writer.writerows(rows)
+                manifest.rows += len(rows)
+                manifest.batches += 1
+
+    def _write_parquet(self, file_name, batches, columns, manifest):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("parquet export required the package pyarrow (pip install pyarrow)")
+        writer = None
+        try:
+            for rows in batches:
+                data = {col: [row[i] for row in rows] for i, col in enumerate(columns)}
+                if writer is None:
+                    table = pyarrow.Table.from_pydict(data)
+                    # the columns only null in the first batch: keep them as string
+                    schema = pyarrow.schema([
+                        pyarrow.field(f.name, pyarrow.string()) if pyarrow.types.is_null(f.type) else f
+                        for f in table.schema])
+                    writer = pyarrow.parquet.ParquetWriter(file_name, schema,
+                                                           compression=self.compression or "snappy")
+                table = pyarrow.Table.from_pydict(data, schema=writer.schema)
+                writer.write_table(table)
+                manifest.rows += len(rows)
+                manifest.batches += 1
+            if writer is None:
+                # no rows: empty file with the columns
+                writer = pyarrow.parquet.ParquetWriter(
+                    file_name, pyarrow.schema([pyarrow.field(col, pyarrow.string()) for col in columns]))
+        finally:
+            if writer is not None:
+                writer.close()
@@ -82,6 +82,23 @@ class MongoDB(BaseDB):
             yield d
             index_data += 1
 
+    @staticmethod
+    def _fetchmany(cursor, batch_size=None, limit=INFINITE):
+        batch_size = int(batch_size or BaseDB.STREAM_BATCH_SIZE)
+        rows = []
+        index_data = 0
+        # iterate directly on the cursor: pymongo get documents from the server by batch
+        for d in cursor:
+            if index_data >= limit:
+                break
+            index_data += 1
+            rows.append(d)
+            if len(rows) >= batch_size:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
     @staticmethod
     def _get_cursor_description(cursor):
         return Cdict(columns=[d for d in cursor[0]])
@@ -7,23 +7,26 @@ Use for run easily mysql requests
 
 required mysql-connector-python~=8.0.25
 """
+import io
 import traceback
 
 import mysql.connector
+from kb_package import tools
 from kb_package.tools import Cdict, many_try
 from kb_package.database.basedb import BaseDB
 
 
 class MysqlDB(BaseDB):
     DEFAULT_PORT = 3306
+    MULTI_ROWS_INSERTING_SIZE = 1000
 
     @property
     def _get_name(self):
         return self.__class__.__name__
 
-    def _is_connected(self):
+    def _is_connected(self, connexion=None):
         try:
-            return self.db_object.is_connected()
+            return (connexion if connexion is not None else self.db_object).is_connected()
         except (AttributeError, mysql.connector.errors.DatabaseError, Exception):
             return False
 
@@ -41,6 +44,7 @@ class MysqlDB(BaseDB):
             password: str, the password
             db_name: str, the database name
             port:
+            allow_local_infile: bool, permit LOAD DATA LOCAL INFILE (bulk insert_many)
 
         Returns:mysql.connector.MySQLConnection, the connexion object reach
 
@@ -48,7 +52,8 @@ class MysqlDB(BaseDB):
         try:
             return mysql.connector.connect(
                 host=host, user=user, passwd=password, database=db_name,
-                port=port or MysqlDB.DEFAULT_PORT
+                port=port or MysqlDB.DEFAULT_PORT,
+                allow_local_infile=bool(kwargs.get("allow_local_infile", False))
             )
         except Exception as ex:
             ex.args = ["Une erreur lors que la connexion à la base de donnée --> " + str(ex.args[0])] + \
@@ -63,6 +68,14 @@ class MysqlDB(BaseDB):
     def _cursor(self):
         return self.db_object.cursor()
 
+    def _stream_cursor(self, batch_size=None):
+        # unbuffered cursor: the rows stay on the server until fetched (like SSCursor)
+        if not self._is_connected():
+            self.reload_connexion()
+        cursor = self.db_object.cursor(buffered=False)
+        cursor.arraysize = int(batch_size or self.STREAM_BATCH_SIZE)
+        return cursor
+
     @staticmethod
     @many_try(max_try=1, sleep_time=0, error_manager_key="BD_MYSQL")
     def _execute(cursor, script, params=None, ignore_error=False, method="single", **kwargs):
@@ -91,6 +104,26 @@ class MysqlDB(BaseDB):
                 return None
             raise ex
 
+    def _bulk_load(self, cursor, table_name, columns, buffer):
+        if self._kwargs.get("allow_local_infile"):
+            with tools.CTemporaryFile("wb", ext="csv") as file:
+                data = io.StringIO()
+                self._write_csv_buffer(buffer, data, null="\\N", escape="\\")
+                file.write(data.getvalue().encode("utf-8"))
+                file.flush()
+                cursor.execute("LOAD DATA LOCAL INFILE %s INTO TABLE " + str(table_name) +
+                               " CHARACTER SET utf8mb4"
+                               " FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '\\\\'"
+                               " LINES TERMINATED BY '\\n' (" + ",".join(columns) + ")", (file.name,))
+            return True
+        # multi rows VALUES: one statement for MULTI_ROWS_INSERTING_SIZE rows
+        rows = self._buffer_to_rows(buffer)
+        row_code = "(" + ",".join(["%s"] * len(columns)) + ")"
+        script = "INSERT INTO " + str(table_name) + " (" + ",".join(columns) + ") VALUES "
+        for part in tools.get_buffer(rows, self.MULTI_ROWS_INSERTING_SIZE, vv=False):
+            cursor.execute(script + ",".join([row_code] * len(part)), [v for row in part for v in row])
+        return True
+
     @staticmethod
     def get_add_increment_field_code(field_name="id"):
         return str(field_name or "id") + " MEDIUMINT PRIMARY KEY AUTOINCREMENT"
@@ -10,6 +10,8 @@ required cx-Oracle
 import os
 
 import cx_Oracle
+import pandas
+from pandas.api.types import infer_dtype, is_datetime64_any_dtype, is_numeric_dtype
 
 from kb_package.database.basedb import BaseDB
 from kb_package.tools import Cdict, many_try
@@ -17,14 +19,17 @@ from kb_package.tools import Cdict, many_try
 
 class OracleDB(BaseDB):
     DEFAULT_PORT = 1521
+    PARAM_STYLE = "numeric"
+    DATETIME_TYPE = "TIMESTAMP"
+    TEXT_TYPE = "clob"
 
     @property
     def _get_name(self):
         return self.__class__.__name__
 
-    def _is_connected(self):
+    def _is_connected(self, connexion=None):
         try:
-            return self.db_object.ping() is None
+            return (connexion if connexion is not None else self.db_object).ping() is None
         except (AttributeError, cx_Oracle.DatabaseError, Exception):
             return False
 
@@ -54,6 +59,15 @@ class OracleDB(BaseDB):
     def _cursor(self):
         return self.db_object.cursor()
 
+    def _stream_cursor(self, batch_size=None):
+        if not self._is_connected():
+            self.reload_connexion()
+        cursor = self.db_object.cursor()
+        cursor.arraysize = int(batch_size or self.STREAM_BATCH_SIZE)
+        # one more row to avoid an extra round trip to check the end of the result
+        cursor.prefetchrows = cursor.arraysize + 1
+        return cursor
+
     @staticmethod
     def prepare_insert_data(data: dict):
         return [":" + str(d) for d in data.keys()], data
@@ -84,6 +98,26 @@ class OracleDB(BaseDB):
 
             raise ex
 
+    def _bulk_load(self, cursor, table_name, columns, buffer):
+        # array binding with positional binds and declared input sizes
+        sizes = []
+        for index in range(buffer.shape[1]):
+            col = buffer.iloc[:, index]
+            if is_datetime64_any_dtype(col):
+                sizes.append(cx_Oracle.DATETIME)
+            elif is_numeric_dtype(col):
+                sizes.append(cx_Oracle.NUMBER)
+            elif infer_dtype(col, skipna=True) == "string":
+                size = col.str.len().max()
+                sizes.append(1 if pandas.isna(size) else max(int(size), 1))
+            else:
+                sizes.append(None)
+        cursor.setinputsizes(*sizes)
+        cursor.executemany("INSERT INTO " + str(table_name) + " (" + ",".join(columns) + ") VALUES (" +
+                           ",".join(self._placeholders(len(columns))) + ")",
+                           self._buffer_to_rows(buffer))
+        return True
+
     def _get_table_schema(self, table_name):
         """
         cursor.execute("select * from " + table_name + " where location_id = 1000")
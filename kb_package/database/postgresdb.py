@@ -6,7 +6,11 @@ Use for run easily mysql requests
 Required psycopg2~=2.9.3
 """
 
+import io
+import os
+
 import psycopg2
+import psycopg2.extras
 from kb_package.tools import Cdict, many_try
 from kb_package.database.basedb import BaseDB
 
@@ -18,9 +22,9 @@ class PostgresDB(BaseDB):
     def _get_name(self):
         return self.__class__.__name__
 
-    def _is_connected(self):
+    def _is_connected(self, connexion=None):
         try:
-            return not self.db_object.closed
+            return not (connexion if connexion is not None else self.db_object).closed
         except (AttributeError, psycopg2.Error, Exception):
             return False
 
@@ -53,13 +57,22 @@ class PostgresDB(BaseDB):
     def _cursor(self):
         return self.db_object.cursor()
 
+    def _stream_cursor(self, batch_size=None):
+        # named cursor -> server-side cursor, rows are sent by batch of itersize
+        if not self._is_connected():
+            self.reload_connexion()
+        cursor = self.db_object.cursor(name="kb_stream_" + os.urandom(8).hex())
+        cursor.itersize = int(batch_size or self.STREAM_BATCH_SIZE)
+        cursor.arraysize = cursor.itersize
+        return cursor
+
     @staticmethod
     def _get_cursor_description(cursor):
         return Cdict(columns=[desc[0] for desc in cursor.description or []])
 
     @staticmethod
     @many_try(max_try=1, sleep_time=0, error_manager_key="BD_POSTGRES")
-    def _execute(cursor, script, params=None, ignore_error=False, connexion=None, **kwargs):
+    def _execute(cursor, script, params=None, ignore_error=False, connexion=None, method="single", **kwargs):
         """
         use to make preparing requests
         Args:
@@ -67,15 +80,19 @@ class PostgresDB(BaseDB):
             script: str, the prepared requests
             params: list|tuple|dict, params for the mysql prepared requests
             connexion:
+            method: str, many for run the script with a list of rows
 
         Returns: the cursor after make request
 
         """
-        if isinstance(params, (tuple, list)):
-            params = tuple(params)
-        else:
-            params = (params,)
         try:
+            if method == "many":
+                psycopg2.extras.execute_batch(cursor, script, params, page_size=1000)
+                return cursor
+            if isinstance(params, (tuple, list)):
+                params = tuple(params)
+            else:
+                params = (params,)
             cursor.execute(script, params)
             return cursor
         except Exception as ex:
@@ -84,6 +101,14 @@ class PostgresDB(BaseDB):
                 return None
             raise ex
 
+    def _bulk_load(self, cursor, table_name, columns, buffer):
+        # COPY FROM STDIN: the buffer is sent as one stream (text format: only the null cells are written \\N)
+        data = io.StringIO()
+        self._write_copy_buffer(buffer, data)
+        data.seek(0)
+        cursor.copy_expert("COPY " + str(table_name) + " (" + ",".join(columns) + ") FROM STDIN", data)
+        return True
+
     @staticmethod
     def get_add_increment_field_code(field_name="id"):
         return str(field_name or "id") + " SERIAL PRIMARY KEY"
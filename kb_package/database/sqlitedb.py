@@ -11,6 +11,7 @@ from kb_package.tools import Cdict, many_try
 
 
 class SQLiteDB(BaseDB):
+    PARAM_STYLE = "qmark"
 
     @property
     def _get_name(self):
@@ -24,11 +25,12 @@ class SQLiteDB(BaseDB):
         Making the connexion to the mysql database
         Args:
             file_name: str, file name path
+            check_same_thread: bool, default True. False for a connexion used by many threads (pool)
         Returns: the connexion object reach
 
         """
         try:
-            return sqlite3.connect(file_name)
+            return sqlite3.connect(file_name, check_same_thread=kwargs.get("check_same_thread", True))
         except Exception as ex:
             ex.args = ["Une erreur lors que la connexion à la base de donnée --> " + str(ex.args[0])] + \
                       list(ex.args[1:])
@@ -68,26 +70,8 @@ class SQLiteDB(BaseDB):
             pass
         elif isinstance(params, (tuple, list)):
             if len(params):
-                if isinstance(params[0], dict):
-                    final_res = []
-                    for p in params:
-                        temp = {}
-                        for k in p:
-                            if ":" + str(k) not in script:
-                                if not isinstance(temp, dict):
-                                    temp.append(p[k])
-                                else:
-                                    temp[k] = p[k]
-                                    temp = list(temp.values())
-                            else:
-                                if isinstance(temp, dict):
-                                    temp[k] = p[k]
-                                else:
-                                    temp.append(p[k])
-                        final_res.append(temp)
-                    params = final_res
-                params = tuple(params)
-                args.append(params)
+                # list of rows (tuples) for executemany, or the values of the query
+                args.append(params if method == "executemany" else tuple(params))
         elif isinstance(params, dict):
             if len(params):
                 k = list(params.keys())[0]
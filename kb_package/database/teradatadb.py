@@ -3,6 +3,9 @@
 The Teradata database manager.
 Use for run easily Teradata requests
 """
+import io
+
+from kb_package import tools
 from kb_package.tools import Cdict, many_try
 from kb_package.database.basedb import BaseDB
 import teradatasql
@@ -10,12 +13,15 @@ import teradatasql
 
 class TeradataDB(BaseDB):
     DEFAULT_PORT = 1025
+    PARAM_STYLE = "qmark"
+    DATETIME_TYPE = "TIMESTAMP"
+    TEXT_TYPE = "CLOB"
 
     @property
     def _get_name(self):
         return self.__class__.__name__
 
-    def _is_connected(self):
+    def _is_connected(self, connexion=None):
         return True
 
     @staticmethod
@@ -60,26 +66,8 @@ class TeradataDB(BaseDB):
             pass
         elif isinstance(params, (tuple, list)):
             if len(params):
-                if isinstance(params[0], dict):
-                    final_res = []
-                    for p in params:
-                        temp = {}
-                        for k in p:
-                            if ":" + str(k) not in script:
-                                if not isinstance(temp, dict):
-                                    temp.append(p[k])
-                                else:
-                                    temp[k] = p[k]
-                                    temp = list(temp.values())
-                            else:
-                                if isinstance(temp, dict):
-                                    temp[k] = p[k]
-                                else:
-                                    temp.append(p[k])
-                        final_res.append(temp)
-                    params = final_res
-                params = tuple(params)
-                args.append(params)
+                # list of rows (tuples) for executemany, or the values of the query
+                args.append(params if method == "executemany" else tuple(params))
         elif isinstance(params, dict):
             if len(params):
                 k = list(params.keys())[0]
@@ -105,6 +93,17 @@ class TeradataDB(BaseDB):
     def _get_cursor_description(cursor):
         return Cdict(columns=[col[0] for col in cursor.description or []])
 
+    def _bulk_load(self, cursor, table_name, columns, buffer):
+        # FastLoad when the table permit it (else the driver use a batch insert) from a csv file
+        with tools.CTemporaryFile("wb", ext="csv") as file:
+            data = io.StringIO()
+            self._write_csv_buffer(buffer, data, header=True)
+            file.write(data.getvalue().encode("utf-8"))
+            file.flush()
+            cursor.execute("{fn teradata_try_fastload}{fn teradata_read_csv(%s)}INSERT INTO %s (%s)" % (
+                file.name, table_name, ", ".join(["?"] * len(columns))))
+        return True
+
     def create_table(self, arg, table_name=None, if_not_exists=True,
                      auto_increment_field=False,
                      auto_increment_field_name=None,
@@ -117,7 +116,8 @@ class TeradataDB(BaseDB):
 
             if only_structure:
                 return
-            self.insert_many(arg, table_name=table_name, loader=kwargs.get("loader"))
+            self.insert_many(arg, table_name=table_name, loader=kwargs.get("loader"), bulk=kwargs.get("bulk", False),
+                             workers=kwargs.get("workers"))
         else:
             super().create_table(arg, table_name=table_name, if_not_exists=if_not_exists,
                                  auto_increment_field=auto_increment_field,
@@ -3,6 +3,7 @@
 All generals customs tools we develop.
 they can be used in all the project
 """
+import functools
 import inspect
 import json
 import logging
@@ -156,6 +157,10 @@ _infinite_methods.update(
 INFINITE = type("Infinite", (float,), _infinite_methods)()
 
 
+# nb of names kept by the caches of remove_accent_from_text and format_var_name (least recently used removed)
+NORMALIZATION_CACHE_SIZE = 1 << 16
+
+
 def remove_accent_from_text(text):
     """
     Strip accents from input String.
@@ -166,12 +171,21 @@ def remove_accent_from_text(text):
         The processed String.
 
     """
+    if isinstance(text, str):
+        # plain str key: the cache compares the keys with ==, not with Var.__eq__
+        return _remove_accent_from_text(str.__str__(text))
+    text = text.encode("utf-8").decode("utf-8")
+    return _remove_accent_from_text(text)
+
+
+@functools.lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def _remove_accent_from_text(text):
     text = text.encode("utf-8").decode("utf-8")
 
     text = unicodedata.normalize('NFD', text)
     text = text.encode('ascii', 'ignore')
     text = text.decode("utf-8")
-    return str(text)
+    return sys.intern(str(text))
 
 
 def get_no_filepath(filepath):
@@ -189,8 +203,39 @@ def lev_calculate(str1, str2):
     return dist, r
 
 
+_KEYWORDS = tuple(keyword.kwlist)
+
+
 def format_var_name(name, sep="_", accent=False, permit_char=None, default="var", remove_accent=False,
                     min_length_word=1, no_case=False, blacklist=keyword.kwlist):
+    """
+    Name usable as python variable: without accent (remove_accent), the other characters than letters, digits
+    and permit_char replaced by sep, not a keyword of blacklist.
+    The results of the str names are cached (the names of the columns are formatted at each access)
+    Returns: str
+    """
+    if isinstance(name, str) and (isinstance(default, str) or default is None or type(default) is int):
+        try:
+            return _format_var_name_cached(
+                str.__str__(name), sep, accent, tuple(permit_char or ()), default if not isinstance(default, str)
+                else str.__str__(default), remove_accent, min_length_word, no_case,
+                _KEYWORDS if blacklist is keyword.kwlist else tuple(blacklist or ()))
+        except TypeError:
+            # not hashable arguments
+            pass
+    return _format_var_name(name, sep, accent, permit_char, default, remove_accent, min_length_word, no_case,
+                            blacklist)
+
+
+@functools.lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def _format_var_name_cached(name, sep, accent, permit_char, default, remove_accent, min_length_word, no_case,
+                            blacklist):
+    return sys.intern(_format_var_name(name, sep, accent, permit_char, default, remove_accent, min_length_word,
+                                       no_case, blacklist))
+
+
+def _format_var_name(name, sep="_", accent=False, permit_char=None, default="var", remove_accent=False,
+                     min_length_word=1, no_case=False, blacklist=keyword.kwlist):
     origin = str(name).strip()
     name = origin
     if no_case:
@@ -264,6 +309,55 @@ class Var(str):
     def __hash__(self):
         return super().__hash__()
 
+    def as_key(self):
+        """
+        Returns: VarKey of the name, hashed by its normalized form
+        """
+        return VarKey(self, remove_accent=self._remove_accent, no_case=self._no_case)
+
+
+class VarKey:
+    """
+    Name usable as dict key: the hash and the equality are the ones of the normalized name (Var without force),
+    VarKey("Numéro Client") and VarKey("numero_client") are the same key, and equal to the str numero_client
+    (only to the normalized str: a str is hashed by its text).
+    Var keeps the hash of the raw str (pandas columns, dict of the raw names) and its fuzzy equality (force)
+    can't be consistent with a hash.
+    """
+    __slots__ = ("name", "key")
+
+    def __init__(self, name, remove_accent=True, no_case=True):
+        """
+        Args:
+            name: str, the name
+            remove_accent: bool, names equal without their accents
+            no_case: bool, names equal without the case
+        """
+        self.name = name
+        key = format_var_name(name, default=name, remove_accent=remove_accent).strip("_")
+        self.key = sys.intern(key.lower() if no_case else key)
+
+    def __eq__(self, other):
+        if isinstance(other, VarKey):
+            return self.key == other.key
+        if isinstance(other, str):
+            # the text of the str (Var included): the equal objects have the same hash
+            return self.key == str.__str__(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        res = self.__eq__(other)
+        return res if res is NotImplemented else not res
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __str__(self):
+        return str(self.name)
+
+    def __repr__(self):
+        return "VarKey(%r)" % (self.name,)
+
 
 def extract_file(path, member=None, to_directory='.', file_type=None, pwd=None):
     members = [None]
@@ -0,0 +1,149 @@
+"""
+Benchmarks of the dataset tools.
+
+    python -m kb_package.utils.__bench__ big_processes size_gb=4 processes=8
+    python -m kb_package.utils.__bench__ query_backend nb_rows=1000000
+    python -m kb_package.utils.__bench__ group nb_rows=5000000 nb_groups=1000000
+    python -m kb_package.utils.__bench__ approx_sql nb_rows=10000000
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy
+import pandas
+
+from kb_package.utils import DatasetFactory
+from kb_package.utils.fdataset import count_distinct
+from kb_package.utils.big_dataset_factory import BIGDatasetFactory
+
+
+def _bench_dataset(nb_rows, seed=0):
+    rand = numpy.random.default_rng(seed)
+    return pandas.DataFrame({
+        "id": numpy.arange(nb_rows),
+        "amount": (rand.random(nb_rows) * 1000).round(2),
+        "label": numpy.char.add("label_", (numpy.arange(nb_rows) % 1000).astype(str)),
+        "qty": rand.integers(0, 100, nb_rows),
+        "comment": numpy.where(numpy.arange(nb_rows) % 97 == 0, "a \"quoted\", value\non 2 lines", "text"),
+    })
+
+
+def synthetic_csv(size_gb=2.0, file_name=None, block_rows=1_000_000):
+    """
+    Write (once) a csv file of about size_gb GB
+    Returns: the path of the file
+    """
+    file_name = file_name or os.path.join(tempfile.gettempdir(), "kb_bench_%sgb.csv" % size_gb)
+    if os.path.exists(file_name) and os.path.getsize(file_name) >= size_gb * 0.95 * (1 << 30):
+        return file_name
+    first = True
+    with open(file_name, "w", newline="") as file:
+        while first or file.tell() < size_gb * (1 << 30):
+            dataset = _bench_dataset(block_rows, seed=file.tell())
+            dataset.to_csv(file, index=False, header=first)
+            first = False
+    return file_name
+
+
+def bench_big_processes(file_name, processes=None, query="qty > 90 and amount < 100"):
+    """
+    Compare the rows per second of BIGDatasetFactory.query: a single process vs map_chunks processes
+    """
+    dataset = BIGDatasetFactory(file_name, sep=",", encoding="utf-8", force_=True)
+    result = {}
+    for nb in (None, processes or os.cpu_count()):
+        start = time.perf_counter()
+        res = dataset.query(query, processes=nb)
+        elapsed = time.perf_counter() - start
+        result[nb or 1] = dataset.size / elapsed
+        print("query", str(nb or 1) + " process(es)", ":", round(dataset.size / elapsed), "rows/s",
+              "(" + str(round(elapsed, 2)) + "s,", len(res), "rows)")
+    return result
+
+
+def bench_query_backend(nb_rows=1_000_000, queries=None):
+    """
+    Compare the duration of the hard queries of DatasetFactory.query: python (numpy.vectorize) vs vectorized
+    """
+    queries = queries or ["label like 'label_1.*'", "lower(label) = 'label_10'", "label in ('label_1', 'label_2')",
+                          "amount between 10 and 100", "qty is null", "length(comment) > 4"]
+    dataset = _bench_dataset(nb_rows)
+    dataset.loc[dataset.index % 7 == 0, "qty"] = numpy.nan
+    result = {}
+    backend = DatasetFactory.QUERY_BACKEND
+    try:
+        for query in queries:
+            for DatasetFactory.QUERY_BACKEND in ("python", "vectorized"):
+                start = time.perf_counter()
+                res = DatasetFactory(dataset).query(query)
+                elapsed = time.perf_counter() - start
+                result[(query, DatasetFactory.QUERY_BACKEND)] = elapsed
+                print(query, "|", DatasetFactory.QUERY_BACKEND, ":", str(round(elapsed, 3)) + "s",
+                      "(" + str(len(res)) + " rows)")
+    finally:
+        DatasetFactory.QUERY_BACKEND = backend
+    return result
+
+
+def bench_group(nb_rows=5_000_000, nb_groups=1_000_000):
+    """
+    Duration of DatasetFactory.group with nb_groups groups: sorted groups vs hash aggregation (sort=False),
+    and count_distinct by group (len(unique) of each group) vs nunique
+    """
+    dataset = _bench_dataset(nb_rows)
+    dataset["key"] = numpy.random.default_rng(1).integers(0, nb_groups, nb_rows)
+    aggregations = [{"func": "sum", "on": "amount"}, {"func": "avg", "on": "qty"}, {"func": "count", "on": "id"},
+                    {"func": count_distinct, "on": "qty"}]
+    result = {}
+    for sort in (True, False):
+        start = time.perf_counter()
+        res = DatasetFactory.group("key", dataset, aggregations, sort=sort)
+        result["sort=" + str(sort)] = time.perf_counter() - start
+        print("group sort=" + str(sort), ":", str(round(result["sort=" + str(sort)], 3)) + "s",
+              "(" + str(len(res)) + " groups)")
+    for name, func in (("count_distinct by group", lambda g: g["qty"].agg(count_distinct)),
+                       ("nunique", lambda g: g["qty"].nunique(dropna=False))):
+        start = time.perf_counter()
+        func(dataset.groupby("key", sort=False))
+        result[name] = time.perf_counter() - start
+        print(name, ":", str(round(result[name], 3)) + "s")
+    return result
+
+
+def bench_approx_sql(nb_rows=10_000_000, query=None):
+    """
+    Compare the duration of DatasetFactory.sql: exact vs approx=True, and the errors of the estimates
+    """
+    query = query or ("@select label, count(distinct id) as ids, avg(amount) as mean, median(amount) as median "
+                      "@group_by label")
+    dataset = _bench_dataset(nb_rows)
+    dataset["label"] = numpy.char.add("label_", (numpy.arange(nb_rows) % 10).astype(str))
+    dataset["id"] = numpy.random.default_rng(2).integers(0, nb_rows // 4, nb_rows)
+    dataset = DatasetFactory(dataset)
+    result = {}
+    for approx in (False, True):
+        start = time.perf_counter()
+        result[approx] = dataset.sql(query, approx=approx).dataset
+        print("sql approx=" + str(approx), ":", str(round(time.perf_counter() - start, 3)) + "s")
+    for col in ("ids", "mean", "median"):
+        error = (result[True][col] / result[False][col] - 1).abs()
+        inside = ((result[True][col + "_low"] <= result[False][col]) &
+                  (result[False][col] <= result[True][col + "_high"])).mean()
+        print(col, ": max relative error", round(error.max(), 4), "| in the interval", str(round(inside * 100)) + "%")
+    return result
+
+
+if __name__ == '__main__':
+    bench = (sys.argv[1:] or ["big_processes"])[0]
+    bench_kwargs = dict([arg.split("=", 1) for arg in sys.argv[2:]])
+    if bench == "big_processes":
+        path = bench_kwargs.get("file_name") or synthetic_csv(float(bench_kwargs.get("size_gb", 2)))
+        bench_big_processes(path, processes=int(bench_kwargs.get("processes", 0)) or None)
+    elif bench == "query_backend":
+        bench_query_backend(int(bench_kwargs.get("nb_rows", 1_000_000)))
+    elif bench == "group":
+        bench_group(int(bench_kwargs.get("nb_rows", 5_000_000)), int(bench_kwargs.get("nb_groups", 1_000_000)))
+    elif bench == "approx_sql":
+        bench_approx_sql(int(bench_kwargs.get("nb_rows", 10_000_000)))
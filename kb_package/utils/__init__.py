@@ -2,6 +2,10 @@ try:
     from .fdataset import DatasetFactory
 except (ImportError, Exception):
     pass
+try:
+    from .file_cache import FileCache
+except (ImportError, Exception):
+    pass
 try:
     from .fexcel import ExcelFactory
 except (ImportError, Exception):
@@ -9,5 +13,6 @@ except (ImportError, Exception):
 
 __all__ = [
     "DatasetFactory",
+    "FileCache",
     'ExcelFactory'
 ]
\ No newline at end of file
@@ -0,0 +1,429 @@
+import os
+import tempfile
+
+import numpy
+import pandas
+
+from kb_package import tools
+from kb_package.utils import DatasetFactory
+from kb_package.utils.big_dataset_factory import BIGDatasetFactory
+
+
+def _mixed_key_file():
+    # the key k is numeric in the first chunks, numeric and text in the last ones: pandas infers int64 then object
+    path = os.path.join(tempfile.mkdtemp(), "mixed_keys.csv")
+    keys = [1, 2, 3, 4, 5] * 8 + [1, 2, 3, 4, 5, "x"] * 4
+    pandas.DataFrame({"k": keys, "v": range(len(keys))}).to_csv(path, index=False)
+    return path, len(keys)
+
+
+def test_mixed_key_chunks():
+    path, nb_rows = _mixed_key_file()
+    dataset = BIGDatasetFactory(path, sep=",", encoding="utf-8", force_=True, max_nb_line=10)
+    assert len(dataset) == nb_rows
+
+    assert len(dataset.doublon("k")) == 6
+    assert len(dataset.doublon("k", keep="last")) == 6
+
+    groups = dataset.group("k", [{"func": "count", "on": "v"}, {"func": "count_distinct", "on": "v"}])
+    assert len(groups) == 6
+    assert sorted(groups["count(v)"].tolist()) == [4] + [12] * 5
+
+    other = pandas.DataFrame({"k": ["1", "2", "x"], "label": ["a", "b", "c"]})
+    merged = dataset.cmerge(other, "k", how="inner", partitions=4)
+    assert len(merged) == 28
+    assert len(dataset.intersect(other, "k", partitions=4)) == 28
+    assert len(dataset.exclude(other, "k", partitions=4)) == nb_rows - 28
+
+
+def test_quoted_new_lines():
+    # a new line in a quoted value doesn't end the row (row index and chunks)
+    path = os.path.join(tempfile.mkdtemp(), "quoted_new_lines.csv")
+    frame = pandas.DataFrame({"a": range(2000), "b": ["x\ny" if i % 50 == 0 else "z" for i in range(2000)]})
+    frame.to_csv(path, index=False)
+    for max_nb_line in (1, 52, 500):
+        dataset = BIGDatasetFactory(path, sep=",", encoding="utf-8", force_=True, max_nb_line=max_nb_line)
+        assert len(dataset) == 2000
+        chunks = [dataset.get_chunk(i).dataset for i in range(dataset.nb_chunks)]
+        assert pandas.concat(chunks)["b"].tolist() == frame["b"].tolist()
+
+
+def _stray_quotes_file():
+    # quotes in unquoted fields (5" screen), quoted fields with new lines and ""
+    path = os.path.join(tempfile.mkdtemp(), "stray_quotes.csv")
+    with open(path, "w") as file:
+        file.write("a,b,c\n")
+        for i in range(100):
+            value = '5" screen' if i % 10 == 3 else '"x\ny, ""z"""' if i % 10 == 7 else "plain"
+            file.write(f"{i},{value},{i * 2}\n")
+    return path
+
+
+def test_stray_quotes():
+    path = _stray_quotes_file()
+    frame = pandas.read_csv(path)
+    assert len(frame) == 100
+    for max_nb_line in (1, 7, 30, 500):
+        dataset = BIGDatasetFactory(path, sep=",", encoding="utf-8", force_=True, max_nb_line=max_nb_line)
+        assert len(dataset) == 100
+        chunks = [dataset.get_chunk(i).dataset for i in range(dataset.nb_chunks)]
+        assert pandas.concat(chunks, ignore_index=True).equals(frame)
+
+
+def test_stray_quotes_processes():
+    # the byte ranges of the processes are cut at the same ends of rows as the row index
+    path = _stray_quotes_file()
+    dataset = BIGDatasetFactory(path, sep=",", encoding="utf-8", force_=True, max_nb_line=7)
+    expected = dataset.query("a >= 10", reset=True)
+    result = dataset.query("a >= 10", reset=True, processes=2)
+    assert len(result) == len(expected) == 90
+    assert result.dataset.equals(expected.dataset)
+    assert sum(dataset.map_chunks(len, processes=2)) == 100
+
+
+def test_processes():
+    # the byte ranges cover the file, the processes give the rows and the groups of a single process
+    path = os.path.join(tempfile.mkdtemp(), "processes.csv")
+    frame = pandas.DataFrame({"a": range(1000), "g": [i % 5 for i in range(1000)],
+                              "b": ['x,"y"\nz' if i % 37 == 0 else "s" + str(i) for i in range(1000)]})
+    frame.to_csv(path, index=False)
+    dataset = BIGDatasetFactory(path, sep=",", encoding="utf-8", force_=True, max_nb_line=100)
+    ranges = dataset.byte_ranges()
+    assert len(ranges) > 1
+    assert ranges[-1][1] == os.path.getsize(path)
+    assert all(end == next_start for (_, end, _), (next_start, _, _) in zip(ranges, ranges[1:]))
+
+    chunks = [chunk.dataset for chunk in dataset.iter_chunks(processes=2)]
+    assert [chunk.index[0] for chunk in chunks] == [first_row for _, _, first_row in ranges]
+    assert pandas.concat(chunks).reset_index(drop=True).equals(frame)
+
+    aggregations = [{"func": "count", "on": "a"}, {"func": "sum", "on": "a"}]
+    assert dataset.group("g", aggregations, processes=2).equals(dataset.group("g", aggregations))
+
+
+def test_chunk_reader():
+    # the chunks are parsed from the bytes of the rows: typed columns, index of the row numbers
+    path = os.path.join(tempfile.mkdtemp(), "chunk_reader.csv")
+    frame = pandas.DataFrame({"a": range(1000), "x": [i / 4 for i in range(1000)],
+                              "b": ["s" + str(i) for i in range(1000)]})
+    frame.to_csv(path, index=False)
+    with open(path, "ab") as file:
+        file.write(b"1000,250.0,ab\0c\n")
+    dataset = BIGDatasetFactory(path, sep=",", encoding="utf-8", force_=True, max_nb_line=100)
+    assert len(dataset) == 1001
+    assert dataset.get_rows(250, 260).dataset.equals(frame.iloc[250:260])
+    assert dataset.get_chunk(3).dataset.equals(frame.iloc[300:400])
+    # the null characters are removed
+    assert dataset.get_rows(1000).dataset["b"].tolist() == ["abc"]
+    chunk = BIGDatasetFactory._parse_chunk(b"1,2.5,a\n2,3.5,b\n", dataset._read_kwargs, 5).dataset
+    assert chunk.index.tolist() == [5, 6]
+    assert chunk.dtypes.tolist() == frame.dtypes.tolist()
+
+
+def test_encoding_detection():
+    # the encoding and the separator are detected once with samples of the file
+    path = os.path.join(tempfile.mkdtemp(), "encoding.csv")
+    sample_size, DatasetFactory.ENCODING_SAMPLE_SIZE = DatasetFactory.ENCODING_SAMPLE_SIZE, 1024
+    try:
+        for row, parses in ((3, 1), (1200, 2)):
+            # in the head sample, then out of the samples: a second parse
+            names = ["name_" + str(i) for i in range(5000)]
+            names[row] = "Fran\xe7ois Gu\xe9d\xe9"
+            pandas.DataFrame({"id": range(5000), "name": names}).to_csv(path, sep=";", index=False,
+                                                                        encoding="cp1252")
+            dataset = DatasetFactory(path)
+            info = DatasetFactory.LAST_FILE_LOADING_INFO
+            assert (info.encoding, info.sep, info.parses) == ("cp1252", ";", parses)
+            assert info.bytes_sampled < os.path.getsize(path)
+            assert dataset.shape == (5000, 2)
+            assert dataset.dataset["name"].tolist() == names
+    finally:
+        DatasetFactory.ENCODING_SAMPLE_SIZE = sample_size
+
+
+def test_read_projection():
+    # only the given columns and the columns of the where condition are read, the condition is applied by chunk
+    path = os.path.join(tempfile.mkdtemp(), "projection.csv")
+    frame = pandas.DataFrame({"id": range(1000), "Client Name": ["c" + str(i) for i in range(1000)],
+                              "score": [i % 10 for i in range(1000)], "other": ["o"] * 1000})
+    frame.to_csv(path, index=False)
+    read_csv, chunk_size = pandas.read_csv, DatasetFactory.READ_CHUNK_SIZE
+    calls = []
+
+    def recorded_read_csv(*args, **kwargs):
+        calls.append(kwargs)
+        return read_csv(*args, **kwargs)
+
+    pandas.read_csv, DatasetFactory.READ_CHUNK_SIZE = recorded_read_csv, 100
+    try:
+        dataset = DatasetFactory(path, columns=["id", "client_name"], where="score = 3 and id < 500")
+        assert calls[-1]["usecols"] == ["id", "Client Name", "score"]
+        assert calls[-1]["chunksize"] == 100
+        expected = DatasetFactory(DatasetFactory(frame).query("score = 3 and id < 500"), columns=["id", "client_name"])
+        assert dataset.dataset.equals(expected.dataset)
+
+        dataset = DatasetFactory(path, columns={"id": "ident"}, where="score > %s", params=[7])
+        assert calls[-1]["usecols"] == ["id", "score"]
+        assert list(dataset.columns) == ["ident"] and dataset.dataset["ident"].tolist() == \
+            [i for i in range(1000) if i % 10 > 7]
+        assert DatasetFactory(path, where="score = 100").shape == (0, 4)
+    finally:
+        pandas.read_csv, DatasetFactory.READ_CHUNK_SIZE = read_csv, chunk_size
+
+
+def test_partitioned_merge():
+    # the partitioned hash join gives the rows of the in-memory merge
+    left = pandas.DataFrame({"id": [i % 50 for i in range(300)], "v": range(300)})
+    right = pandas.DataFrame({"key": list(range(0, 80, 3)) * 2, "label": ["l" + str(i) for i in range(54)]})
+    path = os.path.join(tempfile.mkdtemp(), "right.csv")
+    right.to_csv(path, index=False)
+    big_right = BIGDatasetFactory(path, sep=",", encoding="utf-8", force_=True, max_nb_line=10)
+    dataset = DatasetFactory(left)
+    for how in ("left", "inner"):
+        expected = dataset.cmerge(right, ("id", "key"), how=how).astype({"_merge": str})
+        for other, processes in ((right, None), (right, 2), (big_right, None)):
+            result = dataset.cmerge(other, ("id", "key"), how=how, partitions=4, processes=processes)
+            result = result.dataset.reset_index(drop=True)
+            assert list(result.columns) == list(expected.columns)
+            if how == "inner":
+                # the rows of the left dataset are in their order, not grouped by key like pandas
+                result, expected_ = (frame.sort_values(["v", "label"]).reset_index(drop=True)
+                                     for frame in (result, expected))
+            else:
+                expected_ = expected
+            assert result.equals(expected_), how
+    for method in ("exclude", "intersect"):
+        expected = getattr(dataset, method)(right, ("id", "key"))
+        result = getattr(dataset, method)(right, ("id", "key"), partitions=4, processes=2)
+        assert result.dataset.reset_index(drop=True).equals(expected)
+
+
+def test_column_lookup():
+    # the index of the names of the columns follows their changes
+    dataset = DatasetFactory(pandas.DataFrame({"Client Name": ["a", "b"], "Age": [1, 2], "Ville": ["x", "y"]}))
+    assert dataset["client_name"].tolist() == dataset.client_name.tolist() == ["a", "b"]
+    assert dataset["AGE"].tolist() == [1, 2]
+    renamed = dataset.rename(columns={"client_name": "Customer"})
+    assert list(renamed.columns) == ["Customer", "Age", "Ville"]
+    assert dataset["client_name"].tolist() == ["a", "b"]
+
+    dataset.rename(columns={"client_name": "Customer"}, inplace=True)
+    assert dataset["customer"].tolist() == ["a", "b"]
+    dataset.drop(columns=["age"], inplace=True)
+    assert list(dataset.columns) == ["Customer", "Ville"]
+    for name in ("client_name", "age"):
+        try:
+            dataset[name]
+            raise AssertionError("the column %s is found" % name)
+        except KeyError:
+            pass
+    dataset["New Col"] = [5, 6]
+    assert dataset.new_col.tolist() == [5, 6]
+    del dataset["new_col"]
+    assert list(dataset.columns) == ["Customer", "Ville"]
+
+
+def test_var_key():
+    # the equal keys have the same hash
+    names = ["Numéro Client", "numero_client", "NUMERO CLIENT", " numéro-client ", "Ville", "ville", "Age"]
+    keys = [tools.VarKey(name) for name in names] + [tools.Var(name).as_key() for name in names]
+    values = keys + names + ["numero_client", "ville"]
+    for left in values:
+        for right in values:
+            if left == right:
+                assert hash(left) == hash(right), (left, right)
+    assert len(set(keys)) == 3
+    index = {tools.VarKey(name): i for i, name in enumerate(["Numéro Client", "Ville"])}
+    assert index[tools.VarKey("NUMERO-client")] == 0
+    assert index["ville"] == 1 and "Ville" not in index
+    assert tools.VarKey("Numéro Client") != tools.VarKey("Numéro Clients")
+    # the cached normalization gives the result of the normalization
+    for name in names:
+        assert tools.format_var_name(name, remove_accent=True) == tools._format_var_name(name, remove_accent=True)
+        assert tools.Var(name) == tools.Var(name).as_key().key
+
+
+def test_temp_files_removed():
+    path, nb_rows = _mixed_key_file()
+    folder, BIGDatasetFactory.TEMP_FOLDER = BIGDatasetFactory.TEMP_FOLDER, tempfile.mkdtemp()
+    try:
+        dataset = BIGDatasetFactory(path, sep=",", encoding="utf-8", force_=True, max_nb_line=10)
+        # the results are loaded in memory: no temporary file left, even without rows
+        assert len(dataset.query("v > 1000")) == 0
+        assert len(dataset.sort_values("v")) == nb_rows
+        assert len(dataset.doublon("k")) == 6
+        assert os.listdir(BIGDatasetFactory.TEMP_FOLDER) == []
+    finally:
+        BIGDatasetFactory.TEMP_FOLDER = folder
+
+
+def test_sampling_size():
+    path, nb_rows = _mixed_key_file()
+    big_dataset = BIGDatasetFactory(path, sep=",", encoding="utf-8", force_=True, max_nb_line=10)
+    dataset = DatasetFactory(path, sep=",")
+    for source in (dataset, big_dataset):
+        # a float or a percentage is a fraction, an int a nb of rows
+        assert len(source.sampling("100%", seed=0)) == nb_rows
+        assert len(source.sampling(1.0, seed=0)) == nb_rows
+        assert len(source.sampling(0.5, seed=0)) == nb_rows // 2
+        assert len(source.sampling(1, seed=0)) == 1
+        assert len(source.sampling(10 * nb_rows, seed=0)) == nb_rows
+
+
+def test_query_backends():
+    # the backends give the same rows (the numeric conditions with numexpr when it's installed)
+    frame = pandas.DataFrame({"a": range(100), "b": [i % 7 for i in range(100)],
+                              "c": [None if i % 5 == 0 else float(i) for i in range(100)]})
+    backend, min_rows = DatasetFactory.QUERY_BACKEND, DatasetFactory.NUMEXPR_MIN_ROWS
+    DatasetFactory.NUMEXPR_MIN_ROWS = 0
+    try:
+        for query in ("a > 10 and b = 3", "c < a * 2 or b != 1", "a + b >= 50"):
+            results = []
+            for DatasetFactory.QUERY_BACKEND in ("python", "vectorized", "numexpr"):
+                results.append(DatasetFactory(frame).query(query).index.tolist())
+            assert results[0] == results[1] == results[2], query
+    finally:
+        DatasetFactory.QUERY_BACKEND, DatasetFactory.NUMEXPR_MIN_ROWS = backend, min_rows
+
+
+def test_hard_query_backends():
+    # the functions of the queries give the same rows with the vectorized backend
+    frame = pandas.DataFrame({"label": ["Label_" + str(i) if i % 6 else None for i in range(200)],
+                              "amount": [i * 1.5 for i in range(200)],
+                              "qty": [None if i % 4 == 0 else i for i in range(200)],
+                              "comment": ["c" * (i % 7) for i in range(200)]})
+    expected = {"label like 'Label_1.*'": frame["label"].str.match("Label_1.*").fillna(False),
+                "lower(label) = 'label_10'": frame["label"] == "Label_10",
+                "label in ('Label_1', 'Label_2')": frame["label"].isin(["Label_1", "Label_2"]),
+                "amount between 10 and 100": frame["amount"].between(10, 100),
+                "qty is null": frame["qty"].isna(),
+                "length(comment) > 4": frame["comment"].str.len() > 4,
+                "upper(label) like 'LABEL_2.*' and not qty is null":
+                    frame["label"].str.match("Label_2.*").fillna(False) & frame["qty"].notna()}
+    backend = DatasetFactory.QUERY_BACKEND
+    try:
+        for query, mask in expected.items():
+            for DatasetFactory.QUERY_BACKEND in ("python", "vectorized"):
+                assert DatasetFactory(frame).query(query).index.tolist() == frame.index[mask].tolist(), query
+    finally:
+        DatasetFactory.QUERY_BACKEND = backend
+
+
+def test_query_functions():
+    frame = pandas.DataFrame({"a": range(10), "b": [i % 3 for i in range(10)]})
+    dataset = DatasetFactory(frame)
+    assert dataset.query("big(a) and b = 0", big=lambda serie: serie > 4).index.tolist() == [6, 9]
+    # the function is only known by its call (the plan of the query is cached)
+    try:
+        dataset.query("big(a) and b = 0")
+        raise AssertionError("the function of a previous call is used")
+    except ValueError:
+        pass
+    assert dataset.query("big(a) and b = 0", big=lambda serie: serie < 4).index.tolist() == [0, 3]
+    try:
+        dataset.query("a > 4", engine="python")
+        raise AssertionError("an unknown argument is ignored")
+    except TypeError:
+        pass
+
+
+def test_apply():
+    frame = pandas.DataFrame({"a": [1, 2, 3], "b": [10, 20, 30]})
+    dataset = DatasetFactory(frame)
+    assert dataset.apply("double(a) + b", double=lambda x: x * 2).tolist() == [12, 24, 36]
+    # the function is only known by its call
+    try:
+        dataset.apply("double(a) + b")
+        raise AssertionError("the function of a previous call is used")
+    except ValueError:
+        pass
+    column_wise = DatasetFactory.APPLY_COLUMN_WISE
+    try:
+        results = []
+        for DatasetFactory.APPLY_COLUMN_WISE in (True, False):
+            results.append(DatasetFactory(frame).apply("a * 2 + b").tolist())
+        assert results[0] == results[1] == [12, 24, 36]
+    finally:
+        DatasetFactory.APPLY_COLUMN_WISE = column_wise
+
+
+def test_group_alias_of_a_key():
+    path, _ = _mixed_key_file()
+    aggregations = [{"func": "max", "on": "v", "alias": "k"}]
+    big_dataset = BIGDatasetFactory(path, sep=",", encoding="utf-8", force_=True, max_nb_line=10)
+    for group in (lambda: DatasetFactory.group("k", DatasetFactory(path, sep=",").dataset, aggregations),
+                  lambda: big_dataset.group("k", aggregations)):
+        try:
+            group()
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("an alias equal to a key of group_by must be refused")
+
+
+class _CollidingBIG(BIGDatasetFactory):
+    # every row has the same hash
+    @staticmethod
+    def _hash_rows(frame):
+        return numpy.zeros(len(frame), dtype="uint64")
+
+
+def test_doublon_hash_collisions():
+    path, nb_rows = _mixed_key_file()
+    dataset = _CollidingBIG(path, sep=",", encoding="utf-8", force_=True, max_nb_line=10)
+    first = dataset.doublon("k").dataset
+    assert first["k"].astype(str).tolist() == ["1", "2", "3", "4", "5", "x"]
+    assert first["v"].tolist() == [0, 1, 2, 3, 4, 45]
+    last = dataset.doublon("k", keep="last").dataset
+    assert sorted(last["v"].tolist()) == [nb_rows - 6 + i for i in range(6)]
+    assert len(dataset.doublon("k", keep=False)) == 0
+    assert len(dataset.doublon()) == nb_rows
+
+
+def test_save():
+    path, nb_rows = _mixed_key_file()
+    dataset = BIGDatasetFactory(path, sep=",", encoding="utf-8", force_=True, max_nb_line=10)
+    for target in (None, path):
+        try:
+            dataset.save(target)
+            raise AssertionError("The file of the dataset is overwritten")
+        except ValueError:
+            pass
+    assert len(BIGDatasetFactory(path, sep=",", encoding="utf-8", force_=True, max_nb_line=10)) == nb_rows
+
+    # the row index of the old file is not reused
+    target = os.path.join(os.path.dirname(path), "saved.csv")
+    pandas.DataFrame({"k": range(3), "v": range(3)}).to_csv(target, index=False)
+    assert len(BIGDatasetFactory(target, sep=",", encoding="utf-8", force_=True, max_nb_line=1)) == 3
+    assert dataset.save(target) == target
+    saved = BIGDatasetFactory(target, sep=",", encoding="utf-8", force_=True, max_nb_line=10)
+    assert len(saved) == nb_rows
+    assert pandas.concat([saved.get_chunk(i).dataset for i in range(saved.nb_chunks)])["v"].tolist() == \
+        list(range(nb_rows))
+
+
+def main_test():
+    test_mixed_key_chunks()
+    test_quoted_new_lines()
+    test_stray_quotes()
+    test_stray_quotes_processes()
+    test_processes()
+    test_chunk_reader()
+    test_encoding_detection()
+    test_read_projection()
+    test_partitioned_merge()
+    test_column_lookup()
+    test_var_key()
+    test_temp_files_removed()
+    test_sampling_size()
+    test_query_backends()
+    test_hard_query_backends()
+    test_query_functions()
+    test_apply()
+    test_group_alias_of_a_key()
+    test_doublon_hash_collisions()
+    test_save()
+
+
+if __name__ == '__main__':
+    main_test()
@@ -0,0 +1,108 @@
+"""
+Columnar versions of the functions of _query_func (DatasetFactory.QUERY_BACKEND = "vectorized"):
+a Series is computed with the pandas .str accessors, isin, to_numeric ...; the other values use _query_func
+"""
+import pandas
+from pandas.api.types import infer_dtype
+
+import kb_package.utils._query_func as query_func
+
+
+def _is_series(value):
+    return isinstance(value, pandas.Series)
+
+
+def _str_series(serie):
+    # the .str methods give null for the values without string methods (value.lower() if hasattr(...) else None)
+    return serie if serie.dtype == object else pandas.Series(None, index=serie.index, dtype=object)
+
+
+def _as_str(serie):
+    # str(value) of the not null values: only the values not already text are converted
+    if serie.dtype != object:
+        return serie.astype(str)
+    if infer_dtype(serie, skipna=True) in ("string", "empty"):
+        return serie
+    not_str = serie.str.len().isna() & serie.notna()
+    if not_str.any():
+        serie = serie.copy()
+        serie[not_str] = serie[not_str].astype(str)
+    return serie
+
+
+def like(value, regex, _not=False):
+    if not _is_series(value):
+        return query_func.like(value, regex, _not)
+    res = _as_str(value).str.match(regex)
+    if _not:
+        res = ~res.astype(bool)
+    return res.where(value.notna(), _not).astype(bool)
+
+
+def lower(value):
+    if not _is_series(value):
+        return query_func.lower(value)
+    return _str_series(value).str.lower()
+
+
+def upper(value):
+    if not _is_series(value):
+        return query_func.upper(value)
+    return _str_series(value).str.upper()
+
+
+def trim(value):
+    if not _is_series(value):
+        return query_func.trim(value)
+    return _str_series(value).str.strip()
+
+
+def replace(old_car, new_car, value):
+    if not _is_series(value):
+        return query_func.replace(old_car, new_car, value)
+    return _str_series(value).str.replace(old_car, new_car, regex=False)
+
+
+def length(value):
+    if not _is_series(value):
+        return query_func.length(value)
+    if value.dtype != object:
+        return value.astype(str).str.len().where(value.notna(), 0)
+    res = value.str.len()
+    not_str = res.isna() & value.notna()
+    if not_str.any():
+        res[not_str] = value[not_str].astype(str).str.len()
+    return res.fillna(0).astype(int)
+
+
+def substring(value, start, end=None):
+    if not _is_series(value):
+        return query_func.substring(value, start, end)
+    return _str_series(value).str.slice(start, end)
+
+
+def to_number(value, default=None):
+    if not _is_series(value):
+        return query_func.to_number(value, default)
+    return pandas.to_numeric(value, errors="coerce" if default is None else "raise")
+
+
+def to_str(value):
+    if not _is_series(value):
+        return query_func.to_str(value)
+    return value.astype(str).where(value.notna(), None)
+
+
+def is_in(serie, iterable, _not=False):
+    if not _is_series(serie) or isinstance(iterable, str) or not hasattr(iterable, "__iter__"):
+        # in a text: a test by value
+        return query_func.is_in(serie, iterable, _not)
+    res = serie.isin(list(iterable))
+    if _not:
+        res = ~res
+    # null is never in (or not in) the values
+    return res & serie.notna()
+
+
+FUNCTIONS = {"like": like, "lower": lower, "upper": upper, "trim": trim, "replace": replace, "length": length,
+             "substring": substring, "to_number": to_number, "to_str": to_str, "is_in": is_in}
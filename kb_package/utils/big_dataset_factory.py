@@ -1,23 +1,391 @@
+import collections
 import csv
+import itertools
+import mmap
 import os
+import pickle
 import re
+import tempfile
 import time
+import typing
+import weakref
 
 import chardet
+import numpy
 import pandas
 import psutil
 import io
+from pandas.api.types import is_bool_dtype, is_integer_dtype, is_numeric_dtype
 
 from kb_package.utils import DatasetFactory
 from kb_package import tools
 
 
+def _row_starts(array, sep=44, in_quotes=False, previous=10):
+    """
+    Ends of the rows of a block of a csv file: the new lines out of a quoted field.
+    The quotes are read like the csv module: a quote opens a quoted field only at the start of a field
+    (after the separator or a new line), "" is a quote in a quoted field, the other quotes are text (5" screen).
+    Args:
+        array: numpy.ndarray of uint8, the bytes of the block. It doesn't end by a quote (but at the end of the file)
+        sep: int, the byte of the separator
+        in_quotes: bool, the block starts in a quoted field
+        previous: int, the byte before the block (a new line at the start of a row)
+
+    Returns: (numpy.ndarray, positions in the block of the starts of the rows, in_quotes at the end of the block)
+    """
+    new_lines = numpy.flatnonzero(array == 10)
+    quotes = numpy.flatnonzero(array == 34)
+    if not len(quotes):
+        return (new_lines + 1 if not in_quotes else new_lines[:0]), in_quotes
+    before = numpy.concatenate([[previous], array[:-1]])[quotes]
+    opening = (numpy.arange(len(quotes)) + int(in_quotes)) % 2 == 0
+    if numpy.isin(before[opening], (sep, 10, 13, 34)).all():
+        # each quote opens or closes a quoted field (or is a "" in a quoted field): the parity of the quotes
+        in_field = (numpy.searchsorted(quotes, new_lines) + int(in_quotes)) % 2 == 1
+        return new_lines[~in_field] + 1, bool((len(quotes) + int(in_quotes)) % 2)
+    # a quote in an unquoted field: the quotes are read one by one
+    bounds, k = [0] if in_quotes else [], 0
+    while k < len(quotes):
+        position = quotes[k]
+        if not in_quotes:
+            if before[k] in (sep, 10, 13):
+                in_quotes = True
+                bounds.append(position)
+            k += 1
+        elif k + 1 < len(quotes) and quotes[k + 1] == position + 1:
+            # "" in a quoted field
+            k += 2
+        else:
+            in_quotes = False
+            bounds.append(position)
+            k += 1
+    if in_quotes:
+        bounds.append(len(array))
+    # the quoted fields are the ranges [bounds[2i], bounds[2i + 1])
+    in_field = numpy.searchsorted(numpy.asarray(bounds), new_lines, side="right") % 2 == 1
+    return new_lines[~in_field] + 1, in_quotes
+
+
+def _iter_row_starts(file, sep=",", block_size=1 << 24):
+    """
+    Read the file from its current position block by block (see _row_starts)
+    Returns: generator of (absolute positions of the starts of the rows, block)
+    """
+    sep = ord(sep) if len(sep) == 1 else 44
+    position, in_quotes, previous = file.tell(), False, 10
+    while True:
+        block = file.read(block_size)
+        if not block:
+            break
+        while block.endswith(b'"'):
+            # the quote and the next byte in the same block ("" or closing quote)
+            extra = file.read(1)
+            if not extra:
+                break
+            block += extra
+        array = numpy.frombuffer(block, dtype="uint8")
+        starts, in_quotes = _row_starts(array, sep, in_quotes, previous)
+        yield starts + position, block
+        position += len(block)
+        previous = int(array[-1])
+
+
+class RowIndex:
+    """
+    Sidecar index of the rows of a csv file: the byte offset of a row every `step` rows.
+    Stored next to the file (file + EXT), it's valid while the size and the mtime of the file don't change.
+    The new lines in a quoted field don't end a row (see _row_starts, like BIGDatasetFactory.byte_ranges).
+    """
+    EXT = ".kbidx"
+    BLOCK_SIZE = 1 << 24
+    # changed when the layout of the index changes: the old indexes are rebuilt
+    VERSION = 3
+
+    def __init__(self, path, first_row_seek=0, step=1000, sep=","):
+        self.path = path
+        self.step = max(int(step), 1)
+        self.sep = sep or ","
+        stat_result = os.stat(path)
+        self.key = {"size": stat_result.st_size, "mtime": stat_result.st_mtime_ns,
+                    "first_row_seek": int(first_row_seek), "step": self.step, "version": self.VERSION,
+                    "sep": ord(self.sep[0])}
+        self.offsets = numpy.array([first_row_seek], dtype="uint64")
+        self.nb_rows = 0
+        if not self._load():
+            self._build()
+            self._save()
+
+    @property
+    def index_path(self):
+        return self.path + self.EXT
+
+    def _load(self):
+        try:
+            with numpy.load(self.index_path) as data:
+                if {k: int(data[k]) for k in self.key} != self.key:
+                    return False
+                self.offsets = data["offsets"]
+                self.nb_rows = int(data["nb_rows"])
+            return True
+        except (OSError, KeyError, ValueError, Exception):
+            return False
+
+    def _save(self):
+        try:
+            with open(self.index_path, "wb") as file:
+                numpy.savez(file, offsets=self.offsets, nb_rows=self.nb_rows, **self.key)
+        except OSError:
+            # read only folder: the index is only in memory
+            pass
+
+    def _build(self):
+        first_row_seek, size = self.key["first_row_seek"], self.key["size"]
+        offsets = [first_row_seek]
+        nb_lines = 0
+        last = b""
+        with open(self.path, "rb") as file:
+            file.seek(first_row_seek)
+            for starts, block in _iter_row_starts(file, self.sep, self.BLOCK_SIZE):
+                # the row nb_lines + k + 1 starts after the k-th end of row of the block
+                offsets.extend(starts[(-(nb_lines + 1)) % self.step::self.step].tolist())
+                nb_lines += len(starts)
+                last = block[-1:]
+        self.nb_rows = nb_lines + (1 if last and last != b"\n" else 0)
+        self.offsets = numpy.array([o for o in offsets if o < size] or [first_row_seek], dtype="uint64")
+
+    def offset(self, row, buffer):
+        """
+        Byte offset of the start of the row (buffer: mmap or bytes of the file, at most step new lines searched)
+        """
+        index = min(row // self.step, len(self.offsets) - 1)
+        position, size = int(self.offsets[index]), self.key["size"]
+        nb_rows = row - index * self.step
+        sep = ord(self.sep[0])
+        in_quotes, previous, window = False, 10, 1 << 16
+        while nb_rows > 0:
+            if position >= size:
+                return size
+            end = min(position + window, size)
+            while end < size and buffer[end - 1] == 34:
+                end += 1
+            array = numpy.frombuffer(buffer[position: end], dtype="uint8")
+            starts, in_quotes = _row_starts(array, sep, in_quotes, previous)
+            if len(starts) >= nb_rows:
+                return min(position + int(starts[nb_rows - 1]), size)
+            nb_rows -= len(starts)
+            position, previous, window = end, int(array[-1]), window * 2
+        return position
+
+    def invalidate(self):
+        try:
+            os.remove(self.index_path)
+        except OSError:
+            pass
+
+
+def _identity(source):
+    return source
+
+
+def _run_byte_range(path, start, end, first_row, read_kwargs, func, args, kwargs):
+    # run in the processes of BIGDatasetFactory.map_chunks
+    with open(path, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    return func(BIGDatasetFactory._parse_chunk(data, read_kwargs, first_row), *args, **kwargs)
+
+
+def _partial_group(source, group_by, aggregations, partial, distinct):
+    """
+    Partial aggregation of a chunk for BIGDatasetFactory.group
+    Returns: (DataFrame of the partial columns or None, {aggregation index: distinct (group_by, on) pairs})
+    """
+    frame = source.dataset
+    # grouped by the text of the keys: the same groups in all the chunks (see BIGDatasetFactory._key_values)
+    keys = [f"_kb_key_{j}" for j in range(len(group_by))]
+    for key, col in zip(keys, group_by):
+        frame[key] = BIGDatasetFactory._key_values(frame[col])
+    pairs = {}
+    for i, (alias, func, on) in enumerate(aggregations):
+        if func in ("std", "var"):
+            frame[f"_{i}_square"] = frame[on] ** 2
+        elif i in distinct:
+            frame[f"_{i}_value"] = BIGDatasetFactory._key_values(frame[on])
+            pairs[i] = frame.loc[:, keys + [f"_{i}_value"]].drop_duplicates()
+    res = None
+    if partial:
+        res = frame.groupby(keys).agg(**{k: pandas.NamedAgg(column=v[0], aggfunc=v[1])
+                                         for k, v in partial.items()})
+    return res, pairs
+
+
+def _load_partition(path, empty):
+    frames = list(BIGDatasetFactory._read_run(path))
+    return pandas.concat(frames) if frames else empty
+
+
+def _join_partition(left_path, right_path, out_path, left_empty, right_empty, left_on, right_on, how, suffixes,
+                    order, block_size):
+    # run in the processes of HashJoin.join: join of a partition, sorted and written as a run
+    left, right = _load_partition(left_path, left_empty), _load_partition(right_path, right_empty)
+    result = left.merge(right, left_on=left_on, right_on=right_on, how=how, indicator=True, suffixes=suffixes)
+    result = result.sort_values(order, na_position="last", kind="mergesort")
+    with open(out_path, "wb") as file:
+        BIGDatasetFactory._write_run(result, file, block_size)
+    return out_path
+
+
+class HashJoin:
+    """
+    Partitioned hash join of DatasetFactory.cmerge for the datasets bigger than the memory:
+    the rows of both sides are written in partitions by the hash of their keys, the partitions are joined
+    one by one (in processes), then the results are merged in the order of the rows (left rows, or right
+    rows for how=right). Only a partition is in memory by process.
+    """
+    DEFAULT_PARTITIONS = 16
+    LEFT_ROW, RIGHT_ROW = "_kb_left_row", "_kb_right_row"
+    # the text of the keys, the right keys with the name of a left key
+    KEY, RIGHT_KEY = "_kb_key_", "_kb_right_key_"
+
+    def __init__(self, left_on, right_on, how="left", suffixes=None, partitions=None, processes=None):
+        """
+        Args:
+            left_on: list of the key columns of the left dataset
+            right_on: list of the key columns of the right dataset
+            how: left, right, inner, outer
+            suffixes: suffixes of the columns in both datasets, default ("", "_y")
+            partitions: int, nb of partitions, default DEFAULT_PARTITIONS
+            processes: int, nb of processes joining the partitions, default the partitions are joined one by one
+        """
+        self.left_on, self.right_on = list(left_on), list(right_on)
+        self.how = how
+        self.suffixes = suffixes or ("", "_y")
+        self.partitions = max(int(partitions or self.DEFAULT_PARTITIONS), 1)
+        self.processes = processes
+
+    @staticmethod
+    def _chunks(data):
+        if isinstance(data, BIGDatasetFactory):
+            return (source.dataset for source in data.iter_chunks())
+        if isinstance(data, DatasetFactory):
+            return iter([data.dataset])
+        if isinstance(data, pandas.DataFrame):
+            return iter([data])
+        return (source.dataset if isinstance(source, DatasetFactory) else source for source in data)
+
+    def _partition(self, chunks, keys, row_col, rename=None):
+        """
+        Write the rows in the partitions files, with the text of their keys (columns KEY + j, see
+        BIGDatasetFactory._key_values): the keys are equal whatever the dtypes of the chunks and of the sides
+        Returns: (paths of the partitions, empty frame of the columns)
+        """
+        paths = [BIGDatasetFactory._temp_file(".part") for _ in range(self.partitions)]
+        files = [open(path, "wb") for path in paths]
+        empty, nb_rows = None, 0
+        try:
+            for frame in chunks:
+                frame = frame.assign(**{row_col: numpy.arange(nb_rows, nb_rows + len(frame))},
+                                     **{self.KEY + str(j): BIGDatasetFactory._key_values(frame[key])
+                                        for j, key in enumerate(keys)})
+                nb_rows += len(frame)
+                if rename:
+                    frame = frame.rename(columns=rename)
+                if empty is None:
+                    empty = frame.iloc[:0]
+                partition = BIGDatasetFactory._hash_rows(
+                    frame.loc[:, [self.KEY + str(j) for j in range(len(keys))]]) % self.partitions
+                for i, part in frame.groupby(partition, sort=False):
+                    BIGDatasetFactory._write_run(part, files[i], max(len(part), 1))
+        finally:
+            for file in files:
+                file.close()
+        return paths, empty
+
+    def join(self, left, right, op=None, columns=None):
+        """
+        Args:
+            left: DatasetFactory|BIGDatasetFactory|DataFrame or iterable of DataFrame
+            right: DatasetFactory|BIGDatasetFactory|DataFrame or iterable of DataFrame
+            op: str, the rows to keep by _merge value (left_only, right_only, both)
+            columns: list, the columns of the result
+
+        Returns: BIGDatasetFactory of the result (DatasetFactory when the result can be load in memory)
+
+        """
+        left_chunks, right_chunks = self._chunks(left), self._chunks(right)
+        left_first, right_first = next(left_chunks, None), next(right_chunks, None)
+        if left_first is None or right_first is None:
+            raise ValueError("HashJoin of a dataset without columns")
+        # joined on the text of the keys (as merge, a key of both sides is a column of the result)
+        keys = [self.KEY + str(j) for j in range(len(self.left_on))]
+        same_keys = {o_ref: self.RIGHT_KEY + str(j)
+                     for j, (s_ref, o_ref) in enumerate(zip(self.left_on, self.right_on)) if s_ref == o_ref}
+        order = [self.RIGHT_ROW, self.LEFT_ROW] if self.how == "right" else [self.LEFT_ROW, self.RIGHT_ROW]
+        block_size = 100_000
+        paths = []
+        try:
+            left_paths, left_empty = self._partition(itertools.chain([left_first], left_chunks), self.left_on,
+                                                     self.LEFT_ROW)
+            paths += left_paths
+            right_paths, right_empty = self._partition(itertools.chain([right_first], right_chunks),
+                                                       self.right_on, self.RIGHT_ROW, rename=same_keys)
+            paths += right_paths
+            runs = [BIGDatasetFactory._temp_file(".run") for _ in range(self.partitions)]
+            paths += runs
+            args = [(left_paths[i], right_paths[i], runs[i], left_empty, right_empty, keys, keys,
+                     self.how, self.suffixes, order, block_size) for i in range(self.partitions)]
+            if self.processes and self.processes > 1:
+                with tools.thread.ProcessPoolExecutor(max_workers=self.processes) as executor:
+                    list(executor.map(_join_partition, *zip(*args)))
+            else:
+                for arg in args:
+                    _join_partition(*arg)
+
+            def select(block):
+                for key, right_key in same_keys.items():
+                    # the key of the rows only in right
+                    block[key] = block[key].where(block["_merge"] != "right_only", block[right_key])
+                block = block.loc[block["_merge"] == op] if isinstance(op, str) else block
+                hidden = {self.LEFT_ROW, self.RIGHT_ROW, *keys, *same_keys.values()}
+                return block.loc[:, [c for c in (block.columns if columns is None else columns) if c not in hidden]]
+
+            def chunks():
+                empty = True
+                for block in BIGDatasetFactory._merge_runs(runs, order, [True, True]):
+                    empty = False
+                    yield select(block)
+                if empty:
+                    # no row: the columns of the result
+                    yield select(left_empty.merge(right_empty, on=keys, how=self.how, indicator=True,
+                                                  suffixes=self.suffixes))
+
+            return BIGDatasetFactory._from_chunks(chunks(), index=False)
+        finally:
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
 class BIGDatasetFactory:
     TOTAL_VIRTUAL_MEMORY = psutil.virtual_memory().total
     LAST_ELAPSED_EXECUTION_TIME = None
     MEMORY_THRESHOLD = 0.3
 
     DEFAULT_PART = 50
+    # folder of the results and the temporary files, default the system temp folder
+    TEMP_FOLDER = None
+    # parser of the chunks: "c" (pandas) or "pyarrow" (when installed)
+    CSV_ENGINE = "c"
+    # a byte offset every INDEX_STEP rows in the row index (see RowIndex)
+    INDEX_STEP = 1000
+    # nb max of sorted runs merged together by sort_values
+    MERGE_FAN_IN = 16
+    # the aggregations group can compute by chunk: partial function(s) -> combine
+    PARTIAL_AGGREGATIONS = ("sum", "count", "size", "min", "max", "avg", "mean", "first", "last",
+                            "std", "var", "nunique", "count_distinct")
 
     @staticmethod
     def is_big_data(path):
@@ -43,6 +411,7 @@ class BIGDatasetFactory:
         self.__path = path
         encoding = encoding or "cp1252"
         self.__nb_rows = 0
+        self.__index_col = kwargs.pop("index_col", None)
         delimiters = kwargs.pop("delimiters", [',', '\t', ';', ' ', ':'])
         used_sniffer = False
         try:
@@ -77,19 +446,21 @@ class BIGDatasetFactory:
                 raise exc
         self.extra_info = tools.Cdict(file_size=os.stat(path).st_size, seek=0, first_row_seek=0)
         self.columns = None
-        with open(path, encoding="cp1252") as file:
+        with open(path, "rb") as file:
             if header:
-                self.__origin_columns = next(csv.reader(io.StringIO(file.readline()), delimiter=sep or ","))
+                self.__origin_columns = next(csv.reader(io.StringIO(file.readline().decode(encoding, "replace")),
+                                                        delimiter=sep or ","))
                 self.extra_info.first_row_seek = file.tell()
             else:
                 self.__origin_columns = columns
-            if self.__origin_columns is not None:
-                self.columns = DatasetFactory._parse_columns_arg(columns, self.__origin_columns) or \
-                               self.__origin_columns
-            self.__nb_rows = sum(1 for _ in file)
-            # for _ in file:
-            #     self.__nb_rows += 1
-            self.extra_info["end_file"] = file.tell()
+        if self.__origin_columns is not None:
+            origin_columns = [col for i, col in enumerate(self.__origin_columns) if i != self.__index_col]
+            self.columns = DatasetFactory._parse_columns_arg(columns, origin_columns) or origin_columns
+        # the nb of rows and their offsets, read from the sidecar index when the file didn't change
+        self.row_index = RowIndex(path, self.extra_info.first_row_seek, step=self.INDEX_STEP, sep=sep or ",")
+        self.__nb_rows = self.row_index.nb_rows
+        self.__byte_ranges = None
+        self.extra_info["end_file"] = self.extra_info.file_size
         if not max_nb_line:
             self.__max_rows_threshold = (
                     BIGDatasetFactory.MEMORY_THRESHOLD * self.__nb_rows /
@@ -104,23 +475,93 @@ class BIGDatasetFactory:
         self.__encoding = encoding or "cp1252"
         self.__force_encoding = force_encoding
 
-        self.extra_info.seek, self.__source_temp = self.__get_dataset()
+        self.__source_temp = self.__get_dataset()
         if self.columns is None:
             self.columns = self.__source_temp.columns
+
     @property
     def size(self):
         return self.__nb_rows
 
-    def __get_dataset(self, seek=None, last_rows=0):
-        with open(self.__path, encoding=self.__encoding) as file:
-            file.seek(seek or self.extra_info.first_row_seek)
-            data = io.StringIO("".join([file.readline().replace('\0', '') for _ in range(self.__max_rows_threshold)]))
+    def __len__(self):
+        return self.__nb_rows
 
-            seek = file.tell()
-            data = [row for row in csv.reader(data, delimiter=self.__sep)]
-        data = DatasetFactory(pandas.DataFrame(data, columns=self.__origin_columns), columns=self.columns)
-        data.index = data.index + last_rows
-        return seek, data
+    @property
+    def nb_chunks(self):
+        return -(-self.__nb_rows // self.__max_rows_threshold)
+
+    @property
+    def _read_kwargs(self):
+        return {"sep": self.__sep, "names": self.__origin_columns, "index_col": self.__index_col,
+                "encoding": self.__encoding, "columns": self.columns, "engine": self.CSV_ENGINE}
+
+    @staticmethod
+    def _parse_chunk(data: bytes, read_kwargs, last_rows=0):
+        """
+        Parse the bytes of complete rows: the bytes are given to the C parser of pandas
+        (or the csv reader of pyarrow with CSV_ENGINE = "pyarrow"), typed columns like DatasetFactory.from_file:
+        the queries compare numbers, dates, ...
+        Returns: DatasetFactory, the index is the row number when there is no index_col
+        """
+        names, index_col = read_kwargs["names"], read_kwargs["index_col"]
+        data_bytes = data
+        if data_bytes.find(b"\0") >= 0:
+            # the C parser ends a value at a null character
+            data_bytes = data_bytes.replace(b"\0", b"")
+        data = None
+        if read_kwargs.get("engine") == "pyarrow" and data_bytes:
+            data = BIGDatasetFactory._parse_chunk_pyarrow(data_bytes, read_kwargs)
+        if data is None:
+            try:
+                data = pandas.read_csv(io.BytesIO(data_bytes), sep=read_kwargs["sep"], header=None, names=names,
+                                       index_col=index_col, encoding=read_kwargs["encoding"])
+            except pandas.errors.EmptyDataError:
+                data = pandas.DataFrame(columns=names)
+                if index_col is not None:
+                    data = data.set_index(data.columns[index_col])
+        if index_col is None:
+            data.index = data.index + last_rows
+        return DatasetFactory(data, columns=read_kwargs["columns"])
+
+    @staticmethod
+    def _parse_chunk_pyarrow(data: bytes, read_kwargs):
+        try:
+            import pyarrow
+            import pyarrow.csv
+        except ImportError:
+            return None
+        names, index_col = read_kwargs["names"], read_kwargs["index_col"]
+        table = pyarrow.csv.read_csv(
+            pyarrow.BufferReader(data),
+            read_options=pyarrow.csv.ReadOptions(column_names=names, encoding=read_kwargs["encoding"]),
+            parse_options=pyarrow.csv.ParseOptions(delimiter=read_kwargs["sep"], newlines_in_values=True))
+        data = table.to_pandas()
+        if index_col is not None:
+            data = data.set_index(names[index_col])
+        return data
+
+    def _read_bytes(self, start_row=0, nb_rows=None, start=None):
+        """
+        Bytes of nb_rows rows from start_row (from the byte start when given), sliced in a mmap of the file
+        """
+        nb_rows = self.__max_rows_threshold if nb_rows is None else nb_rows
+        if self.extra_info.file_size == 0 or nb_rows <= 0:
+            return b""
+        with open(self.__path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if start is None:
+                start = self.row_index.offset(start_row, buffer)
+                end = self.row_index.offset(start_row + nb_rows, buffer)
+            else:
+                end = start
+                for _ in range(nb_rows):
+                    end = buffer.find(b"\n", end) + 1
+                    if not end:
+                        end = len(buffer)
+                        break
+            return buffer[start: end]
+
+    def __get_dataset(self, start_row=0, nb_rows=None):
+        return self._parse_chunk(self._read_bytes(start_row, nb_rows), self._read_kwargs, start_row)
 
     def __repr__(self):
         res = self.__source_temp.__repr__()
@@ -132,63 +573,603 @@ class BIGDatasetFactory:
         return self.__repr__()
 
     def get_temp(self):
-        t = self.extra_info.first_row_seek
-        self.extra_info.first_row_seek = 0
-        res = self.__get_dataset(seek=0)
-        self.extra_info.first_row_seek = t
-        return res[1]
+        return self._parse_chunk(self._read_bytes(start=0), self._read_kwargs)
 
     def __loop(self):
-        seek = self.extra_info.first_row_seek or 0
-        last_rows = 0
-        while seek < self.extra_info.end_file:
-            seek, source = self.__get_dataset(seek=seek, last_rows=last_rows)
-            last_rows += len(source)
-            print("last_rows:", last_rows, "| max:", self.__nb_rows, "seek:", seek, "| max:", self.extra_info.end_file)
-            yield source
-
-    def query(self, query, params=None, *, method="parse", reset=False, **kwargs):
+        for index in range(self.nb_chunks):
+            yield self.get_chunk(index)
+
+    def byte_ranges(self, range_size=None):
+        """
+        Split the rows in byte ranges, aligned on the ends of rows: the new lines in a quoted field
+        are skipped (see _row_starts, like the row index).
+        Args:
+            range_size: int, nb of bytes of a range, default the bytes of max_nb_line rows
+
+        Returns: list of (start, end, first row number)
+
+        """
+        start, size = self.extra_info.first_row_seek, self.extra_info.file_size
+        if range_size is None:
+            range_size = (size - start) * self.__max_rows_threshold / max(self.__nb_rows, 1)
+        range_size = max(int(range_size), 1)
+        if self.__byte_ranges is not None and self.__byte_ranges[0] == range_size:
+            return self.__byte_ranges[1]
+        # the start of the ranges and the nb of rows before them
+        boundaries, first_rows = [start], [0]
+        next_target = start + range_size
+        nb_rows = 0
+        with open(self.__path, "rb") as file:
+            file.seek(start)
+            for row_starts, _ in _iter_row_starts(file, self.__sep, RowIndex.BLOCK_SIZE):
+                if next_target >= size:
+                    break
+                k = numpy.searchsorted(row_starts, next_target)
+                while k < len(row_starts) and row_starts[k] < size:
+                    boundaries.append(int(row_starts[k]))
+                    first_rows.append(nb_rows + int(k) + 1)
+                    next_target = boundaries[-1] + range_size
+                    k = numpy.searchsorted(row_starts, next_target)
+                nb_rows += len(row_starts)
+        ranges = list(zip(boundaries, boundaries[1:] + [size], first_rows))
+        self.__byte_ranges = (range_size, ranges)
+        return ranges
+
+    def map_chunks(self, func, *args, processes=None, range_size=None, **kwargs):
+        """
+        Run func(chunk, *args, **kwargs) on the chunks in a pool of processes: each process reads and parses
+        its byte range (see byte_ranges). The results are yielded in the order of the file.
+        At most `processes` ranges are in progress: the memory used is about processes * the memory of a chunk
+        (MEMORY_THRESHOLD / DEFAULT_PART of the memory by default).
+        Args:
+            func: picklable callable (a module function, DatasetFactory.query, ...)
+            processes: int, nb of processes, default the nb of cpu
+            range_size: int, nb of bytes of the ranges
+
+        """
+        processes = processes or os.cpu_count() or 1
+        read_kwargs = self._read_kwargs
+        with tools.thread.ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = collections.deque()
+            for start, end, first_row in self.byte_ranges(range_size):
+                futures.append(executor.submit(_run_byte_range, self.__path, start, end, first_row, read_kwargs,
+                                               func, args, kwargs))
+                if len(futures) >= processes:
+                    yield futures.popleft().result()
+            while futures:
+                yield futures.popleft().result()
+
+    def get_rows(self, start=0, stop=None):
+        """
+        Read the rows start to stop (excluded): seek with the row index, no read of the previous rows
+        Returns: DatasetFactory
+        """
+        stop = self.__nb_rows if stop is None else min(stop, self.__nb_rows)
+        start = max(start, 0)
+        return self.__get_dataset(start, max(stop - start, 0))
+
+    def get_chunk(self, index):
+        """
+        The chunk number index (rows index * max_nb_line to (index + 1) * max_nb_line)
+        """
+        return self.get_rows(index * self.__max_rows_threshold, (index + 1) * self.__max_rows_threshold)
+
+    def iter_chunks(self, workers=1, processes=None):
+        """
+        Iterate over the dataset chunk by chunk (DatasetFactory of at most max_nb_line rows)
+        Args:
+            workers: int, nb of chunks read in parallel (threads, seek with the row index), in order
+            processes: int, parse the chunks in a pool of processes (see map_chunks)
+
+        """
+        if processes:
+            return self.map_chunks(_identity, processes=processes)
+        if not workers or workers <= 1:
+            return self.__loop()
+        return self.__parallel_loop(workers)
+
+    def _chunks(self, processes=None):
+        return self.map_chunks(_identity, processes=processes) if processes else self.__loop()
+
+    def __parallel_loop(self, workers):
+        with tools.thread.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = collections.deque()
+            for index in range(self.nb_chunks):
+                futures.append(executor.submit(self.get_chunk, index))
+                if len(futures) >= 2 * workers:
+                    yield futures.popleft().result()
+            while futures:
+                yield futures.popleft().result()
+
+    @classmethod
+    def _temp_file(cls, ext=".csv"):
+        # the file is created: the next calls get other names
+        path = tools.get_no_filepath(os.path.join(cls.TEMP_FOLDER or tempfile.gettempdir(),
+                                                  "_big_datafactory_temp" + ext))
+        open(path, "wb").close()
+        return path
+
+    @staticmethod
+    def _remove_files(*paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @classmethod
+    def _from_chunks(cls, chunks, index=True):
+        """
+        Write the chunks results (DataFrame) in a temporary csv file. The file is removed when the result
+        is loaded in memory, else with the BIGDatasetFactory of the result
+        Returns: BIGDatasetFactory of the file (DatasetFactory when the result can be load in memory)
+        """
+        temp_filename = None
+        try:
+            for res in chunks:
+                if isinstance(res, DatasetFactory):
+                    res = res.dataset
+                first = temp_filename is None
+                if first:
+                    temp_filename = cls._temp_file()
+                res.to_csv(temp_filename, index=index, mode="w" if first else "a", header=first)
+            if temp_filename is None:
+                # no chunk
+                return DatasetFactory()
+            result = BIGDatasetFactory(temp_filename, sep=",", encoding="utf-8", index_col=0 if index else None)
+        except BaseException as ex:
+            if temp_filename is not None:
+                cls._remove_files(temp_filename, temp_filename + RowIndex.EXT)
+            raise ex
+        if isinstance(result, BIGDatasetFactory):
+            weakref.finalize(result, cls._remove_files, temp_filename, temp_filename + RowIndex.EXT)
+        else:
+            cls._remove_files(temp_filename)
+        return result
+
+    def _parse_col(self, col):
+        return self._parse_col_name_to_index(col)[1]
+
+    def query(self, query, params=None, *, method="parse", reset=False, processes=None, **kwargs):
+        """
+        DatasetFactory.query chunk by chunk
+        Args:
+            processes: int, parse and filter the chunks in a pool of processes (see map_chunks)
+
+        Returns: BIGDatasetFactory of the result (DatasetFactory when the result can be load in memory)
+        """
         start_time = time.time()
-        temp_filename = tools.get_no_filepath("_big_datafactory_temp")
-        first = True
-        for source in self.__loop():
-            res = source.query(query, params=params, method=method, **kwargs)
-            res.to_csv(temp_filename, index=not reset, mode="w" if first else "a", header=first)
-            first = False
+        if processes:
+            chunks = self.map_chunks(DatasetFactory.query, query, params=params, method=method, processes=processes,
+                                     **kwargs)
+        else:
+            chunks = (source.query(query, params=params, method=method, **kwargs) for source in self.__loop())
+        res = self._from_chunks(chunks, index=not reset)
         self.LAST_ELAPSED_EXECUTION_TIME = time.time() - start_time
-        return BIGDatasetFactory(temp_filename, index_col=None if reset else 0)
+        return res
 
-    def apply(self, func, *args, **kwargs):
+    def apply(self, func, axis=1, raw=False, result_type=None, *, params=(), args=(), name=None, **kwargs):
+        """
+        Row-wise DatasetFactory.apply chunk by chunk
+        Args:
+            func: callable or str expression (see DatasetFactory.apply)
+            axis: 1, the out-of-core apply is row-wise
+            name: str, the name of the result column, default "result"
 
-        pass
+        Returns: pandas.Series (BIGDatasetFactory of the result column for a big result)
 
-    def doublon(self):
-        pass
+        """
+        if not isinstance(func, str) and axis not in (1, "columns"):
+            raise ValueError("BIGDatasetFactory.apply is row-wise: axis must be 1")
+        start_time = time.time()
 
-    def group(self):
-        pass
+        def chunks():
+            for source in self.__loop():
+                res = source.apply(func, axis=axis, raw=raw, result_type=result_type, params=params, args=args,
+                                   **kwargs)
+                if isinstance(res, pandas.Series):
+                    res = res.to_frame(name or "result")
+                yield res
 
-    def cmerge(self):
-        pass
+        res = self._from_chunks(chunks(), index=True)
+        self.LAST_ELAPSED_EXECUTION_TIME = time.time() - start_time
+        if isinstance(res, DatasetFactory) and res.shape[1] == 1:
+            res = res.dataset.iloc[:, 0]
+            res.index.name = None
+        return res
 
-    def exclude(self):
-        pass
+    @staticmethod
+    def _key_values(serie):
+        """
+        Text of the values of a key column, the same in all the chunks whatever the dtype pandas inferred for
+        the chunk: 1 (int64), 1.0 (float64, with null values) and "1" (object, with text values) give "1".
+        Returns: pandas.Series of str, None for the null values
+        """
+        if is_bool_dtype(serie) or is_integer_dtype(serie):
+            return serie.astype(str)
+        number = (serie if is_numeric_dtype(serie) else pandas.to_numeric(serie, errors="coerce")).astype("float64")
+        text = serie.astype(str).where(number.isna(), number.astype(str))
+        integral = (number % 1 == 0) & (number.abs() < 2 ** 53)
+        if integral.any():
+            text[integral] = number[integral].astype("int64").astype(str)
+        return text.where(serie.notna(), None)
 
-    def intersect(self):
-        pass
+    @staticmethod
+    def _hash_rows(frame):
+        # the same value got the same hash in all the chunks (see _key_values)
+        frame = pandas.DataFrame({col: BIGDatasetFactory._key_values(frame[col]) for col in frame.columns})
+        return pandas.util.hash_pandas_object(frame, index=False).to_numpy()
+
+    def doublon(self, drop_on=None, keep="first"):
+        """
+        Drop the duplicated rows (like DatasetFactory.doublon). The file is not modified: the result is returned.
+        A first pass computes the 64 bits hashes of the rows; the keys (text, see _key_values) of the rows
+        whose hash is not unique are compared in a second pass: two different rows with the same hash are kept.
+        Returns: BIGDatasetFactory of the result (DatasetFactory when the result can be load in memory)
+        """
+        if drop_on is None:
+            drop_on = list(self.columns)
+        else:
+            drop_on = [self._parse_col(k) for k in ([drop_on] if isinstance(drop_on, str) else drop_on)]
+        if keep not in ("first", "last", False):
+            raise ValueError("Bad value of keep given: %s" % keep)
+        hashes = numpy.concatenate([self._hash_rows(source.dataset.loc[:, drop_on]) for source in self.__loop()]
+                                   or [numpy.empty(0, dtype="uint64")])
+        unique, counts = numpy.unique(hashes, return_counts=True)
+        candidates = unique[counts > 1]
+        mask = numpy.ones(len(hashes), dtype=bool)
+        if len(candidates):
+            # the rows of the not unique hashes: an id by distinct key
+            ids, positions, groups, start = {}, [], [], 0
+            for source in self.__loop():
+                frame = source.dataset
+                rows = numpy.flatnonzero(numpy.isin(hashes[start: start + len(frame)], candidates))
+                if len(rows):
+                    keys = frame.iloc[rows].loc[:, drop_on]
+                    texts = zip(hashes[start + rows].tolist(), *(self._key_values(keys.iloc[:, j]).tolist()
+                                                                 for j in range(keys.shape[1])))
+                    groups.extend(ids.setdefault(text, len(ids)) for text in texts)
+                    positions.append(rows + start)
+                start += len(frame)
+            positions, groups = numpy.concatenate(positions), numpy.asarray(groups, dtype=numpy.int64)
+            mask[positions] = False
+            if keep == "first":
+                mask[positions[numpy.unique(groups, return_index=True)[1]]] = True
+            elif keep == "last":
+                mask[positions[len(groups) - 1 - numpy.unique(groups[::-1], return_index=True)[1]]] = True
+            else:
+                group_ids, index, group_counts = numpy.unique(groups, return_index=True, return_counts=True)
+                mask[positions[index[group_counts == 1]]] = True
+
+        def chunks():
+            start = 0
+            for source in self.__loop():
+                frame = source.dataset
+                yield frame[mask[start: start + len(frame)]]
+                start += len(frame)
+
+        return self._from_chunks(chunks(), index=False)
+
+    def group(self, group_by, aggregating_func=None, processes=None):
+        """
+        DatasetFactory.group out-of-core: each chunk is aggregated (partial aggregation),
+        the partial results are combined after each chunk. Memory is bounded by the nb of groups.
+        Args:
+            group_by: str|list, the columns
+            aggregating_func: list like [{func: avg, on: field, alias: ...}], func in PARTIAL_AGGREGATIONS
+            processes: int, the partial aggregations are computed in a pool of processes (see map_chunks)
+
+        Returns: pandas.DataFrame
+
+        """
+        if isinstance(group_by, str):
+            group_by = [d.strip() for d in group_by.split(",") if d.strip()]
+        group_by = [self._parse_col(d) for d in group_by]
+        aggregations = []
+        for d in aggregating_func or []:
+            func = d["func"] if isinstance(d["func"], str) else d["func"].__name__
+            if func.lower() not in self.PARTIAL_AGGREGATIONS:
+                raise ValueError("Aggregation %s not supported by BIGDatasetFactory.group, use one of: %s" % (
+                    func, self.PARTIAL_AGGREGATIONS))
+            alias = d.get("alias") or (func + f"({d['on']})")
+            if alias in group_by:
+                raise ValueError("Bad alias given: %s, it's a column of group_by" % (alias,))
+            aggregations.append((alias, func.lower(), self._parse_col(d["on"])))
+        if not aggregations:
+            aggregations.append(("COUNT", "size", group_by[0]))
+
+        # partial column -> (column, partial func, combine func)
+        # the first value of the keys of each group (the groups are the text of the keys)
+        partial = {f"_key_{j}": (col, "first", "first") for j, col in enumerate(group_by)}
+        distinct = {}
+        for i, (alias, func, on) in enumerate(aggregations):
+            if func in ("count", "size"):
+                partial[f"_{i}_size"] = (on, "size", "sum")
+            elif func in ("avg", "mean", "std", "var"):
+                partial[f"_{i}_sum"] = (on, "sum", "sum")
+                partial[f"_{i}_count"] = (on, "count", "sum")
+                if func in ("std", "var"):
+                    partial[f"_{i}_sq"] = (f"_{i}_square", "sum", "sum")
+            elif func in ("nunique", "count_distinct"):
+                distinct[i] = None
+            else:
+                partial[f"_{i}_{func}"] = (on, func, func)
+
+        result = None
+        if processes:
+            chunks = self.map_chunks(_partial_group, group_by, aggregations, partial, list(distinct),
+                                     processes=processes)
+        else:
+            chunks = (_partial_group(source, group_by, aggregations, partial, list(distinct))
+                      for source in self.__loop())
+        for res, pairs in chunks:
+            for i in distinct:
+                distinct[i] = pairs[i] if distinct[i] is None else pandas.concat(
+                    [distinct[i], pairs[i]]).drop_duplicates()
+            if partial:
+                res = res if result is None else pandas.concat([result, res])
+                result = res.groupby(level=list(range(len(group_by)))).agg({k: v[2] for k, v in partial.items()})
+
+        if result is None and partial:
+            # no rows
+            return pandas.DataFrame(columns=group_by + [alias for alias, _, _ in aggregations])
+        final_d = {}
+        for i, (alias, func, on) in enumerate(aggregations):
+            if i in distinct:
+                if distinct[i] is None:
+                    values = pandas.Series(dtype="int64")
+                else:
+                    # count_distinct counts the null value (like DatasetFactory), nunique doesn't
+                    values = distinct[i].groupby(list(distinct[i].columns[:-1]))[f"_{i}_value"].nunique(
+                        dropna=func != "count_distinct")
+            elif func in ("count", "size"):
+                values = result[f"_{i}_size"]
+            elif func in ("avg", "mean"):
+                values = result[f"_{i}_sum"] / result[f"_{i}_count"]
+            elif func in ("std", "var"):
+                n = result[f"_{i}_count"]
+                values = (result[f"_{i}_sq"] - result[f"_{i}_sum"] ** 2 / n) / (n - 1)
+                if func == "std":
+                    values = values ** 0.5
+            else:
+                values = result[f"_{i}_{func}"]
+            final_d[alias] = values
+        data = pandas.DataFrame(final_d, index=result.index)
+        for j, col in enumerate(group_by):
+            data.insert(j, col, result[f"_key_{j}"])
+        try:
+            data = data.sort_values(group_by, kind="mergesort")
+        except TypeError:
+            # keys of different types: in the order of the text of the keys
+            pass
+        return data.reset_index(drop=True)
+
+    def sql(self, query=None, *, select=None, group_by=None, where=None):
+        """
+        DatasetFactory.sql out-of-core
+        query: str like @select col1, col2 @where [condition] @group_by col1, col2
+        """
+        select, group_by, where = DatasetFactory._parse_sql(query, select=select, group_by=group_by, where=where)
+        temp = self
+        if where:
+            temp = self.query(where)
+        if not isinstance(temp, BIGDatasetFactory):
+            # the result of the where is in memory
+            return temp.sql(select=select, group_by=group_by)
+        final_select = DatasetFactory._parse_select(select, temp.columns) if select else []
+        if group_by:
+            data = temp.group(group_by, [d for d in final_select if isinstance(d, dict) and d.get("func")])
+            for d in final_select:
+                if "func" not in d:
+                    data = DatasetFactory._gen_columns_by_string(data, d["on"], d.get("alias"))
+            return DatasetFactory(data)
+
+        def chunks():
+            for source in temp.iter_chunks():
+                data = source.dataset
+                for d in final_select:
+                    if "func" not in d:
+                        data = DatasetFactory._gen_columns_by_string(data, d["on"], d.get("alias"))
+                yield data
+
+        return self._from_chunks(chunks(), index=False)
+
+    def sampling(self, d, by=None, seed=None):
+        """
+        DatasetFactory.sampling out-of-core: reservoir sampling of the chunks (one pass, only the sample is
+        in memory)
+        Args:
+            d: int, nb of rows of the sample, or float|str like 0.1 or "10%", fraction of the rows
+            by: str|list, columns of the strata: stratified sample, each stratum has its share of the rows
+            seed: int, random seed
+
+        Returns: DatasetFactory, the rows of the sample in the order of the file
+        """
+        n = DatasetFactory._sample_size(d, len(self))
+        if isinstance(by, str):
+            by = [d.strip() for d in by.split(",") if d.strip()]
+        by = [self._parse_col(d) for d in by or []]
+        return DatasetFactory(DatasetFactory._reservoir((source.dataset for source in self.__loop()), n, by, seed))
+
+    def cmerge(self,
+               other: typing.Union[list, pandas.Series, pandas.DataFrame, str],
+               exclusion_logic: typing.Union[dict, list, tuple, str],
+               op=None, columns=None, suffixes=None, how="left", partitions=None, processes=None):
+        """
+        DatasetFactory.cmerge chunk by chunk, other is kept in memory.
+        For how=right|outer, the rows of other without match are added at the end.
+        With partitions, or when other is a BIGDatasetFactory, the partitioned hash join is used (see HashJoin)
+        Returns: BIGDatasetFactory of the result (DatasetFactory when the result can be load in memory)
+        """
+        if partitions or isinstance(other, BIGDatasetFactory):
+            return DatasetFactory._hash_join(self, other, exclusion_logic, op=op, columns=columns, suffixes=suffixes,
+                                             how=how, partitions=partitions, processes=processes)
+        other, source_ref, other_ref = DatasetFactory._format_other(other, exclusion_logic)
+        other = other.dataset
+        row_col = tools._get_new_kb_text(" ".join(map(str, list(other.columns) + list(self.columns))))
+        other[row_col] = numpy.arange(len(other))
+        matched = numpy.zeros(len(other), dtype=bool)
+        chunk_how = {"right": "inner", "outer": "left"}.get(how, how)
+
+        def select(result):
+            result = result.loc[result._merge == op] if isinstance(op, str) else result
+            return result.loc[:, [c for c in (result.columns if columns is None else columns) if c != row_col]]
+
+        def chunks():
+            empty = None
+            for source in self.__loop():
+                result = source.cmerge(other, exclusion_logic, suffixes=suffixes, how=chunk_how)
+                matched[result[row_col].dropna().astype(int).to_numpy()] = True
+                empty = source.dataset.iloc[:0]
+                yield select(result)
+            if how in ("right", "outer") and empty is not None and not matched.all():
+                yield select(DatasetFactory(empty).cmerge(other[~matched], exclusion_logic, suffixes=suffixes,
+                                                          how="right"))
+
+        return self._from_chunks(chunks(), index=False)
+
+    def exclude(self,
+                other: typing.Union[list, pandas.Series, pandas.DataFrame, str],
+                exclusion_logic: typing.Union[dict, list, tuple, str],
+                partitions=None, processes=None):
+        return self.cmerge(other, exclusion_logic, op="left_only", columns=list(self.columns),
+                           partitions=partitions, processes=processes)
+
+    def intersect(self,
+                  other: typing.Union[list, pandas.Series, pandas.DataFrame, str],
+                  exclusion_logic: typing.Union[dict, list, tuple, str],
+                  partitions=None, processes=None):
+        return self.cmerge(other, exclusion_logic, op="both", columns=list(self.columns),
+                           partitions=partitions, processes=processes)
 
     # __add__, __radd__
     # __setitem__, __setattr__,
     # __delitem__, __delattr__
 
-    def save(self):
-        pass
+    def save(self, path, force=False, **kwargs):
+        """
+        Write the dataset chunk by chunk (csv) in path. The file of the dataset can't be overwritten
+        Args:
+            path: str, the file (csv, txt, excel)
+            force: bool, write in a new file (path_1, path_2, ...) when path exists
+            kwargs: arguments of DataFrame.to_csv / to_excel
 
-    def sql(self):
-        pass
+        Returns: str, the path of the file written
+        """
+        if not path:
+            raise ValueError("The path of the file to write is required")
+        if "index" not in kwargs:
+            kwargs["index"] = False
+        _base, ext = os.path.splitext(path)
+        if force:
+            i = 1
+            while os.path.exists(path):
+                path = _base + "_" + str(i) + ext
+                i += 1
+        if os.path.exists(path) and os.path.samefile(path, self.__path):
+            raise ValueError("Can't overwrite the file of the dataset: %s" % path)
+        if ext.lower() in [".xls", ".xlsx", ".xlsb"]:
+            if self.size > 1048575:
+                raise ValueError("Too many rows (%s) for an excel file" % self.size)
+            pandas.concat([source.dataset for source in self.__loop()]).to_excel(path, **kwargs)
+        elif ext.lower() in [".csv", ".txt", ""]:
+            # written aside: an error doesn't leave a truncated file
+            temp_filename = tools.get_no_filepath(path + ".part")
+            try:
+                first = True
+                for source in self.__loop():
+                    source.dataset.to_csv(temp_filename, mode="w" if first else "a", header=first, **kwargs)
+                    first = False
+                os.replace(temp_filename, path)
+            finally:
+                if os.path.exists(temp_filename):
+                    os.remove(temp_filename)
+        # the row index of an old file at path
+        self._remove_files(path + RowIndex.EXT)
+        return path
 
-    def sort_values(self):
-        pass
+    @staticmethod
+    def _write_run(frame, file, block_size):
+        # a sorted run: pickled blocks (the dtypes are kept)
+        for start in range(0, max(len(frame), 1), block_size):
+            pickle.dump(frame.iloc[start: start + block_size], file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _read_run(path):
+        with open(path, "rb") as file:
+            while True:
+                try:
+                    yield pickle.load(file)
+                except EOFError:
+                    return
+
+    @staticmethod
+    def _merge_runs(runs, by, ascending, na_position="last"):
+        """
+        k-way merge of sorted runs by blocks: the rows sorted before the last buffered row of every run
+        are yielded, the other ones wait for the next blocks.
+        """
+        run_col, last_col = "_kb_run", "_kb_last"
+        readers = [BIGDatasetFactory._read_run(path) for path in runs]
+        buffers = [next(reader, None) for reader in readers]
+        while True:
+            frames = []
+            for i, buffer in enumerate(buffers):
+                while buffer is not None and buffer.empty:
+                    buffer = buffers[i] = next(readers[i], None)
+                if buffer is None:
+                    continue
+                buffer = buffer.assign(**{run_col: i, last_col: False})
+                buffer.iloc[-1, -1] = True
+                frames.append(buffer)
+            if not frames:
+                return
+            merged = pandas.concat(frames).sort_values(by + [run_col], ascending=list(ascending) + [True],
+                                                       na_position=na_position, kind="mergesort")
+            cutoff = numpy.flatnonzero(merged[last_col].to_numpy())[0]
+            out, rest = merged.iloc[: cutoff + 1], merged.iloc[cutoff + 1:]
+            for i in range(len(buffers)):
+                if buffers[i] is not None:
+                    # the buffer is empty when all its rows are yielded: the next block is read
+                    buffers[i] = rest.loc[rest[run_col].to_numpy() == i].drop(columns=[run_col, last_col])
+            yield out.drop(columns=[run_col, last_col])
+
+    def sort_values(self, by, ascending=True, na_position="last", ignore_index=False):
+        """
+        External sort: each chunk is sorted and spilled in a temporary run, the runs are merged
+        MERGE_FAN_IN by MERGE_FAN_IN (merged runs spilled again) until the final merge.
+        Returns: BIGDatasetFactory of the result (DatasetFactory when the result can be load in memory)
+        """
+        by = [self._parse_col(d) for d in ([by] if isinstance(by, str) else by)]
+        ascending = [ascending] * len(by) if isinstance(ascending, bool) else list(ascending)
+        block_size = max(self.__max_rows_threshold // self.MERGE_FAN_IN, 1)
+        runs = []
+        try:
+            for source in self.__loop():
+                runs.append(self._temp_file(".run"))
+                with open(runs[-1], "wb") as file:
+                    self._write_run(source.dataset.sort_values(by, ascending=ascending, na_position=na_position,
+                                                               kind="mergesort"), file, block_size)
+            while len(runs) > self.MERGE_FAN_IN:
+                merged_runs = []
+                for i in range(0, len(runs), self.MERGE_FAN_IN):
+                    group = runs[i: i + self.MERGE_FAN_IN]
+                    if len(group) == 1:
+                        merged_runs.extend(group)
+                        continue
+                    merged_runs.append(self._temp_file(".run"))
+                    with open(merged_runs[-1], "wb") as file:
+                        for block in self._merge_runs(group, by, ascending, na_position=na_position):
+                            self._write_run(block, file, block_size)
+                    for path in group:
+                        os.remove(path)
+                runs = merged_runs
+            return self._from_chunks(self._merge_runs(runs, by, ascending, na_position=na_position),
+                                     index=not ignore_index)
+        finally:
+            for path in runs:
+                if os.path.exists(path):
+                    os.remove(path)
 
     def _parse_col_name_to_index(self, item):
         for i, d in enumerate(self.columns):
@@ -210,7 +1191,10 @@ class BIGDatasetFactory:
 
     def __getitem__(self, col):
         if isinstance(col, slice):
-            raise NotImplementedError("Not implemented slicing __getitem__")
+            if col.step not in (None, 1):
+                raise NotImplementedError("Not implemented slicing __getitem__ with step")
+            start, stop, _ = col.indices(self.__nb_rows)
+            return self.get_rows(start, stop)
         elif isinstance(col, tuple):
             raise NotImplementedError("Not implemented __getitem__")
         elif isinstance(col, str):
@@ -7,11 +7,15 @@ Use like pandas.DataFrame extension.
 from __future__ import annotations
 from builtins import Ellipsis
 import ast
+import codecs
+import collections
 
 import os
 import re
 import stat
+import threading
 import time
+import types
 import typing
 import inspect
 import csv
@@ -23,6 +27,9 @@ import pandas
 from pandas.core.dtypes.common import is_numeric_dtype, is_object_dtype
 import kb_package.tools as tools
 import kb_package.utils._query_func as query_func
+import kb_package.utils._query_func_vectorized as query_func_vectorized
+from kb_package.utils.file_cache import FileCache
+from kb_package.utils.sketches import HyperLogLog, TDigest, z_score
 
 from kb_package.logger import CustomLogger
 import keyword
@@ -35,8 +42,74 @@ def count_distinct(s):
     return len(s.unique())
 
 
+def quantile(q):
+    """
+    Returns: agg func, the quantile q of the serie (quantile(col, q) of DatasetFactory.sql)
+    """
+    def _quantile(s):
+        return s.quantile(q)
+
+    _quantile.__name__ = "quantile"
+    _quantile.q = q
+    return _quantile
+
+
+def _get_numexpr():
+    try:
+        import numexpr
+        return numexpr
+    except ImportError:
+        return None
+
+
+def _to_numexpr(expression):
+    """
+    The expression with the columns as variables when numexpr can compute it (no call, no constant text)
+    else None
+    """
+    tree = ast.parse(expression, mode="eval")
+    allowed = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Attribute, ast.Name, ast.Load,
+               ast.Constant, ast.operator, ast.unaryop, ast.cmpop)
+    for node in ast.walk(tree):
+        if not isinstance(node, allowed) or (isinstance(node, ast.Constant) and
+                                             not isinstance(node.value, (int, float))):
+            return None
+        if isinstance(node, ast.Attribute) and not (isinstance(node.value, ast.Name) and
+                                                    node.value.id + "." == QueryTransformer.PREFIX):
+            return None
+    return re.sub(r"\b" + re.escape(QueryTransformer.PREFIX), "", expression)
+
+
 class DatasetFactory:
     LAST_FILE_LOADING_TIME = 0
+    # cost of the encoding and delimiter detection of the last csv loaded by from_file
+    LAST_ENCODING_DETECTION_TIME = 0
+    # Cdict(encoding, sep, bytes_sampled, detection_time, parses) of the last csv loaded by from_file
+    LAST_FILE_LOADING_INFO = None
+    # execution of the query functions: "vectorized" (pandas .str, isin, ...), "numexpr" (vectorized, and the
+    # numeric conditions computed with numexpr when it's installed) or "python" (numpy.vectorize of the
+    # functions of _query_func)
+    QUERY_BACKEND = "vectorized"
+    # nb min of rows of the dataset to compute the numeric conditions with numexpr (QUERY_BACKEND numexpr)
+    NUMEXPR_MIN_ROWS = 100_000
+    # apply of an expression computed with whole columns when it's possible, else row by row
+    APPLY_COLUMN_WISE = True
+    # group: groups sorted by their keys, else in the order of their first row (hash aggregation, faster)
+    GROUP_SORT = True
+    # sql(..., approx=True): nb of rows of the sample, nb min of rows by group, level of the intervals
+    APPROX_SAMPLE_SIZE = 100_000
+    APPROX_MIN_GROUP_ROWS = 30
+    APPROX_CONFIDENCE = 0.95
+    # compiled conditions of query (see _compile_query), the least recently used are removed
+    QUERY_CACHE_SIZE = 256
+    _QUERY_PLANS = collections.OrderedDict()
+    _QUERY_PLANS_LOCK = threading.Lock()
+    # nb of rows of the chunks read by from_file with a where condition
+    READ_CHUNK_SIZE = 100_000
+    # nb of bytes of each sample (head, middle, tail) of the encoding detection
+    ENCODING_SAMPLE_SIZE = 1 << 16
+    # FileCache of from_file(..., cache=True), default a FileCache in a private folder of the user
+    FILE_CACHE = None
 
     is_null = pandas.isnull
     NAN = numpy.nan
@@ -77,15 +150,42 @@ class DatasetFactory:
                 return item
         return col
 
+    @staticmethod
+    def __column_key(col):
+        # normalized name of the column (comparison of tools.Var)
+        if isinstance(col, tools.Var):
+            return col._good
+        return tools.VarKey(col).key
+
+    def __find_col(self, col):
+        """
+        __parse_col of the columns of the dataset: a dict hit in the index of the normalized names of the
+        columns, the fuzzy search (tools.Var(force=True)) only for the unknown names, its result is kept in
+        the index until the columns change
+        """
+        try:
+            key = self.__column_key(col)
+        except (TypeError, Exception):
+            return self.__parse_col(col, self.columns)
+        position = self.__column_index.get(key)
+        if position is None:
+            position = -1
+            for i, item in enumerate(self.columns):
+                if tools.Var(item, force=True) == col:
+                    position = i
+                    break
+            self.__column_index[key] = position
+        return self.columns[position] if position >= 0 else col
+
     # Ok
     def __parse_default_col_name(self, col):
         if isinstance(col, slice):
             start = None
             stop = None
             if col.start is not None:
-                start = self.__parse_col(col.start, self.columns)
+                start = self.__find_col(col.start)
             if col.stop is not None:
-                stop = self.__parse_col(col.stop, self.columns)
+                stop = self.__find_col(col.stop)
 
             return slice(start, stop, col.step)
         elif isinstance(col, tuple):
@@ -95,15 +195,15 @@ class DatasetFactory:
                     start = None
                     stop = None
                     if s.start is not None:
-                        start = self.__parse_col(s.start, self.columns)
+                        start = self.__find_col(s.start)
                     if s.stop is not None:
-                        stop = self.__parse_col(s.stop, self.columns)
+                        stop = self.__find_col(s.stop)
                     s = slice(start, stop, s.step)
                 elif isinstance(s, str):
-                    s = self.__parse_col(s, self.columns)
+                    s = self.__find_col(s)
                 cols.append(s)
             return tuple(cols)
-        return self.__parse_col(col, self.columns)
+        return self.__find_col(col)
 
     # Ok
     def doublon(self, drop_on=None, keep="first"):
@@ -118,6 +218,13 @@ class DatasetFactory:
         if drop_on.shape[0]:
             self.drop_duplicates(inplace=True, keep=keep, subset=drop_on, ignore_index=True)
 
+    # pickle (processes of BIGDatasetFactory): the state is restored without __getattr__
+    def __getstate__(self):
+        return self.__dict__
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
     # Ok
     def __getattr__(self, item, default=None):
         item = self.__parse_default_col_name(item)
@@ -163,6 +270,12 @@ class DatasetFactory:
         if (key in ["_DatasetFactory" + pp for pp in ["__source", "__path"]] or
                 key in ("columns",)):
             super().__setattr__(key, value)
+            if key == "columns":
+                # normalized name -> position of the column, rebuilt on each change of the columns
+                column_index = {}
+                for i, col in enumerate(value):
+                    column_index.setdefault(self.__column_key(col), i)
+                super().__setattr__("_DatasetFactory__column_index", column_index)
             return
         key = self.__parse_default_col_name(key)
         setattr(self.__source, key, value)
@@ -225,12 +338,49 @@ class DatasetFactory:
         other = DatasetFactory(other)
         return other, source_ref, other_ref
 
+    @staticmethod
+    def _hash_join(dataset, other, exclusion_logic, op=None, columns=None, suffixes=None, how="left",
+                   partitions=None, processes=None):
+        """
+        cmerge with the partitioned hash join (see big_dataset_factory.HashJoin),
+        dataset and other can be DatasetFactory or BIGDatasetFactory
+        """
+        from kb_package.utils.big_dataset_factory import BIGDatasetFactory, HashJoin
+        if not isinstance(other, BIGDatasetFactory):
+            other = DatasetFactory._format_other(other, exclusion_logic)[0]
+        _, source_ref, other_ref = DatasetFactory._format_other([], exclusion_logic)
+        source_ref = [source_ref] if isinstance(source_ref, str) else list(source_ref)
+        other_ref = [other_ref] if isinstance(other_ref, str) else list(other_ref)
+        ref_size = min(len(source_ref), len(other_ref))
+
+        def parse_col(data, col):
+            if isinstance(data, BIGDatasetFactory):
+                return data._parse_col(col)
+            return data._DatasetFactory__parse_default_col_name(col)
+
+        left_on = [parse_col(dataset, col) for col in source_ref[:ref_size]]
+        right_on = [parse_col(other, col) for col in other_ref[:ref_size]]
+        return HashJoin(left_on, right_on, how=how, suffixes=suffixes, partitions=partitions,
+                        processes=processes).join(dataset, other, op=op, columns=columns)
+
     # Ok
     def cmerge(self,
                other: typing.Union[list, pandas.Series, pandas.DataFrame, str],
                exclusion_logic: typing.Union[dict, list, tuple, str],
-               op=None, columns=None, suffixes=None, how="left"):
+               op=None, columns=None, suffixes=None, how="left", partitions=None, processes=None):
+        """
+        Merge with other on the keys of exclusion_logic (source column(s), other column(s))
+        Args:
+            partitions: int, use the partitioned hash join (memory bounded) with this nb of partitions,
+                it's used when other is a BIGDatasetFactory
+            processes: int, nb of processes of the partitioned hash join
+
+        Returns: pandas.DataFrame (DatasetFactory or BIGDatasetFactory with the partitioned hash join)
 
+        """
+        if partitions or type(other).__name__ == "BIGDatasetFactory":
+            return self._hash_join(self, other, exclusion_logic, op=op, columns=columns, suffixes=suffixes, how=how,
+                                   partitions=partitions, processes=processes)
         other, source_ref, other_ref = self._format_other(other, exclusion_logic)
         dataset = self.dataset.copy(deep=True)
         if isinstance(source_ref, str):
@@ -266,15 +416,17 @@ class DatasetFactory:
     def exclude(self,
                 other: typing.Union[list, pandas.Series, pandas.DataFrame, str],
                 exclusion_logic: typing.Union[dict, list, tuple, str],
-                ):
-        return self.cmerge(other, exclusion_logic, op="left_only", columns=self.dataset.columns)
+                partitions=None, processes=None):
+        return self.cmerge(other, exclusion_logic, op="left_only", columns=self.dataset.columns,
+                           partitions=partitions, processes=processes)
 
     # Ok
     def intersect(self,
                   other: typing.Union[list, pandas.Series, pandas.DataFrame, str],
                   exclusion_logic: typing.Union[dict, list, tuple, str],
-                  ):
-        return self.cmerge(other, exclusion_logic, op="both", columns=self.dataset.columns)
+                  partitions=None, processes=None):
+        return self.cmerge(other, exclusion_logic, op="both", columns=self.dataset.columns,
+                           partitions=partitions, processes=processes)
 
     # Ok
     @staticmethod
@@ -300,7 +452,7 @@ class DatasetFactory:
             self.__source.rename(mapper=mapper, inplace=True, columns=final_col, **kwargs)
             self.columns = pandas.Index([tools.Var(col, force=True) for col in self.__source.columns])
         else:
-            return self.__source.rename(mapper=mapper, inplace=True, columns=final_col, **kwargs)
+            return self.__source.rename(mapper=mapper, inplace=False, columns=final_col, **kwargs)
 
     def drop(self, labels=None,
              axis=0,
@@ -330,8 +482,39 @@ class DatasetFactory:
     @classmethod
     def from_file(cls, file_path, sep=None, columns=None,
                   force_encoding=True, **kwargs):
+        """
+        Args:
+            file_path: str (csv, excel), file object, DatasetFactory or data of a DataFrame
+            sep: str, csv separator, default sniffed
+            columns: list|dict, the columns to keep (dict: to rename)
+            force_encoding: bool, detect the encoding when the given one fails
+            kwargs: arguments of pandas.read_csv / pandas.read_excel (dtype keys can be the formatted names), and
+                cache: bool|FileCache, load the file from the columnar cache (see FileCache, FILE_CACHE).
+                    The parsed frame is stored at the first load, then read while the file is not modified.
+                    Without pyarrow the file is loaded without cache
+                where: str, condition of the rows to keep (query mini-language). For a csv, it's applied
+                    chunk by chunk (READ_CHUNK_SIZE rows) while reading, with only the needed columns read:
+                    the given columns and the columns of the condition
+                params: params of the where condition
+
+        Returns: DatasetFactory
 
+        """
         start_time = time.time()
+        where, params = kwargs.pop("where", None), kwargs.pop("params", None)
+        cache = kwargs.pop("cache", None)
+        if cache is True:
+            # None when the default cache is not available (no pyarrow, not private folder)
+            cache = cls.get_file_cache()
+        if cache and isinstance(file_path, str):
+            options = dict(kwargs, sep=sep, force_encoding=force_encoding, where=where, params=params)
+            dataset = cache.get(file_path, options)
+            if dataset is None:
+                dataset = cls.from_file(file_path, sep=sep, force_encoding=force_encoding, where=where,
+                                        params=params, **kwargs).dataset
+                cache.set(file_path, dataset, options)
+            cls.LAST_FILE_LOADING_TIME = time.time() - start_time
+            return cls(dataset, columns=columns)
         delimiters = kwargs.pop("delimiters", [',', '\t', ';', ' ', ':'])
         if "header" in kwargs and isinstance(kwargs["header"], bool):
             kwargs["header"] = None if not kwargs["header"] else "infer"
@@ -348,69 +531,53 @@ class DatasetFactory:
             elif os.path.splitext(file_path)[1][1:].lower() in ["xls", "xlsx", "xlsm", "xlsb"]:
                 kwargs_ = {
                     k: v for k, v in kwargs.items()
-                    if k in pandas.read_excel.__wrapped__.__code__.co_varnames
+                    if k in inspect.signature(pandas.read_excel).parameters
                 }
                 dataset = pandas.read_excel(file_path, **kwargs_)
+                if where:
+                    dataset = cls(dataset).query(where, params=params)
             else:
                 kwargs_ = {
                     k: v for k, v in kwargs.items()
-                    if k in pandas.read_csv.__wrapped__.__code__.co_varnames
+                    if k in inspect.signature(pandas.read_csv).parameters
                 }
-                if "encoding" not in kwargs:
-                    kwargs_["encoding"] = "utf-8"
-                else:
-                    kwargs_["encoding"] = kwargs["encoding"]
-                used_sniffer = False
+                kwargs_["encoding"] = kwargs.get("encoding") or "utf-8"
+                detection_time = time.time()
+                info = tools.Cdict(encoding=kwargs_["encoding"], sep=sep, bytes_sampled=0, parses=1)
+                samples = cls._read_samples(file_path)
+                info.bytes_sampled = sum(len(sample) for sample in samples)
+                if force_encoding:
+                    encoding = cls._detect_encoding(samples, kwargs_["encoding"])
+                    if encoding != kwargs_["encoding"]:
+                        Logger.warning("We force encoding to:", encoding)
+                        kwargs_["encoding"] = encoding
+                if sep is None:
+                    sample = samples[0].decode(kwargs_["encoding"], errors="replace").splitlines(True)[:10]
+                    try:
+                        sep = DatasetFactory._check_delimiter(sample, delimiters)
+                        assert sep, ""
+                    except (csv.Error, AssertionError):
+                        sep = None
+                if sep:
+                    kwargs_["sep"] = sep
+                info.update(encoding=kwargs_["encoding"], sep=sep)
+                cls.LAST_ENCODING_DETECTION_TIME = info.detection_time = time.time() - detection_time
                 try:
-                    if sep is None:
-                        with open(file_path, encoding=kwargs_["encoding"]) as file:
-                            sample = [file.readline() for _ in range(10)]
-                            try:
-                                sep = DatasetFactory._check_delimiter(sample, delimiters)
-                                assert sep, ""
-                                kwargs_["sep"] = sep
-                                used_sniffer = True
-                            except (csv.Error, AssertionError):
-                                pass
-                    else:
-                        kwargs_["sep"] = sep
-                    dataset = pandas.read_csv(file_path, **kwargs_)
+                    dataset = cls._read_csv(file_path, kwargs_, columns=columns, where=where, params=params)
                 except UnicodeDecodeError as exc:
                     if not force_encoding:
                         raise exc
-
-                    last_min_buffer = None
-                    while True:
-                        min_buffer = int(re.search(r"position (\d+):", str(exc)).groups()[0]) + 100
-                        print(min_buffer)
-                        if min_buffer == last_min_buffer:
-                            raise exc
-                        with open(file_path, "rb") as file_from_file_path:
-                            file_bytes = file_from_file_path.read(min_buffer)
-                            encoding_proba = chardet.detect(file_bytes).get("encoding", "latin1")
-                            if str(encoding_proba).lower() == "ascii":
-                                encoding_proba = "cp1252"
-                        if kwargs_["encoding"] != encoding_proba:
-                            Logger.warning("We force encoding to:", encoding_proba)
-                            kwargs_["encoding"] = encoding_proba
-                            try:
-                                if "sep" not in kwargs_ or used_sniffer:
-                                    with open(file_path, encoding=kwargs_["encoding"]) as file:
-                                        sample = [file.readline() for _ in range(10)]
-                                        try:
-                                            sep = DatasetFactory._check_delimiter(sample, delimiters)
-                                            assert sep, ""
-                                            kwargs_["sep"] = sep
-                                        except (csv.Error, AssertionError):
-                                            pass
-                                dataset = pandas.read_csv(file_path, **kwargs_)
-                                break
-                            except UnicodeDecodeError as ex:
-                                kwargs_["encoding"] = None
-                                exc = ex
-                        else:
-                            raise exc
-                        last_min_buffer = min_buffer
+                    # a bad byte out of the samples: the encoding is detected with the bytes around it
+                    block = cls._find_undecodable_block(file_path, kwargs_["encoding"])
+                    encoding = kwargs_["encoding"] if block is None else cls._detect_encoding(
+                        samples + [block], kwargs_["encoding"])
+                    if encoding == kwargs_["encoding"]:
+                        raise exc
+                    Logger.warning("We force encoding to:", encoding)
+                    kwargs_["encoding"] = info.encoding = encoding
+                    info.parses += 1
+                    dataset = cls._read_csv(file_path, kwargs_, columns=columns, where=where, params=params)
+                cls.LAST_FILE_LOADING_INFO = info
         elif hasattr(file_path, "readable") and file_path.readable():
             sample = [file_path.readline() for _ in range(10)]
             file_path.seek(0)
@@ -437,6 +604,123 @@ class DatasetFactory:
 
         return cls(dataset, columns=columns)
 
+    @classmethod
+    def _read_csv(cls, file_path, read_kwargs, columns=None, where=None, params=None):
+        """
+        pandas.read_csv with the projection of the columns (usecols) and the where condition pushed in the reader
+        """
+        read_kwargs = dict(read_kwargs)
+        header = None
+        if read_kwargs.get("header", "infer") in ("infer", 0) and "names" not in read_kwargs:
+            with open(file_path, encoding=read_kwargs["encoding"], errors="replace", newline="") as file:
+                header = next(csv.reader(file, delimiter=read_kwargs.get("sep") or ","), None)
+        if header:
+            def real_columns(names):
+                names = [tools.Var(name, force=True) for name in names]
+                return [col for col in header if tools.Var(col, force=True) in names]
+
+            if isinstance(read_kwargs.get("dtype"), dict):
+                read_kwargs["dtype"] = {(real_columns([k]) or [k])[0]: v for k, v in read_kwargs["dtype"].items()}
+            projection = cls._parse_columns_arg(columns, header)
+            if projection is not None and not {"usecols", "index_col"}.intersection(read_kwargs):
+                usecols = real_columns(projection)
+                if where:
+                    usecols += [col for col in real_columns(cls._query_columns(header, where, params))
+                                if col not in usecols]
+                # order of the file: usecols is a set for pandas
+                read_kwargs["usecols"] = [col for col in header if col in usecols]
+        if not where:
+            return pandas.read_csv(file_path, **read_kwargs)
+        read_kwargs.pop("chunksize", None)
+        chunks = [cls(chunk).query(where, params=params)
+                  for chunk in pandas.read_csv(file_path, chunksize=cls.READ_CHUNK_SIZE, **read_kwargs)]
+        return pandas.concat(chunks) if chunks else pandas.DataFrame(columns=read_kwargs.get("usecols") or header)
+
+    @staticmethod
+    def _query_columns(columns, query, params=None):
+        """
+        The columns used by the query
+        """
+        var_root_name = tools._get_new_kb_text(" ".join(columns))
+        eq_col = {tools.format_var_name(col, default=var_root_name + "_" + str(index), no_case=True): col
+                  for index, col in enumerate(columns)}
+        _, _, concerned_names = QueryTransformer(columns=list(eq_col)).process(query.strip(), params=params)
+        return [eq_col[name] for name in dict.fromkeys(concerned_names) if name in eq_col]
+
+    @classmethod
+    def _read_samples(cls, file_path, size=None):
+        """
+        Bytes of the file at the head, the middle and the tail (all the file when it's small),
+        the middle and the tail samples start at a new line
+        """
+        size = size or cls.ENCODING_SAMPLE_SIZE
+        file_size = os.path.getsize(file_path)
+        with open(file_path, "rb") as file:
+            if file_size <= 3 * size:
+                return [file.read()]
+            samples = [file.read(size)]
+            for position in (file_size // 2 - size // 2, file_size - size):
+                file.seek(position)
+                sample = file.read(size)
+                samples.append(sample[sample.find(b"\n") + 1:])
+        return samples
+
+    @staticmethod
+    def _can_decode(samples, encoding):
+        try:
+            for sample in samples:
+                # final=False: a character cut at the end of the sample is not an error
+                codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return True
+        except (UnicodeDecodeError, LookupError):
+            return False
+
+    @classmethod
+    def _detect_encoding(cls, samples, encoding="utf-8"):
+        """
+        The given encoding when it decodes all the samples, else the encoding detected by chardet
+        """
+        if cls._can_decode(samples, encoding):
+            return encoding
+        # chardet on the lines with not ascii characters: the ascii ones make it guess anything
+        lines = b"\n".join(line for sample in samples for line in sample.split(b"\n") if not line.isascii())
+        detection = chardet.detect(lines or b"".join(samples))
+        encoding_proba = detection.get("encoding") or "cp1252"
+        if str(encoding_proba).lower() == "ascii" or (detection.get("confidence") or 0) < 0.5:
+            encoding_proba = "cp1252"
+        for encoding_ in (encoding_proba, "cp1252"):
+            if cls._can_decode(samples, encoding_):
+                return encoding_
+        return "latin1"
+
+    @classmethod
+    def _find_undecodable_block(cls, file_path, encoding, block_size=1 << 20):
+        """
+        The first block of the file the encoding can't decode (bytes read, no parse), None if there is none
+        """
+        decoder = codecs.getincrementaldecoder(encoding)()
+        with open(file_path, "rb") as file:
+            for block in iter(lambda: file.read(block_size), b""):
+                try:
+                    decoder.decode(block)
+                except UnicodeDecodeError as exc:
+                    return block[max(exc.start - cls.ENCODING_SAMPLE_SIZE // 2, 0):
+                                 exc.start + cls.ENCODING_SAMPLE_SIZE // 2]
+        return None
+
+    @classmethod
+    def get_file_cache(cls):
+        """
+        Returns: FileCache, the default cache of from_file, None when it's not available
+        """
+        if cls.FILE_CACHE is None:
+            try:
+                cls.FILE_CACHE = FileCache()
+            except (ImportError, PermissionError, OSError) as ex:
+                Logger.warning("The file cache is disabled:", ex)
+                cls.FILE_CACHE = False
+        return cls.FILE_CACHE or None
+
     @staticmethod
     def _parse_columns_arg(columns, dataset_columns):
         if tools.BasicTypes.is_iterable(columns):
@@ -483,10 +767,11 @@ class DatasetFactory:
         dataframe[alias or tools.format_var_name(op, permit_char="+-*/")] = DatasetFactory(dataframe).apply(op)
         return dataframe
 
-    # Ok
-    def sql(self, query=None, *, select=None, group_by=None, where=None):
+    @staticmethod
+    def _parse_sql(query=None, *, select=None, group_by=None, where=None):
         """
         query: str like @select col1, col2 @where [condition] @group_by col1, col2
+        Returns: (select, group_by, where)
         """
         final_query = {}
         if query is not None:
@@ -502,39 +787,81 @@ class DatasetFactory:
         select = select or final_query.get("select")
         group_by = group_by or final_query.get("group_by")
         where = where or final_query.get("where")
-        temp = self.dataset
         if where:
             where = where.strip()
-            if where:
-                temp = self.query(where)
+        return select, group_by, where
+
+    @staticmethod
+    def _parse_select(select, columns):
+        """
+        select: str like col1, count(*), avg(col2) as alias
+        Returns: list of {func, on, alias} for the aggregations and {on, alias} for the columns
+        """
         final_select = select
-        if select:
-            if isinstance(select, str):
-                final_select = []
-                for s in select.split(","):
-                    s = s.strip()
-                    res = re.search(r"(avg|count|min|max|sum)\((.*?)\)(?:\s+(?:as\s+)?([^,]+))?", s, flags=re.I)
-                    if res:
-                        res = res.groups()
-                        col = self.__parse_default_col_name(res[1])
-                        func = res[0].strip()
-                        alias = res[2]
-                        if col == "*" and func not in ("count", "size"):
-                            raise ValueError("Bad value of select %s " % (s,))
-                        elif col == "*":
-                            func = "count"
-                            col = temp.columns[0]
-                        elif func in ("size", "count") and re.search(r"distinct\s+(\w+)", col, flags=re.I | re.S):
-                            col = self.__parse_default_col_name(
-                                re.search(r"distinct\s+(\w+)", col, flags=re.I | re.S).groups()[0])
-                            func = count_distinct
+        if isinstance(select, str):
+            final_select = []
+            # the commas in the parentheses are the arguments of the functions
+            for s in re.split(r",(?![^()]*\))", select):
+                s = s.strip()
+                res = re.search(r"(avg|count|min|max|sum|median|quantile)\((.*?)\)(?:\s+(?:as\s+)?([^,]+))?", s,
+                                flags=re.I)
+                if res:
+                    res = res.groups()
+                    func = res[0].strip()
+                    alias = res[2]
+                    if func.lower() == "quantile":
+                        # quantile(col, q)
+                        on, q = res[1].rsplit(",", 1)
+                        col = DatasetFactory.__parse_col(on.strip(), columns)
+                        alias = alias or f"quantile({col}, {q.strip()})"
+                        func = quantile(float(q))
                         final_select.append({"func": func, "on": col, "alias": alias})
-                    else:
-                        s = re.search(r"(\w+)(?:\s+as)?(?:\s+(.*))?", s, flags=re.I | re.S)
-                        final_select.append({"on": s[0], "alias": s[1]})
+                        continue
+                    col = DatasetFactory.__parse_col(res[1], columns)
+                    if col == "*" and func not in ("count", "size"):
+                        raise ValueError("Bad value of select %s " % (s,))
+                    elif col == "*":
+                        func = "count"
+                        col = columns[0]
+                    elif func in ("size", "count") and re.search(r"distinct\s+(\w+)", col, flags=re.I | re.S):
+                        col = DatasetFactory.__parse_col(
+                            re.search(r"distinct\s+(\w+)", col, flags=re.I | re.S).groups()[0], columns)
+                        func = count_distinct
+                    final_select.append({"func": func, "on": col, "alias": alias})
+                else:
+                    s = re.search(r"(\w+)(?:\s+as)?(?:\s+(.*))?", s, flags=re.I | re.S)
+                    final_select.append({"on": s[0], "alias": s[1]})
+        return final_select or []
 
-        if group_by:
-            temp = self.group(group_by, temp, [d for d in final_select if isinstance(d, dict) and d.get("func")])
+    # Ok
+    def sql(self, query=None, *, select=None, group_by=None, where=None, approx=False, sample=None,
+            confidence=None, seed=None):
+        """
+        query: str like @select col1, col2 @where [condition] @group_by col1, col2
+        Args:
+            query: str, the functions are avg, count, count(distinct col), min, max, sum, median, quantile(col, q)
+            approx: bool, approximate aggregations (see approx_group): each estimate has the columns
+                <alias>_low and <alias>_high, its confidence interval
+            sample: int|float, nb of rows (or fraction) of the sample of approx, default APPROX_SAMPLE_SIZE
+            confidence: float, level of the intervals of approx, default APPROX_CONFIDENCE
+            seed: int, random seed of the sample of approx
+
+        Returns: DatasetFactory
+        """
+        select, group_by, where = self._parse_sql(query, select=select, group_by=group_by, where=where)
+        temp = self.dataset
+        if where:
+            temp = self.query(where)
+        final_select = self._parse_select(select, temp.columns) if select else []
+        aggregating_func = [d for d in final_select if isinstance(d, dict) and d.get("func")]
+
+        if approx and aggregating_func:
+            temp = self.approx_group(group_by, temp, aggregating_func, sample=sample, confidence=confidence,
+                                     seed=seed)
+            if not group_by:
+                return DatasetFactory(temp)
+        elif group_by:
+            temp = self.group(group_by, temp, aggregating_func)
         for d in final_select:
             if "func" not in d:
                 temp = self._gen_columns_by_string(temp, d["on"], d.get("alias"))
@@ -542,51 +869,231 @@ class DatasetFactory:
 
     # Ok
     @staticmethod
-    def group(group_by, dataset, aggregating_func=None):
+    def group(group_by, dataset, aggregating_func=None, sort=None):
         """
         aggregating_func like [{func: avg, on:field}]
+        Args:
+            group_by: str|list, the columns
+            dataset: pandas.DataFrame
+            aggregating_func: list like [{func: avg, on: field, alias: ...}], without it: the size (COUNT)
+                of the groups. An alias can't be a column of group_by (ValueError)
+            sort: bool, groups sorted by their keys. With False, the groups are in the order of their first
+                row (hash aggregation without sort). Default GROUP_SORT
+
+        Returns: pandas.DataFrame, the columns of group_by then the aggregations
         """
         if isinstance(group_by, str):
             group_by = [DatasetFactory.__parse_col(d, dataset.columns) for d in group_by.split(",") if d.strip()]
+        sort = DatasetFactory.GROUP_SORT if sort is None else sort
 
-        group_by_elm = dataset.groupby(by=group_by)
+        group_by_elm = dataset.groupby(by=group_by, sort=sort)
         _equivalence = {"avg": "mean", "count": "size"}
         final_agg = {}
+        distinct = {}
         for d in aggregating_func or []:
             func = _equivalence.get(d["func"]) or d["func"]
-            # d["func"] = func
             alias = d.get("alias") or (d["func"] + f"({d['on']})" if isinstance(d["func"], str)
                                        else d["func"].__name__ + f"({d['on']})")
+            if alias in group_by:
+                raise ValueError("Bad alias given: %s, it's a column of group_by" % (alias,))
+            if func is count_distinct or func == "count_distinct":
+                # nunique of the groups instead of count_distinct by group (null counted as a value)
+                distinct[alias] = d["on"]
             final_agg[alias] = pandas.NamedAgg(column=d['on'], aggfunc=func)
-        if final_agg:
-            data = group_by_elm.agg(**final_agg)
-            """
-            aggregating_func = [tools.Cdict(d) for d in aggregating_func]
-            data = tools.concurrent_execution(lambda by: getattr(group_by_elm[by.on], by.func)(),
-                                              len(aggregating_func),
-                                              args=lambda index: (aggregating_func[index], index))
-            """
-            final_d = {}
-            index_rows = [d for d in data.index]
-            if len(group_by) > 1:
-                final_d.update({d: [row[c] for row in index_rows] for c, d in enumerate(group_by)})
-            else:
-                final_d[group_by[0]] = index_rows
-            for col in final_agg:
-                final_d[col] = data[col].values
+        if not final_agg:
+            return group_by_elm.size().reset_index(name="COUNT")
+        named_agg = {k: v for k, v in final_agg.items() if k not in distinct}
+        data = group_by_elm.agg(**named_agg) if named_agg else group_by_elm.size().to_frame().iloc[:, :0]
+        for alias, on in distinct.items():
+            data[alias] = group_by_elm[on].nunique(dropna=False)
+        return data.loc[:, list(final_agg)].reset_index()
 
-            data = pandas.DataFrame(final_d)
+    @staticmethod
+    def approx_group(group_by, dataset, aggregating_func, sample=None, confidence=None, seed=None):
+        """
+        Approximate DatasetFactory.group for the big datasets:
+            - count, min, max: exact
+            - count(distinct col): HyperLogLog of the whole dataset
+            - avg, sum: on a sample stratified by group (each group has at least APPROX_MIN_GROUP_ROWS rows),
+                interval of the normal distribution with the finite population correction
+            - median, quantile(col, q): t-digest of the sample, interval of the ranks
+            - the other functions: exact
+        Args:
+            group_by: str|list, the columns, None for a single row
+            dataset: pandas.DataFrame
+            aggregating_func: list like [{func: avg, on: field, alias: ...}]
+            sample: int|float, nb of rows (or fraction) of the sample, default APPROX_SAMPLE_SIZE
+            confidence: float, level of the intervals, default APPROX_CONFIDENCE
+            seed: int, random seed of the sample
+
+        Returns: pandas.DataFrame, the columns of group_by then the aggregations, <alias>_low and <alias>_high
+            for the estimates
+        """
+        if isinstance(group_by, str):
+            group_by = [DatasetFactory.__parse_col(d, dataset.columns) for d in group_by.split(",") if d.strip()]
+        z = z_score(DatasetFactory.APPROX_CONFIDENCE if confidence is None else confidence)
+        if group_by:
+            grouped = dataset.groupby(by=group_by, sort=DatasetFactory.GROUP_SORT)
+            sizes = grouped.size()
+            codes = grouped.ngroup().values
+            # the rows of null keys are not in a group (as group)
+            not_null = ~numpy.isnan(codes) & (codes >= 0) if codes.dtype.kind == "f" else codes >= 0
+            if not not_null.all():
+                dataset, codes = dataset[not_null], codes[not_null]
+            index, counts, codes = sizes.index, sizes.values, codes.astype(numpy.int64)
         else:
-            data = group_by_elm.size()
-            index_rows = [d for d in data.index]
+            grouped = None
+            index, counts, codes = None, numpy.array([len(dataset)]), numpy.zeros(len(dataset), dtype=numpy.int64)
+        nb_groups = len(counts)
+        positions = DatasetFactory._stratified_positions(
+            codes, counts, DatasetFactory._sample_size(
+                DatasetFactory.APPROX_SAMPLE_SIZE if sample is None else sample, len(dataset)),
+            numpy.random.default_rng(seed), DatasetFactory.APPROX_MIN_GROUP_ROWS)
+        sample_codes = codes[positions]
+        sample_counts = numpy.bincount(sample_codes, minlength=nb_groups)
+        # finite population correction, no error when the group is in the sample
+        fpc = numpy.sqrt(numpy.clip(1 - sample_counts / numpy.maximum(counts, 1), 0, 1))
+
+        def sample_groups(on, fill=None):
+            values = pandas.Series(dataset[on].values[positions])
+            return (values if fill is None else values.fillna(fill)).groupby(sample_codes)
+
+        def by_group(values):
+            return numpy.asarray(values.reindex(range(nb_groups)), dtype=float)
+
+        final_d = {}
+        for d in aggregating_func:
+            func, on = d["func"], d["on"]
+            name = func if isinstance(func, str) else func.__name__
+            alias = d.get("alias") or name + f"({on})"
+            interval = None
+            if func is count_distinct or name == "count_distinct":
+                values = numpy.minimum(by_group(HyperLogLog.count_by(codes, dataset[on])), counts)
+                delta = z * HyperLogLog().error * values
+                interval = (numpy.maximum(values - delta, numpy.minimum(counts, 1)), numpy.minimum(values + delta,
+                                                                                                   counts))
+            elif name in ("count", "size"):
+                values = counts
+            elif name in ("avg", "mean", "sum"):
+                serie = sample_groups(on, fill=0 if name == "sum" else None)
+                values, std = by_group(serie.mean()), by_group(serie.std())
+                error = numpy.where(fpc == 0, 0, z * std / numpy.sqrt(by_group(serie.count())) * fpc)
+                if name == "sum":
+                    values, error = values * counts, error * counts
+                interval = (values - error, values + error)
+            elif name in ("median", "quantile"):
+                q = getattr(func, "q", 0.5)
+                values = numpy.full(nb_groups, numpy.nan)
+                interval = (numpy.full(nb_groups, numpy.nan), numpy.full(nb_groups, numpy.nan))
+                for code, rows in sample_groups(on).indices.items():
+                    digest = TDigest().add(dataset[on].values[positions[rows]])
+                    values[code] = digest.quantile(q)
+                    low, high = (values[code], values[code]) if fpc[code] == 0 else digest.interval(q, digest.count)
+                    interval[0][code], interval[1][code] = low, high
+            else:
+                func = {"avg": "mean"}.get(func, func)
+                values = grouped[on].agg(func).values if grouped is not None else [dataset[on].agg(func)]
+            final_d[alias] = values
+            if interval is not None:
+                final_d[alias + "_low"], final_d[alias + "_high"] = interval
+        data = pandas.DataFrame(final_d, index=index)
+        return data.reset_index() if group_by else data.reset_index(drop=True)
+
+    @staticmethod
+    def _sample_size(d, nb_rows=None):
+        """
+        d: int, nb of rows, or float|str like 0.1 or "10%", fraction of nb_rows (1.0, "100%": all the rows)
+        Returns: int
+        """
+        if isinstance(d, (int, numpy.integer)) and not isinstance(d, bool):
+            d = int(d)
+            assert d >= 0, "Bad sample size given: %s, must be a positive nb of rows" % (d,)
+            return d if nb_rows is None else min(d, nb_rows)
+        fraction = d
+        if isinstance(fraction, str):
+            fraction = fraction.strip()
+            fraction = float(fraction[:-1]) / 100 if fraction.endswith("%") else float(fraction)
+        assert 0 <= fraction <= 1, "Bad sample fraction given: %s, must be between 0 and 1 (or 0%% and 100%%)" % (
+            d,)
+        return int(round(fraction * nb_rows))
 
-            if len(group_by) > 1:
-                final_agg.update({d: [row[c] for row in index_rows] for c, d in enumerate(group_by)})
+    @staticmethod
+    def _allocation(counts, n, min_rows=0):
+        """
+        Nb of rows of each stratum in a sample of n rows: proportional to the stratum (largest remainders),
+        at least min_rows (or the stratum)
+        """
+        counts = numpy.asarray(counts, dtype=numpy.int64)
+        total = counts.sum()
+        if not total:
+            return counts
+        exact = counts * (min(n, total) / total)
+        allocation = numpy.floor(exact).astype(numpy.int64)
+        remainder = int(min(n, total) - allocation.sum())
+        if remainder > 0:
+            allocation[numpy.argsort(allocation - exact, kind="mergesort")[:remainder]] += 1
+        return numpy.minimum(numpy.maximum(allocation, min_rows), counts)
+
+    @staticmethod
+    def _stratified_positions(codes, counts, n, rng, min_rows=0):
+        """
+        Positions (sorted) of the rows of a stratified sample
+        Args:
+            codes: array of int, stratum of each row (0 .. nb strata - 1)
+            counts: array, nb of rows of each stratum
+            n: int, nb of rows of the sample
+            rng: numpy.random.Generator
+            min_rows: int, nb min of rows by stratum
+
+        Returns: numpy.ndarray
+        """
+        if len(counts) == 1:
+            return numpy.sort(rng.choice(len(codes), min(max(n, min_rows), len(codes)), replace=False))
+        allocation = DatasetFactory._allocation(counts, n, min_rows)
+        # candidates: each row with a probability a bit above the share of its stratum (one pass), only the
+        # candidates are sorted
+        counts = numpy.asarray(counts)
+        probability = numpy.minimum((allocation + 4 * numpy.sqrt(allocation) + 1) / numpy.maximum(counts, 1), 1)
+        candidates = numpy.flatnonzero(rng.random(len(codes)) < probability[codes])
+        candidate_codes = codes[candidates]
+        # candidates by stratum then by random key: the first candidates of each stratum are its sample
+        order = numpy.argsort(candidate_codes + rng.random(len(candidates)), kind="quicksort")
+        starts = numpy.concatenate([[0], numpy.cumsum(numpy.bincount(candidate_codes, minlength=len(counts)))[:-1]])
+        ordered_codes = candidate_codes[order]
+        rank = numpy.arange(len(candidates)) - starts[ordered_codes]
+        return numpy.sort(candidates[order[rank < allocation[ordered_codes]]])
+
+    @staticmethod
+    def _reservoir(chunks, n, by=None, seed=None):
+        """
+        Reservoir sampling of an iterable of frames (one pass, only the sample is in memory): each row has a
+        random key and the rows of the n smallest keys are kept. With by (stratified), each stratum keeps its
+        n smallest keys, then its share of the sample (see _allocation)
+        Returns: pandas.DataFrame, the rows of the sample in the order of the chunks
+        """
+        rng = numpy.random.default_rng(seed)
+        key, row = "_kb_key", "_kb_row"
+        reservoir, counts, nb_rows = None, None, 0
+        for chunk in chunks:
+            chunk = chunk.assign(**{key: rng.random(len(chunk)), row: numpy.arange(nb_rows, nb_rows + len(chunk))})
+            nb_rows += len(chunk)
+            if by:
+                size = chunk.groupby(by, sort=False, dropna=False).size()
+                counts = size if counts is None else counts.add(size, fill_value=0)
+            chunk = chunk if reservoir is None else pandas.concat([reservoir, chunk])
+            if by:
+                reservoir = chunk.sort_values(key).groupby(by, sort=False, dropna=False).head(n)
             else:
-                final_agg[group_by[0]] = index_rows
-            final_agg["COUNT"] = data.values
-            data = pandas.DataFrame(final_agg)
-        return data
+                reservoir = chunk.nsmallest(n, key)
+        if reservoir is None:
+            return pandas.DataFrame()
+        if by:
+            allocation = pandas.Series(DatasetFactory._allocation(counts.values, n), index=counts.index)
+            reservoir = reservoir.sort_values(key)
+            grouped = reservoir.groupby(by, sort=False, dropna=False)
+            limit = allocation.reindex(grouped.size().index).values[grouped.ngroup().values]
+            reservoir = reservoir[grouped.cumcount().values < limit]
+        return reservoir.sort_values(row).drop(columns=[key, row])
 
     # Ok
     def __add__(self, other):
@@ -604,50 +1111,37 @@ class DatasetFactory:
     # Ok
     def query(self, query, params=None, *, method="parse", reset=False, **kwargs):
         """
-
+        Rows of the dataset matching the condition
+        Args:
+            query: str, the condition, like "a > 10 and b = 'x'"
+            params: list|dict, the values of the parameters of the condition
+            method: str, parse (python condition) or sql (condition of a sqlite query)
+            reset: bool, reset the index of the result
+            kwargs: inplace, and the functions (callable) used by the condition, only for this call
+
+        Returns: pandas.DataFrame, None when inplace
         """
         query = query.strip()
         if not len(query) or self.__source.empty:
             return self.__source
         if method in ("parse", 1):
-            permit_funcs = []
-            q_permit_funcs = QueryTransformer.PERMIT_FUNC
-            for k, v in kwargs.items():
+            # the functions of this call only
+            functions = {}
+            for k, v in list(kwargs.items()):
                 if callable(v):
-                    permit_funcs.extend(str(k).lower())
-                    q_permit_funcs[str(k).lower()] = v
-
-            var_root_name = tools._get_new_kb_text(" ".join(self.__source.columns))
-
-            eq_col = {col: tools.format_var_name(col, default=var_root_name + "_" + str(index), no_case=True)
-                      for index, col in enumerate(self.__source.columns)}
+                    functions[str(k).lower()] = kwargs.pop(k)
             inplace = kwargs.pop("inplace", False)
-            try:
-                self.__source.rename(columns=eq_col, inplace=True)
-
-                hard, query, concerned_names = QueryTransformer(permit_funcs=permit_funcs,
-                                                                columns=list(eq_col.values())).process(
-                    query,
-                    params=params
-                )
-                # dataset.rename(columns={self.__parse_default_col_name(col): col for col in concerned_names},
-                # inplace=True)
-                if hard:
-                    res = tools.safe_eval_math(query, params=q_permit_funcs, dataset=self.__source,
-                                               method="exec", **kwargs)
-                else:
-                    res = self.__source.query(query, **kwargs)
-                res = res.rename(columns={v: k for k, v in eq_col.items()})
-                if reset:
-                    res = res.reset_index(drop=True)
-                if inplace:
-                    self.__source = res
-                    return
-
-                return res
-            finally:
-                if not inplace:
-                    self.__source.rename(columns={v: k for k, v in eq_col.items()}, inplace=True)
+            if kwargs:
+                raise TypeError("query() got unexpected keyword arguments: %s" % ", ".join(kwargs))
+
+            code, columns, numexpr_expression = self._compile_query(query, params, list(functions))
+            res = self.__source[self._run_query_plan(code, columns, numexpr_expression, functions)]
+            if reset:
+                res = res.reset_index(drop=True)
+            if inplace:
+                self.__source = res
+                return
+            return res
         elif method in ("sql", 2):
 
             from kb_package.database.sqlitedb import SQLiteDB
@@ -660,6 +1154,61 @@ class DatasetFactory:
                 return
             return res
 
+    def _run_query_plan(self, code, columns, numexpr_expression=None, functions=None):
+        """
+        Mask of the rows of a compiled query (see _compile_query)
+        Args:
+            code: code object of the condition
+            columns: dict, {formatted name: column} of the columns used
+            numexpr_expression: str, the condition for numexpr when it's possible
+            functions: dict, {name: callable} the functions given to the query
+        """
+        functions = functions or {}
+        if self.QUERY_BACKEND == "numexpr" and numexpr_expression is not None and \
+                len(self.__source) >= self.NUMEXPR_MIN_ROWS and \
+                all(is_numeric_dtype(self.__source[col]) for col in columns.values()):
+            numexpr = _get_numexpr()
+            if numexpr is not None:
+                return numexpr.evaluate(numexpr_expression,
+                                        local_dict={name: self.__source[col].to_numpy()
+                                                    for name, col in columns.items()})
+        global_functions = dict(QueryTransformer.PERMIT_FUNC)
+        if self.QUERY_BACKEND in ("vectorized", "numexpr"):
+            global_functions.update(query_func_vectorized.FUNCTIONS)
+        # the functions given by the user are kept
+        global_functions.update(functions)
+        # the columns used by the query, by their formatted name: no rename of the dataset
+        dataset = types.SimpleNamespace(**{name: self.__source[col] for name, col in columns.items()})
+        return eval(code, global_functions, {"dataset": dataset})
+
+    def _compile_query(self, query, params=None, permit_funcs=()):
+        """
+        Code object of the condition of the query, cached by query text, params and columns
+        Returns: (code, {formatted name: column} of the columns used,
+            numexpr expression when the condition has only comparisons and operators else None)
+        """
+        key = (query, repr(params), tuple(self.__source.columns), tuple(permit_funcs))
+        cls = DatasetFactory
+        with cls._QUERY_PLANS_LOCK:
+            plan = cls._QUERY_PLANS.get(key)
+            if plan is not None:
+                cls._QUERY_PLANS.move_to_end(key)
+                return plan
+        var_root_name = tools._get_new_kb_text(" ".join(self.__source.columns))
+        eq_col = {tools.format_var_name(col, default=var_root_name + "_" + str(index), no_case=True): col
+                  for index, col in enumerate(self.__source.columns)}
+        expression, concerned_names = QueryTransformer(permit_funcs=list(permit_funcs),
+                                                       columns=list(eq_col)).process(query, params=params,
+                                                                                     _for="plan")
+        plan = (compile(expression, "<query>", "eval"),
+                {name: eq_col[name] for name in concerned_names if name in eq_col},
+                _to_numexpr(expression))
+        with cls._QUERY_PLANS_LOCK:
+            cls._QUERY_PLANS[key] = plan
+            while len(cls._QUERY_PLANS) > cls.QUERY_CACHE_SIZE:
+                cls._QUERY_PLANS.popitem(last=False)
+        return plan
+
     # Ok
     def apply(self, func, axis=0, raw=False, result_type=None, *, params=(), args=(), **kwargs):
         params = params or args
@@ -669,14 +1218,29 @@ class DatasetFactory:
         if not isinstance(func, str):
             return self.__source.apply(func, axis=axis, raw=raw, result_type=result_type, args=args, **kwargs)
         permit_funcs = ["pnn_ci"]
-        q_permit_funcs = QueryTransformer.PERMIT_FUNC
+        # the functions of this call only
+        q_permit_funcs = dict(QueryTransformer.PERMIT_FUNC)
         pnn_ci = numpy.vectorize(lambda f, plus="+", reseaux="ORANGE", permit_fix=False: tools.BasicTypes.pnn_ci(
             f, plus, permit_fixe=permit_fix, reseau=reseaux))
         q_permit_funcs["pnn_ci"] = pnn_ci
+        custom_funcs = []
         for k, v in kwargs.items():
             if callable(v):
-                permit_funcs.extend(str(k).lower())
+                permit_funcs.append(str(k).lower())
                 q_permit_funcs[str(k).lower()] = v
+                custom_funcs.append(str(k).lower())
+
+        if self.APPLY_COLUMN_WISE and not custom_funcs:
+            code, columns = self._compile_apply(func, params)
+            if code is not None:
+                # the expression is computed once with the columns (Series)
+                functions = dict(q_permit_funcs, **query_func_vectorized.FUNCTIONS)
+                serie = types.SimpleNamespace(**{name: self.__source[col] for name, col in columns.items()})
+                res = eval(code, functions, {"serie": serie})
+                if not isinstance(res, pandas.Series):
+                    res = pandas.Series(res if numpy.ndim(res) else [res] * len(self.__source),
+                                        index=self.__source.index)
+                return res
 
         var_root_name = tools._get_new_kb_text(" ".join(self.__source.columns))
 
@@ -709,11 +1273,62 @@ class DatasetFactory:
         finally:
             self.__source.rename(columns={v: k for k, v in eq_col.items()}, inplace=True)
 
-    def sampling(self, d: str | int):
+    def _compile_apply(self, expression, params=None):
+        """
+        Code object of the apply expression when all its operations can be computed with whole columns
+        (operators, comparisons, the functions of the query), cached like the queries
+        Returns: (code or None, {formatted name: column} of the columns used)
+        """
+        key = ("apply", expression, repr(params), tuple(self.__source.columns))
+        cls = DatasetFactory
+        with cls._QUERY_PLANS_LOCK:
+            plan = cls._QUERY_PLANS.get(key)
+            if plan is not None:
+                cls._QUERY_PLANS.move_to_end(key)
+                return plan
+        var_root_name = tools._get_new_kb_text(" ".join(self.__source.columns))
+        eq_col = {tools.format_var_name(col, default=var_root_name + "_" + str(index), no_case=True): col
+                  for index, col in enumerate(self.__source.columns)}
+        code, concerned_names = QueryTransformer("serie", hard=True, permit_funcs=["pnn_ci"],
+                                                 columns=list(eq_col)).process(expression, _for="apply",
+                                                                               params=params)
+        vectorizable = set(query_func_vectorized.FUNCTIONS) | {"pnn_ci"}
+        allowed = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Attribute, ast.Name, ast.Load,
+                   ast.Constant, ast.operator, ast.unaryop, ast.cmpop, ast.Call, ast.Tuple, ast.List, ast.keyword)
+        tree = ast.parse(code, mode="eval")
+        if all(isinstance(node, allowed) and (not isinstance(node, ast.Call) or (
+                isinstance(node.func, ast.Name) and node.func.id in vectorizable)) for node in ast.walk(tree)):
+            plan = (compile(tree, "<apply>", "eval"),
+                    {name: eq_col[name] for name in concerned_names if name in eq_col})
+        else:
+            plan = (None, {})
+        with cls._QUERY_PLANS_LOCK:
+            cls._QUERY_PLANS[key] = plan
+            while len(cls._QUERY_PLANS) > cls.QUERY_CACHE_SIZE:
+                cls._QUERY_PLANS.popitem(last=False)
+        return plan
+
+    def sampling(self, d: str | int | float, by=None, seed=None):
         """
         return (statistically) representative sample
+        Args:
+            d: int, nb of rows of the sample, or float|str like 0.1 or "10%", fraction of the rows
+            by: str|list, columns of the strata: stratified sample, each stratum has its share of the rows
+            seed: int, random seed
+
+        Returns: DatasetFactory, the rows of the sample in the order of the dataset
         """
-        pass
+        rng = numpy.random.default_rng(seed)
+        n = self._sample_size(d, len(self.__source))
+        if isinstance(by, str):
+            by = [d.strip() for d in by.split(",") if d.strip()]
+        if by:
+            grouped = self.__source.groupby([self.__parse_col(d, self.columns) for d in by], sort=False,
+                                            dropna=False)
+            positions = self._stratified_positions(grouped.ngroup().values, grouped.size().values, n, rng)
+        else:
+            positions = numpy.sort(rng.choice(len(self.__source), n, replace=False))
+        return DatasetFactory(self.__source.iloc[positions])
 
 
 class QueryTransformer(ast.NodeTransformer):
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk columnar cache of the files loaded by DatasetFactory.from_file(..., cache=True).
+The parsed frame is stored as Feather (read with memory map) or Parquet, keyed by the path, the size,
+the mtime and the read options: the file is parsed again only when it (or the options) changed.
+pyarrow is required. The cache folder is private (mode 0700, owned by the user): the entries are only
+Feather/Parquet files, never pickles.
+
+    cache = FileCache(folder="cache", max_size=5 * 1024 ** 3)
+    dataset = DatasetFactory.from_file("data.xlsx", cache=cache)
+    cache.invalidate("data.xlsx")
+"""
+import hashlib
+import json
+import os
+import stat
+import tempfile
+
+import pandas
+
+
+class FileCache:
+    FORMATS = ("feather", "parquet")
+    EXTENSIONS = {"feather": ".feather", "parquet": ".parquet"}
+    DEFAULT_MAX_SIZE = 2 * 1024 ** 3
+
+    def __init__(self, folder=None, max_size=None, file_format="feather"):
+        """
+        Args:
+            folder: str, folder of the cache, default <temp folder>/kb_package_cache_<user id>. It's created with
+                the mode 0700, an existing folder must be owned by the user and not writable by the others
+            max_size: int, nb max of bytes of the cache: the least recently used entries are removed
+            file_format: str, feather or parquet. The frames pyarrow can't store (not string column names,
+                mixed types, ...) are not cached
+        """
+        assert file_format in self.FORMATS, "Bad file_format given: %s, must be one of %s" % (
+            file_format, self.FORMATS)
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("FileCache required the package pyarrow (pip install pyarrow)")
+        self.folder = folder or self.default_folder()
+        self.max_size = self.DEFAULT_MAX_SIZE if max_size is None else max_size
+        self.file_format = file_format
+        os.makedirs(self.folder, mode=0o700, exist_ok=True)
+        self._check_folder(self.folder)
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def default_folder():
+        user = os.getuid() if hasattr(os, "getuid") else os.environ.get("USERNAME", "user")
+        return os.path.join(tempfile.gettempdir(), "kb_package_cache_%s" % (user,))
+
+    @staticmethod
+    def _check_folder(folder):
+        """
+        Raise PermissionError when the folder is not private: another user could write the entries
+        """
+        stat_result = os.stat(folder)
+        if not hasattr(os, "getuid"):
+            # the folder of the temp folder of the user on Windows
+            return
+        if stat_result.st_uid != os.getuid():
+            raise PermissionError("The cache folder %s is not owned by the user" % folder)
+        if stat_result.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise PermissionError("The cache folder %s is writable by other users" % folder)
+        if stat_result.st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+            os.chmod(folder, 0o700)
+
+    @staticmethod
+    def _hash(value):
+        return hashlib.sha1(value.encode("utf-8")).hexdigest()[:20]
+
+    def key(self, path, options=None):
+        """
+        Name of the entry of the file: hash of the path _ hash of (size, mtime, read options)
+        """
+        path = os.path.abspath(path)
+        stat_result = os.stat(path)
+        options = json.dumps({"size": stat_result.st_size, "mtime": stat_result.st_mtime_ns,
+                              "options": {str(k): repr(v) for k, v in (options or {}).items()}}, sort_keys=True)
+        return self._hash(os.path.normcase(path)) + "_" + self._hash(options)
+
+    def _entry(self, key):
+        for file_format in self.FORMATS:
+            entry = os.path.join(self.folder, key + self.EXTENSIONS[file_format])
+            if os.path.exists(entry):
+                return entry, file_format
+        return None, None
+
+    def get(self, path, options=None):
+        """
+        Returns: the cached pandas.DataFrame of the file, None when it's not in the cache
+        """
+        entry, file_format = self._entry(self.key(path, options))
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        try:
+            if file_format == "feather":
+                dataset = pandas.read_feather(entry, memory_map=True)
+            else:
+                dataset = pandas.read_parquet(entry, memory_map=True)
+        except (OSError, ImportError, Exception):
+            # broken entry
+            self._remove(entry)
+            self.stats["misses"] += 1
+            return None
+        # the mtime of the entry is its last use (LRU)
+        os.utime(entry)
+        self.stats["hits"] += 1
+        return dataset
+
+    def set(self, path, dataset: pandas.DataFrame, options=None):
+        """
+        Store the frame of the file, then remove the least recently used entries above max_size
+        Returns: the path of the entry, None when pyarrow can't store the frame
+        """
+        key = self.key(path, options)
+        for file_format in self.FORMATS:
+            self._remove(os.path.join(self.folder, key + self.EXTENSIONS[file_format]))
+        entry = os.path.join(self.folder, key + self.EXTENSIONS[self.file_format])
+        part_file = entry + ".part"
+        try:
+            if self.file_format == "feather":
+                # feather stores only a default index
+                dataset.reset_index(drop=True).to_feather(part_file)
+            else:
+                dataset.to_parquet(part_file)
+            os.replace(part_file, entry)
+        except (ValueError, TypeError, Exception):
+            # not string column names, mixed types, ...: not cached
+            self._remove(part_file)
+            return None
+        self.evict()
+        return entry
+
+    def invalidate(self, path=None):
+        """
+        Remove the entries of the file (all the entries when path is None)
+        """
+        prefix = "" if path is None else self._hash(os.path.normcase(os.path.abspath(path))) + "_"
+        for name in os.listdir(self.folder):
+            if name.startswith(prefix) and name.endswith(tuple(self.EXTENSIONS.values())):
+                self._remove(os.path.join(self.folder, name))
+
+    def clear(self):
+        self.invalidate()
+
+    def evict(self):
+        """
+        Remove the least recently used entries while the cache is bigger than max_size
+        """
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith(tuple(self.EXTENSIONS.values())):
+                stat_result = os.stat(os.path.join(self.folder, name))
+                entries.append((stat_result.st_mtime, stat_result.st_size, os.path.join(self.folder, name)))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_size:
+                break
+            self._remove(entry)
+            total -= size
+            self.stats["evictions"] += 1
+
+    def size(self):
+        return sum(os.path.getsize(os.path.join(self.folder, name)) for name in os.listdir(self.folder)
+                   if name.endswith(tuple(self.EXTENSIONS.values())))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Sketches of the approximate mode of DatasetFactory.sql(..., approx=True):
+HyperLogLog for count(distinct ...) and t-digest for the quantiles.
+Both are computed with numpy on whole columns and can be merged (chunks, processes).
+
+    hll = HyperLogLog(p=14)
+    hll.add(dataset["msisdn"])
+    hll.count(), hll.interval(0.95)
+
+    digest = TDigest()
+    digest.add(dataset["amount"])
+    digest.quantile(0.5)
+"""
+import math
+from statistics import NormalDist
+
+import numpy
+import pandas
+
+
+def z_score(confidence=0.95):
+    """
+    Returns: float, the z of the normal distribution for the confidence (two-sided), 1.96 for 0.95
+    """
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def hash_values(values):
+    """
+    Returns: numpy.ndarray of uint64, 64 bits hash of the values (null values included)
+    """
+    if not isinstance(values, (pandas.Series, pandas.Index)):
+        values = pandas.Series(values)
+    return pandas.util.hash_pandas_object(pandas.Series(numpy.asarray(values, dtype=object))
+                                          if values.dtype == object else values, index=False).values
+
+
+class HyperLogLog:
+    """
+    Nb of distinct values with 2 ** p registers of 1 byte, relative standard error 1.04 / sqrt(2 ** p)
+    (0.8% with p=14)
+    """
+    DEFAULT_PRECISION = 14
+
+    def __init__(self, p=None):
+        """
+        Args:
+            p: int, precision between 4 and 18
+        """
+        self.p = self.DEFAULT_PRECISION if p is None else p
+        assert 4 <= self.p <= 18, "Bad precision given: %s, must be between 4 and 18" % (self.p,)
+        self.m = 1 << self.p
+        self.registers = numpy.zeros(self.m, dtype=numpy.uint8)
+
+    @staticmethod
+    def _registers(hashes, p):
+        """
+        Returns: (register of each hash: its p first bits, rank: position of the first 1 bit of the others)
+        """
+        index = (hashes >> numpy.uint64(64 - p)).astype(numpy.int64)
+        rest = hashes << numpy.uint64(p)
+        high = (rest >> numpy.uint64(32)).astype(numpy.float64)
+        low = (rest & numpy.uint64(0xFFFFFFFF)).astype(numpy.float64)
+        # bit length (exact with frexp, the values < 2 ** 32 are exact floats)
+        bit_length = numpy.where(high > 0, 32 + numpy.frexp(high)[1], numpy.frexp(low)[1])
+        rank = numpy.minimum(65 - bit_length, 64 - p + 1).astype(numpy.uint8)
+        return index, rank
+
+    def add(self, values):
+        """
+        Add the values (array, Series)
+        Returns: self
+        """
+        if len(values):
+            index, rank = self._registers(hash_values(values), self.p)
+            numpy.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        assert other.p == self.p, "HyperLogLog of different precisions: %s, %s" % (self.p, other.p)
+        self.registers = numpy.maximum(self.registers, other.registers)
+        return self
+
+    @classmethod
+    def _estimate(cls, m, inverse_sum, zeros):
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / inverse_sum
+        # small cardinalities: linear counting of the empty registers
+        small = (estimate <= 2.5 * m) & (zeros > 0)
+        with numpy.errstate(divide="ignore"):
+            linear = m * numpy.log(m / numpy.maximum(zeros, 1))
+        return numpy.where(small, linear, estimate)
+
+    def count(self):
+        """
+        Returns: int, the estimated nb of distinct values
+        """
+        return int(round(float(self._estimate(self.m, numpy.sum(numpy.ldexp(1.0, -self.registers.astype(int))),
+                                              numpy.count_nonzero(self.registers == 0)))))
+
+    @property
+    def error(self):
+        """
+        Relative standard error of the estimate
+        """
+        return 1.04 / math.sqrt(self.m)
+
+    def interval(self, confidence=0.95):
+        """
+        Returns: (low, high), confidence interval of the count
+        """
+        count = self.count()
+        delta = z_score(confidence) * self.error * count
+        return max(0, count - delta), count + delta
+
+    @classmethod
+    def count_by(cls, groups, values, p=None):
+        """
+        Estimated nb of distinct values of each group, without a sketch by group: only the not empty
+        registers of the groups are computed (memory bounded by the nb of rows)
+        Args:
+            groups: array of int, code of the group of each row
+            values: array|Series, the values
+            p: int, precision
+
+        Returns: pandas.Series, estimate by group code
+        """
+        p = cls.DEFAULT_PRECISION if p is None else p
+        m = 1 << p
+        index, rank = cls._registers(hash_values(values), p)
+        registers = pandas.DataFrame({"group": numpy.asarray(groups), "index": index, "rank": rank}).groupby(
+            ["group", "index"], sort=False)["rank"].max()
+        inverse = numpy.ldexp(1.0, -registers.values.astype(int))
+        by_group = pandas.DataFrame({"inverse": inverse, "nonzero": 1},
+                                    index=registers.index.get_level_values(0)).groupby(level=0).sum()
+        zeros = m - by_group["nonzero"].values
+        estimate = cls._estimate(m, by_group["inverse"].values + zeros, zeros)
+        return pandas.Series(numpy.round(estimate).astype(numpy.int64), index=by_group.index)
+
+
+class TDigest:
+    """
+    Quantiles with a bounded nb of centroids (about compression): the centroids are small near the
+    extreme quantiles (scale function k1) so the tails are precise
+    """
+    DEFAULT_COMPRESSION = 200
+
+    def __init__(self, compression=None):
+        """
+        Args:
+            compression: int, the more centroids the more precise
+        """
+        self.compression = compression or self.DEFAULT_COMPRESSION
+        self.means = numpy.array([], dtype=numpy.float64)
+        self.weights = numpy.array([], dtype=numpy.float64)
+        self.min = numpy.inf
+        self.max = -numpy.inf
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def _compress(self, means, weights):
+        order = numpy.argsort(means, kind="mergesort")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        # quantile before each point, a centroid by unit of the scale function k1
+        q = (numpy.cumsum(weights) - weights) / total
+        k = self.compression / (2 * math.pi) * numpy.arcsin(2 * q - 1)
+        centroid = numpy.floor(k - k[0]).astype(numpy.int64)
+        centroid = numpy.unique(centroid, return_inverse=True)[1]
+        new_weights = numpy.bincount(centroid, weights=weights)
+        self.means = numpy.bincount(centroid, weights=means * weights) / new_weights
+        self.weights = new_weights
+
+    def add(self, values, weights=None):
+        """
+        Add the values (array, Series), the null values are ignored
+        Returns: self
+        """
+        values = numpy.asarray(values, dtype=numpy.float64)
+        weights = numpy.ones(len(values)) if weights is None else numpy.asarray(weights, dtype=numpy.float64)
+        not_null = ~numpy.isnan(values)
+        values, weights = values[not_null], weights[not_null]
+        if len(values):
+            self.min = min(self.min, values.min())
+            self.max = max(self.max, values.max())
+            self._compress(numpy.concatenate([self.means, values]), numpy.concatenate([self.weights, weights]))
+        return self
+
+    def merge(self, other):
+        if len(other.means):
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._compress(numpy.concatenate([self.means, other.means]),
+                           numpy.concatenate([self.weights, other.weights]))
+        return self
+
+    def quantile(self, q):
+        """
+        Args:
+            q: float|array, quantile(s) between 0 and 1
+
+        Returns: float|numpy.ndarray, nan when the digest is empty
+        """
+        if not len(self.means):
+            return numpy.nan if numpy.ndim(q) == 0 else numpy.full(numpy.shape(q), numpy.nan)
+        # each centroid is at the middle of its weight, the min and max at the ends
+        positions = numpy.concatenate([[0], numpy.cumsum(self.weights) - self.weights / 2, [self.count]])
+        values = numpy.concatenate([[self.min], self.means, [self.max]])
+        return numpy.interp(numpy.clip(q, 0, 1) * self.count, positions, values)
+
+    def interval(self, q, nb_rows, confidence=0.95):
+        """
+        Confidence interval of the quantile q when the digest is built on a sample of nb_rows rows:
+        the quantiles of the rank bounds of the binomial distribution
+        Returns: (low, high)
+        """
+        delta = z_score(confidence) * math.sqrt(q * (1 - q) / max(nb_rows, 1))
+        return tuple(self.quantile(numpy.array([q - delta, q + delta])))